@@ -1,447 +1,3108 @@
-import xml.etree.ElementTree as ET  # для парсинга XML
-import sys  # для аргументов командной строки
-import os  # для работы с файловой системой
-import urllib.request  # для HTTP запросов
-import urllib.error  # для обработки ошибок HTTP
-import gzip  # для распаковки gzip
-import tarfile  # для работы с tar архивами
-from io import BytesIO  # для работы с бинарными данными в памяти
-
-# Кеш для APKINDEX
-APKINDEX_CACHE = None  # Глобальная переменная для кеширования содержимого APKINDEX
-APKINDEX_URL = None  # Глобальная переменная для хранения URL последнего загруженного APKINDEX
-
-# Глобальные структуры данных для графа
-dependency_graph = {}  # хранит граф: пакет -> список зависимостей
-visited = set()  # отслеживает полностью обработанные пакеты
-visiting = set()  # отслеживает пакеты в текущей цепочке (для обнаружения циклов)
-
-
-def parse_config(config_path):
-    """Парсит конфигурационный файл XML и возвращает параметры"""
-    try:
-        # Проверки валидности файла
-        if not os.path.exists(config_path):  # Проверка существования файла
-            raise FileNotFoundError(f"Конфигурационный файл не найден: {config_path}")
-        if not os.path.isfile(config_path):  # Проверка что это файл
-            raise ValueError(f"Указанный путь не является файлом: {config_path}")
-        if not config_path.lower().endswith('.xml'):  # Проверка расширения
-            raise ValueError(f"Файл должен иметь расширение .xml: {config_path}")
-
-        tree = ET.parse(config_path)  # Парсинг XML файла
-        root = tree.getroot()  # Получение корневого элемента
-        config = {}  # Инициализация словаря конфигурации
-
-        # Извлечение имени пакета
-        package_name_elem = root.find('package_name')  # Поиск элемента package_name
-        if package_name_elem is None:  # Проверка наличия элемента
-            raise ValueError("Отсутствует обязательный элемент: package_name")
-        if package_name_elem.text is None:  # Проверка что элемент не пустой
-            raise ValueError("Элемент package_name не может быть пустым")
-        package_name = package_name_elem.text.strip()  # Очистка и получение текста
-        if not package_name:  # Проверка на пустую строку
-            raise ValueError("Имя пакета не может быть пустой строкой")
-        if not all(c.isalnum() or c in ['-', '_', '.'] for c in package_name):  # Валидация символов
-            raise ValueError(f"Недопустимые символы в имени пакета: {package_name}")
-        config['package_name'] = package_name  # Сохранение в конфиг
-
-        # Извлечение URL репозитория
-        repository_url_elem = root.find('repository_url')  # Поиск элемента repository_url
-        if repository_url_elem is None:  # Проверка наличия элемента
-            raise ValueError("Отсутствует обязательный элемент: repository_url")
-        if repository_url_elem.text is None:  # Проверка что элемент не пустой
-            raise ValueError("Элемент repository_url не может быть пустым")
-        repository_url = repository_url_elem.text.strip()  # Очистка и получение текста
-        if not repository_url:  # Проверка на пустую строку
-            raise ValueError("URL репозитория не может быть пустой строкой")
-        config['repository_url'] = repository_url  # Сохранение в конфиг
-
-        # Извлечение режима тестового репозитория
-        test_repo_mode_elem = root.find('test_repo_mode')  # Поиск элемента test_repo_mode
-        if test_repo_mode_elem is not None and test_repo_mode_elem.text:  # Проверка наличия и содержимого
-            test_repo_mode = test_repo_mode_elem.text.strip().lower()  # Очистка и приведение к нижнему регистру
-            valid_modes = ['true', 'false', 'local', 'remote']  # Допустимые значения
-            if test_repo_mode not in valid_modes:  # Проверка валидности значения
-                raise ValueError(f"Недопустимый режим работы: {test_repo_mode}")
-            config['test_repo_mode'] = test_repo_mode  # Сохранение в конфиг
-        else:
-            config['test_repo_mode'] = 'false'  # Значение по умолчанию
-
-        # Извлечение версии пакета
-        package_version_elem = root.find('package_version')  # Поиск элемента package_version
-        if package_version_elem is not None and package_version_elem.text:  # Проверка наличия и содержимого
-            package_version = package_version_elem.text.strip()  # Очистка текста
-            if not package_version:  # Проверка на пустую строку
-                raise ValueError("Версия пакета не может быть пустой строкой")
-            config['package_version'] = package_version  # Сохранение в конфиг
-        else:
-            config['package_version'] = '1.0.0'  # Значение по умолчанию
-
-        # Извлечение настройки ASCII вывода
-        ascii_tree_output_elem = root.find('ascii_tree_output')  # Поиск элемента ascii_tree_output
-        if ascii_tree_output_elem is not None and ascii_tree_output_elem.text:  # Проверка наличия и содержимого
-            ascii_text = ascii_tree_output_elem.text.strip().lower()  # Очистка и приведение к нижнему регистру
-            valid_boolean_values = ['true', 'false', '1', '0', 'yes', 'no']  # Допустимые булевы значения
-            if ascii_text not in valid_boolean_values:  # Проверка валидности значения
-                raise ValueError(f"Недопустимое значение для ascii_tree_output: {ascii_tree_output_elem.text}")
-            config['ascii_tree_output'] = ascii_text in ['true', '1', 'yes']  # Преобразование в булево значение
-        else:
-            config['ascii_tree_output'] = False  # Значение по умолчанию
-
-        return config  # Возврат конфигурации
-
-    except ET.ParseError as e:  # Обработка ошибок парсинга XML
-        raise ValueError(f"Ошибка парсинга XML: {e}")
-    except FileNotFoundError as e:  # Обработка ошибок файла
-        raise ValueError(f"Файл не найден: {e}")
-    except PermissionError as e:  # Обработка ошибок прав доступа
-        raise ValueError(f"Отсутствуют права доступа к файлу: {e}")
-    except Exception as e:  # Обработка всех остальных ошибок
-        raise ValueError(f"Неожиданная ошибка при загрузке конфигурации: {e}")
-
-
-def download_and_parse_apkindex(repository_url):
-    """Скачивает и парсит APKINDEX.tar.gz с кешированием"""
-    global APKINDEX_CACHE, APKINDEX_URL  # Объявление глобальных переменных для кеширования
-
-    if APKINDEX_URL == repository_url and APKINDEX_CACHE is not None:  # Проверка кеша
-        return APKINDEX_CACHE  # Возврат кешированных данных
-
-    try:
-        if repository_url.endswith('/'):  # Проверка завершается ли URL слешем
-            apkindex_url = repository_url + 'APKINDEX.tar.gz'  # Формирование URL без дополнительного слеша
-        else:
-            apkindex_url = repository_url + '/APKINDEX.tar.gz'  # Формирование URL с добавлением слеша
-
-        print(f"Скачиваем {apkindex_url}...")  # Сообщение о начале загрузки
-
-        with urllib.request.urlopen(apkindex_url) as response:  # HTTP-запрос к репозиторию
-            apkindex_data = response.read()  # Чтение бинарных данных
-
-        print("Файл скачан, распаковываем...")  # Сообщение о начале распаковки
-
-        with gzip.GzipFile(fileobj=BytesIO(apkindex_data)) as gz_file:  # Распаковка gzip
-            tar_data = gz_file.read()  # Чтение распакованных tar-данных
-
-        with tarfile.open(fileobj=BytesIO(tar_data)) as tar:  # Открытие tar-архива
-            apkindex_file = tar.extractfile('APKINDEX')  # Извлечение файла APKINDEX из архива
-            apkindex_content = apkindex_file.read().decode('utf-8')  # Чтение и декодирование содержимого
-
-        APKINDEX_CACHE = apkindex_content  # Сохранение в кеш
-        APKINDEX_URL = repository_url  # Сохранение URL в кеш
-
-        return apkindex_content  # Возврат распарсенного содержимого
-
-    except Exception as e:  # Обработка всех исключений
-        raise ValueError(f"Ошибка при загрузке APKINDEX: {e}")  # Преобразование в ValueError с сообщением
-
-
-def get_all_packages_from_apkindex(repository_url):
-    """Получает список всех пакетов из APKINDEX"""
-    apkindex_content = download_and_parse_apkindex(repository_url)  # Загрузка и парсинг APKINDEX
-    lines = apkindex_content.split('\n')  # Разделение содержимого на строки
-
-    packages = []  # Инициализация списка пакетов
-    current_package = None  # Переменная для текущего пакета
-
-    for line in lines:  # Цикл по всем строкам APKINDEX
-        if line.startswith('P:'):  # Если строка содержит имя пакета
-            current_package = line[2:]  # Извлечение имени пакета (после 'P:')
-            if current_package and current_package not in packages:  # Если пакет не пустой и еще не в списке
-                packages.append(current_package)  # Добавление пакета в список
-
-    return packages  # Возврат списка всех уникальных пакетов
-
-
-def get_all_packages_from_test_file(test_repo_path):
-    """Получает список всех пакетов из тестового файла"""
-    try:
-        if not os.path.exists(test_repo_path):  # Проверка существования файла
-            raise ValueError(f"Тестовый файл не найден: {test_repo_path}")  # Ошибка если файл не найден
-
-        with open(test_repo_path, 'r', encoding='utf-8') as f:  # Открытие файла для чтения
-            content = f.read()  # Чтение всего содержимого файла
-
-        packages = []  # Инициализация списка пакетов
-        for line in content.split('\n'):  # Цикл по всем строкам файла
-            line = line.strip()  # Удаление пробелов в начале и конце
-            if line and ':' in line and not line.startswith('#'):  # Проверка на валидную строку (не пустая, содержит :, не комментарий)
-                pkg = line.split(':', 1)[0].strip()  # Извлечение имени пакета до двоеточия
-                if pkg and pkg not in packages:  # Если имя не пустое и еще не в списке
-                    packages.append(pkg)  # Добавление пакета в список
-
-        return packages  # Возврат списка всех пакетов
-
-    except Exception as e:  # Обработка всех исключений
-        raise ValueError(f"Ошибка чтения тестового файла: {e}")  # Преобразование исключения в ValueError
-
-
-def find_package_dependencies(apkindex_content, package_name, package_version):
-    """Ищет зависимости пакета в APKINDEX"""
-    lines = apkindex_content.split('\n')  # Разделяем содержимое на строки
-    current_package = None  # Текущий обрабатываемый пакет
-    in_target_package = False  # Флаг нахождения в целевом пакете
-    dependencies = []  # Список зависимостей
-
-    for line in lines:  # Цикл по всем строкам APKINDEX
-        if line.startswith('P:'):  # Если строка с именем пакета
-            current_package = line[2:]  # Извлекаем имя пакета
-            in_target_package = (current_package == package_name)  # Проверяем совпадение с искомым
-
-        elif line.startswith('V:'):  # Если строка с версией пакета
-            if in_target_package and package_version and line[2:] != package_version:  # Проверяем версию
-                in_target_package = False  # Сбрасываем флаг если версия не совпадает
-
-        elif line.startswith('D:') and in_target_package:  # Если строка с зависимостями и мы в целевом пакете
-            deps_line = line[2:]  # Извлекаем строку зависимостей
-            if deps_line:  # Если зависимости есть
-                dependencies = [dep.strip() for dep in deps_line.split() if dep.strip()]  # Разделяем и очищаем
-                break  # Прерываем цикл после нахождения зависимостей
-
-    return dependencies  # Возвращаем найденные зависимости
-
-
-def read_dependencies_from_test_file(package_name, test_repo_path):
-    """Читает зависимости из тестового файла (для тестового режима)"""
-    try:
-        if not os.path.exists(test_repo_path):  # Проверка существования файла
-            raise ValueError(f"Тестовый файл не найден: {test_repo_path}")  # Ошибка если файл не найден
-
-        with open(test_repo_path, 'r', encoding='utf-8') as f:  # Открытие файла для чтения
-            content = f.read()  # Чтение всего содержимого файла
-
-        for line in content.split('\n'):  # Цикл по всем строкам файла
-            line = line.strip()  # Удаление пробелов в начале и конце
-            if line and ':' in line and not line.startswith('#'):  # Проверка на валидную строку (не пустая, содержит :, не комментарий)
-                pkg, deps_str = line.split(':', 1)  # Разделение строки на имя пакета и зависимости
-                pkg = pkg.strip()  # Очистка имени пакета от пробелов
-                if pkg == package_name:  # Если нашли нужный пакет
-                    dependencies = [dep.strip() for dep in deps_str.split(',') if dep.strip()]  # Разделение зависимостей по запятым и очистка
-                    return dependencies  # Возврат списка зависимостей
-
-        return []  # Возврат пустого списка если пакет не найден
-
-    except Exception as e:  # Обработка всех исключений
-        raise ValueError(f"Ошибка чтения тестового файла: {e}")  # Преобразование исключения в ValueError
-
-
-def get_package_dependencies(package_name, package_version, repository_url, is_test_mode):
-    """Универсальная функция для получения зависимостей"""
-    if is_test_mode:  # Проверка режима работы
-        return read_dependencies_from_test_file(package_name, repository_url)  # Чтение из тестового файла
-    else:  # Режим работы с реальным репозиторием
-        apkindex_content = download_and_parse_apkindex(repository_url)  # Загрузка и парсинг APKINDEX
-        return find_package_dependencies(apkindex_content, package_name, package_version)  # Поиск зависимостей
-
-
-def build_dependency_graph(package_name, package_version, repository_path, is_test_mode, depth=0, max_depth=10,
-                           chain=None):
-    """Рекурсивно строит граф зависимостей для одного пакета"""
-    if chain is None:  # Если цепочка не передана
-        chain = []  # Инициализируем пустым списком
-
-    if depth > max_depth:  # Проверка максимальной глубины рекурсии
-        dependency_graph[package_name] = ["MAX_DEPTH_REACHED"]  # Записываем ошибку глубины
-        return  # Прерываем рекурсию
-
-    if package_name in visiting:  # Обнаружение циклической зависимости
-        current_chain = chain + [package_name]  # Формируем текущую цепочку
-        cycle_start = current_chain.index(package_name)  # Находим начало цикла
-        cycle_part = current_chain[cycle_start:]  # Выделяем циклическую часть
-        cycle_chain = " → ".join(cycle_part)  # Форматируем цикл в строку
-        dependency_graph[package_name] = ["CYCLE: " + cycle_chain]  # Записываем информацию о цикле
-        return  # Прерываем рекурсию
-
-    if package_name in visited:  # Если пакет уже обработан
-        return  # Выходим из функции
-
-    visiting.add(package_name)  # Добавляем пакет в текущую цепочку
-    current_chain = chain + [package_name]  # Обновляем текущую цепочку
-
-    try:
-        dependencies = get_package_dependencies(package_name, package_version, repository_path, is_test_mode)  # Получаем зависимости
-        dependency_graph[package_name] = dependencies  # Сохраняем зависимости в граф
-
-        for dep in dependencies:  # Рекурсивно обрабатываем каждую зависимость
-            build_dependency_graph(dep, None, repository_path, is_test_mode, depth + 1, max_depth, current_chain)
-
-    except Exception as e:  # Обработка ошибок
-        dependency_graph[package_name] = ["ERROR: " + str(e)]  # Сохраняем ошибку
-
-    finally:  # Выполняется всегда
-        visiting.remove(package_name)  # Удаляем пакет из текущей цепочки
-        visited.add(package_name)  # Добавляем пакет в обработанные
-
-
-def build_complete_dependency_graph(repository_url, is_test_mode):
-    """Строит полный граф всех пакетов в репозитории"""
-    print("\nПостроение полного графа зависимостей...")  # Сообщение о начале построения
-
-    if is_test_mode:  # Если тестовый режим
-        all_packages = get_all_packages_from_test_file(repository_url)  # Получаем пакеты из тестового файла
-        print(f"Найдено пакетов в тестовом файле: {len(all_packages)}")  # Вывод количества пакетов
-    else:  # Если рабочий режим
-        all_packages = get_all_packages_from_apkindex(repository_url)  # Получаем пакеты из APKINDEX
-        print(f"Найдено пакетов в репозитории: {len(all_packages)}")  # Вывод количества пакетов
-
-    total_packages = len(all_packages)  # Сохраняем общее количество пакетов
-
-    # Убираем поштучный вывод, оставляем только общий прогресс
-    for package in all_packages:  # Цикл по всем пакетам
-        if package not in visited:  # Если пакет еще не обработан
-            build_dependency_graph(package, None, repository_url, is_test_mode)  # Строим граф для пакета
-
-    print(f"Обработано пакетов: {len(visited)}/{total_packages}")  # Вывод прогресса обработки
-    print("Полный граф построен!")  # Сообщение о завершении
-
-def display_dependency_graph():
-    """Выводит построенный граф зависимостей"""
-    print("\n" + "=" * 60)  # Верхняя разделительная линия
-    print("ПОЛНЫЙ ГРАФ ЗАВИСИМОСТЕЙ РЕПОЗИТОРИЯ")  # Заголовок
-    print("=" * 60)  # Нижняя разделительная линия
-
-    # Сортируем пакеты для удобства чтения
-    sorted_packages = sorted(dependency_graph.keys())  # Сортировка имен пакетов
-
-    for package in sorted_packages:  # Цикл по всем пакетам
-        dependencies = dependency_graph[package]  # Получение зависимостей пакета
-        if dependencies:  # Если зависимости есть
-            deps_str = ", ".join(dependencies)  # Формирование строки зависимостей
-            print(f"{package} -> [{deps_str}]")  # Вывод пакета с зависимостями
-        else:  # Если зависимостей нет
-            print(f"{package} -> []")  # Вывод пакета без зависимостей
-
-    print(f"\nВсего пакетов в графе: {len(dependency_graph)}")  # Вывод общего количества пакетов
-
-def create_test_files():
-    """Создает тестовые файлы для демонстрации"""
-    test_files = {
-        "test_simple.txt": """A: B, C
-B: D
-C: E
-D: 
-E: F
-F:""",
-
-        "test_cycle.txt": """A: B
-B: C  
-C: A
-D: E
-E:""",
-
-        "test_diamond.txt": """A: B, C
-B: D
-C: D
-D: E
-E:""",
-
-        "test_complex.txt": """A: B, C, F
-B: D, E
-C: G
-D: H
-E: H, I
-F: J
-G: K
-H: 
-I: J
-J: 
-K: L
-L:"""
-    }
-
-    for filename, content in test_files.items():  # Цикл по всем тестовым файлам
-        if not os.path.exists(filename):  # Проверка существования файла
-            with open(filename, 'w', encoding='utf-8') as f:  # Открытие файла для записи
-                f.write(content)  # Запись содержимого в файл
-            print(f"Создан тестовый файл: {filename}")  # Сообщение о создании файла
-
-
-def interactive_test_mode():
-    """Интерактивный режим тестирования"""
-    print("\n" + "=" * 50)  # Разделительная линия
-    print("ИНТЕРАКТИВНЫЙ РЕЖИМ ТЕСТИРОВАНИЯ")  # Заголовок
-    print("=" * 50)  # Разделительная линия
-
-    while True:  # Бесконечный цикл для ввода пути
-        file_path = input("\nВведите путь к тестовому файлу (например: test_simple.txt): ").strip()  # Запрос пути
-
-        if not file_path:  # Проверка пустого ввода
-            print("Путь не может быть пустым!")  # Сообщение об ошибке
-            continue  # Повтор запроса
-
-        if not file_path.endswith('.txt'):  # Проверка расширения
-            file_path += '.txt'  # Добавление расширения .txt
-
-        if os.path.exists(file_path):  # Проверка существования файла
-            break  # Выход из цикла если файл найден
-        else:
-            print(f"Файл '{file_path}' не найден!")  # Сообщение об ошибке
-            create_test_files()  # Создание тестовых файлов
-            print("Доступные тестовые файлы:")  # Вывод списка файлов
-            for file in ["test_simple.txt", "test_cycle.txt", "test_diamond.txt", "test_complex.txt"]:  # Цикл по файлам
-                if os.path.exists(file):  # Проверка существования файла
-                    print(f"  - {file}")  # Вывод имени файла
-
-    print(f"\nАнализируем файл {file_path}...")  # Сообщение о начале анализа
-
-    # Очищаем глобальные структуры
-    dependency_graph.clear()  # Очистка графа зависимостей
-    visited.clear()  # Очистка посещенных пакетов
-    visiting.clear()  # Очистка текущей цепочки
-    global APKINDEX_CACHE, APKINDEX_URL  # Объявление глобальных переменных
-    APKINDEX_CACHE = None  # Сброс кеша APKINDEX
-    APKINDEX_URL = None  # Сброс URL APKINDEX
-
-    # Строим полный граф
-    build_complete_dependency_graph(file_path, True)  # Построение графа в тестовом режиме
-    display_dependency_graph()  # Вывод графа зависимостей
-
-
-def main():
-    """Основная функция приложения"""
-    if len(sys.argv) < 2:  # Проверяем количество аргументов
-        print("Использование:")  # Выводим справку
-        print("  python main.py <config.xml>    - режим с конфигурационным файлом")
-        print("  python main.py --interactive   - интерактивный тестовый режим")
-        sys.exit(1)  # Выход с ошибкой
-
-    if sys.argv[1] == "--interactive":  # Если запрошен интерактивный режим
-        interactive_test_mode()  # Запускаем интерактивный режим
-    else:
-        config_path = sys.argv[1]  # Получаем путь к конфигурационному файлу
-        try:
-            # Этап 1: Загрузка конфигурации
-            config = parse_config(config_path)  # Парсим конфигурационный файл
-
-            create_test_files()  # Создаем тестовые файлы
-
-            # Этап 2: Построение полного графа зависимостей
-
-            # Очищаем глобальные структуры
-            dependency_graph.clear()  # Очищаем граф зависимостей
-            visited.clear()  # Очищаем посещенные пакеты
-            visiting.clear()  # Очищаем текущую цепочку
-            global APKINDEX_CACHE, APKINDEX_URL  # Объявляем глобальные переменные
-            APKINDEX_CACHE = None  # Сбрасываем кеш APKINDEX
-            APKINDEX_URL = None  # Сбрасываем URL APKINDEX
-
-            # Определяем режим работы
-            is_test_mode = config['test_repo_mode'] in ['true', 'local']  # Проверяем тестовый режим
-
-            # Строим полный граф
-            build_complete_dependency_graph(  # Запускаем построение графа
-                config['repository_url'],  # Передаем URL репозитория
-                is_test_mode  # Передаем режим работы
-            )
-
-            display_dependency_graph()  # Выводим граф зависимостей
-
-        except ValueError as e:  # Обрабатываем ошибки валидации
-            print(f"Ошибка: {e}")  # Выводим сообщение об ошибке
-            sys.exit(1)  # Выход с ошибкой
-        except Exception as e:  # Обрабатываем все остальные ошибки
-            print(f"Неожиданная ошибка: {e}")  # Выводим сообщение об ошибке
-            sys.exit(1)  # Выход с ошибкой
-
-if __name__ == "__main__":
-    main()
+import xml.etree.ElementTree as ET  # для парсинга XML
+import sys  # для аргументов командной строки
+import os  # для работы с файловой системой
+import urllib.request  # для HTTP запросов
+import urllib.error  # для обработки ошибок HTTP
+import urllib.parse  # для разбора запросов к демону
+import tarfile  # для работы с tar архивами
+import time  # для метрик времени фаз и интервалов опроса
+import contextlib  # для contextmanager замера фаз и перенаправления вывода
+import json  # для метаданных дискового кеша
+import hashlib  # для ключей дискового кеша
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor  # для параллельной загрузки и построения
+import multiprocessing  # для запуска рабочих процессов через fork
+from array import array  # для компактного хранения ребер графа
+from collections import OrderedDict  # для LRU декодированных записей
+from collections.abc import Mapping, MutableMapping  # для словарей поверх индекса и массивов CSR
+import mmap  # для отображения снимка графа в память
+import random  # для случайного разброса интервала опроса
+import threading  # для параллельной загрузки и фоновых потоков демона
+import queue  # для результатов гонки загрузки с зеркал
+import http.server  # для HTTP-демона запросов
+import functools  # для кеширования разобранных версий
+import struct  # для заголовка бинарного снимка графа
+import bisect  # для выбора версии по отсортированному списку кандидатов
+import re  # для поиска пустых строк между записями распакованного APKINDEX
+import itertools  # для номеров хранилищ записей в общем LRU и смещений CSR из диапазонов пула
+import cProfile  # для профилирования всего запуска
+import pstats  # для сводки профиля
+try:
+    import resource  # для пикового RSS процесса (только Unix)
+except ImportError:  # На Windows модуля нет
+    resource = None  # Пиковый RSS не измеряется
+from io import StringIO  # для подавления вывода в строковый буфер
+from xml.sax.saxutils import escape  # для экранирования при экспорте в GraphML
+
+# Кеш для APKINDEX
+APKINDEX_CACHE = None  # Глобальная переменная для кеширования содержимого APKINDEX
+APKINDEX_URL = None  # Глобальная переменная для хранения URL последнего загруженного APKINDEX
+
+# Дисковый кеш архивов APKINDEX
+CACHE_DIR = os.environ.get('APK_DEPGRAPH_CACHE',
+                           os.path.join(os.path.expanduser('~'), '.cache', 'apk-depgraph'))  # Каталог кеша
+OFFLINE_MODE = False  # Режим без сети: используется только дисковый кеш
+HTTP_TIMEOUT = 30  # Таймаут HTTP-запросов в секундах
+VALIDATED_ARCHIVES = set()  # URL репозиториев, архивы которых уже перепроверены в этом запуске
+CACHE_REVALIDATE_AGE = 3600  # Через сколько секунд снимок графа перепроверяет архивы по сети
+
+# Режим ограниченной памяти
+LAZY_INDEX = False  # Записи APKINDEX декодируются по запросу из распакованного файла в кеше
+LAZY_RECORD_CACHE_SIZE = 4096  # Предел общего LRU декодированных записей (на все репозитории вместе)
+LAZY_RECORD_LRU = OrderedDict()  # (номер хранилища, номер записи) -> декодированная запись
+LAZY_RECORD_LOCK = threading.Lock()  # Защита LRU при параллельных запросах
+LAZY_STORE_NUMBERS = itertools.count()  # Уникальные номера хранилищ (ключи LRU не путаются после перезагрузки)
+LAZY_RECORD_SEPARATOR = re.compile(rb'\n(?:\r?\n)+')  # Пустые строки между записями (LF и CRLF)
+
+# Зеркала репозиториев
+REPOSITORY_MIRRORS = {}  # URL репозитория -> список URL его зеркал (первый - основной)
+MIRROR_RACE_WIDTH = 2  # Сколько самых быстрых зеркал скачивают архив одновременно
+MIRROR_PROBE_TIMEOUT = 5  # Таймаут пробного запроса к зеркалу в секундах
+MIRROR_FAILURE_PENALTY = 10  # Штраф к задержке зеркала за каждую ошибку подряд в секундах
+MIRROR_RETRY_INTERVAL = 600  # Через сколько секунд зеркало с ошибками опрашивается снова
+MIRROR_STATS_FILE = 'mirrors.json'  # Файл статистики задержек зеркал в каталоге кеша
+MIRROR_STATS_LOCK = threading.Lock()  # Защита статистики при параллельных загрузках
+
+# Метрики выполнения: время фаз и счетчики
+METRICS = {'phases': {}, 'counters': {}}  # Накопленные метрики запуска
+METRICS_LOCK = threading.Lock()  # Защита метрик при параллельной загрузке
+
+# Состояние демона запросов
+DAEMON_STATE = None  # Граф, из которого демон отвечает на запросы (заменяется целиком при перезагрузке)
+DAEMON_LOCK = threading.Lock()  # Перестроение графа в демоне выполняется только одним потоком
+DAEMON_PORT = 8780  # Порт HTTP-демона по умолчанию
+DAEMON_RELOAD_INTERVAL = 300  # Интервал проверки обновлений APKINDEX в секундах
+
+# Настройки режима наблюдения за репозиториями
+WATCH_INTERVAL = 60  # Интервал опроса репозиториев в секундах
+WATCH_JITTER = 0.1  # Доля случайного разброса интервала (опросы разных процессов не совпадают)
+WATCH_MAX_BACKOFF = 3600  # Максимальная пауза после ошибок опроса в секундах
+
+# Параллельное построение графа
+BUILD_JOBS = 1  # Количество рабочих процессов построения графа (1 - последовательно)
+WORKER_STATE = None  # Данные рабочего процесса (задаются инициализатором пула, в основном процессе не используются)
+
+# Инкрементальное обновление графа
+OVERLAY_COMPACT_RATIO = 0.05  # Доля измененных узлов, после которой изменения переносятся в новый CSR
+OVERLAY_COMPACT_MIN = 256  # Пока изменено меньше узлов, CSR не перестраивается и в маленьком графе
+
+# Глобальные структуры данных для графа
+dependency_graph = {}  # хранит граф: пакет -> список зависимостей
+visited = set()  # отслеживает уже обработанные пакеты
+node_repository = {}  # хранит для каждого узла графа репозиторий, из которого он получен
+dependency_cycles = []  # циклы: сильно связные компоненты из нескольких узлов или с петлей
+scc_id = {}  # номер сильно связной компоненты для каждого узла графа
+scc_components = []  # сильно связные компоненты (после полного пересчета - в обратном топологическом порядке)
+compact_graph = None  # компактное представление графа: целочисленные ID и ребра в формате CSR
+node_closures = {}  # размеры замыканий: пакет -> (пакетов, байт); заполняются отчетом о замыканиях
+
+# Бинарный снимок графа
+SNAPSHOT_MAGIC = b'APKGRAPH'  # Сигнатура файла снимка
+SNAPSHOT_FORMAT_VERSION = 1  # Версия формата снимка
+SNAPSHOT_HEADER = struct.Struct('<8sIIIIB64s')  # Сигнатура, версия, узлы, ребра, секции, порядок байт, контрольная сумма
+SNAPSHOT_SECTION = struct.Struct('<QQ')  # Смещение и длина секции
+SNAPSHOT_SECTIONS = ('name_offsets', 'name_blob', 'version_offsets', 'version_blob',
+                     'repository_offsets', 'repository_blob', 'forward_offsets', 'forward_targets',
+                     'reverse_offsets', 'reverse_targets', 'installed_sizes', 'package_sizes')  # Порядок секций
+
+
+def add_phase_time(phase, seconds):
+    """Добавляет время к фазе выполнения"""
+    with METRICS_LOCK:  # Фазы могут обновляться из нескольких потоков
+        METRICS['phases'][phase] = METRICS['phases'].get(phase, 0.0) + seconds  # Накопление времени
+
+
+def count_metric(name, amount=1):
+    """Увеличивает счетчик метрик"""
+    with METRICS_LOCK:  # Счетчики могут обновляться из нескольких потоков
+        METRICS['counters'][name] = METRICS['counters'].get(name, 0) + amount  # Накопление значения
+
+
+@contextlib.contextmanager
+def measure_phase(phase):
+    """Замеряет время выполнения блока и добавляет его к фазе"""
+    start = time.perf_counter()  # Начало фазы
+    try:
+        yield  # Выполнение блока
+    finally:
+        add_phase_time(phase, time.perf_counter() - start)  # Учет времени даже при ошибке
+
+
+def reset_metrics():
+    """Очищает накопленные метрики"""
+    with METRICS_LOCK:  # Блокировка метрик
+        METRICS['phases'].clear()  # Очистка фаз
+        METRICS['counters'].clear()  # Очистка счетчиков
+
+
+def collect_metrics():
+    """Возвращает снимок метрик вместе с пиковым RSS процесса"""
+    with METRICS_LOCK:  # Блокировка метрик
+        result = {'phases': {name: round(value, 6) for name, value in METRICS['phases'].items()},
+                  'counters': dict(METRICS['counters'])}  # Копия метрик
+    if resource is not None:  # Unix: пиковый RSS из getrusage
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss  # Килобайты на Linux, байты на macOS
+        result['peak_rss_bytes'] = peak if sys.platform == 'darwin' else peak * 1024  # Приведение к байтам
+    return result  # Возврат метрик
+
+
+def parse_config(config_path):
+    """Парсит конфигурационный файл XML и возвращает параметры"""
+    try:
+        # Проверки валидности файла
+        if not os.path.exists(config_path):  # Проверка существования файла
+            raise FileNotFoundError(f"Конфигурационный файл не найден: {config_path}")
+        if not os.path.isfile(config_path):  # Проверка что это файл
+            raise ValueError(f"Указанный путь не является файлом: {config_path}")
+        if not config_path.lower().endswith('.xml'):  # Проверка расширения
+            raise ValueError(f"Файл должен иметь расширение .xml: {config_path}")
+
+        tree = ET.parse(config_path)  # Парсинг XML файла
+        root = tree.getroot()  # Получение корневого элемента
+        config = {}  # Инициализация словаря конфигурации
+
+        # Извлечение имени пакета
+        package_name_elem = root.find('package_name')  # Поиск элемента package_name
+        if package_name_elem is None and root.find('packages') is not None:  # Пакетный режим без отдельного корня
+            package_name_elem = root.find('packages/package')  # Первый корневой пакет списка
+        if package_name_elem is None:  # Проверка наличия элемента
+            raise ValueError("Отсутствует обязательный элемент: package_name")
+        if package_name_elem.text is None:  # Проверка что элемент не пустой
+            raise ValueError("Элемент package_name не может быть пустым")
+        package_name = package_name_elem.text.strip()  # Очистка и получение текста
+        if not package_name:  # Проверка на пустую строку
+            raise ValueError("Имя пакета не может быть пустой строкой")
+        if not all(c.isalnum() or c in ['-', '_', '.'] for c in package_name):  # Валидация символов
+            raise ValueError(f"Недопустимые символы в имени пакета: {package_name}")
+        config['package_name'] = package_name  # Сохранение в конфиг
+
+        # Извлечение списка корневых пакетов для пакетного режима
+        batch_packages = []  # Пары (имя, версия)
+        for package_elem in root.findall('packages/package'):  # Цикл по корневым пакетам
+            batch_name = (package_elem.text or '').strip()  # Имя пакета
+            if not batch_name:  # Проверка на пустую строку
+                raise ValueError("Имя пакета в списке packages не может быть пустой строкой")
+            if not all(c.isalnum() or c in ['-', '_', '.'] for c in batch_name):  # Валидация символов
+                raise ValueError(f"Недопустимые символы в имени пакета: {batch_name}")
+            batch_version = (package_elem.get('version') or '').strip() or None  # Необязательная версия
+            batch_packages.append((batch_name, batch_version))  # Сохранение корня
+        config['batch_packages'] = batch_packages  # Сохранение в конфиг (пустой список - обычный режим)
+
+        # Извлечение URL репозиториев (несколько элементов допускаются, в том числе внутри <repositories>)
+        repository_url_elems = root.findall('repository_url') + root.findall('repositories/repository_url')  # Поиск всех элементов
+        if not repository_url_elems:  # Проверка наличия элемента
+            raise ValueError("Отсутствует обязательный элемент: repository_url")
+        repositories = []  # Пары (приоритет, порядок, URL)
+        config['repository_mirrors'] = {}  # URL репозитория -> его зеркала
+        for order, repository_url_elem in enumerate(repository_url_elems):  # Цикл по элементам репозиториев
+            mirror_elems = repository_url_elem.findall('mirror')  # Зеркала того же репозитория
+            if repository_url_elem.text is None and not mirror_elems:  # Проверка что элемент не пустой
+                raise ValueError("Элемент repository_url не может быть пустым")
+            mirror_urls = [(repository_url_elem.text or '').strip()] if (repository_url_elem.text or '').strip() else []  # Основной URL
+            for mirror_elem in mirror_elems:  # Цикл по зеркалам
+                mirror_url = (mirror_elem.text or '').strip()  # URL зеркала
+                if not mirror_url:  # Проверка на пустую строку
+                    raise ValueError("URL зеркала не может быть пустой строкой")
+                mirror_urls.append(mirror_url)  # Сохранение зеркала
+            repository_url = mirror_urls[0] if mirror_urls else ''  # Основной URL - ключ кеша репозитория
+            if not repository_url:  # Проверка на пустую строку
+                raise ValueError("URL репозитория не может быть пустой строкой")
+            if len(mirror_urls) > 1:  # Зеркала заданы
+                config['repository_mirrors'][repository_url] = mirror_urls  # Сохранение списка зеркал
+            priority_text = repository_url_elem.get('priority', str(order))  # Приоритет (меньше - важнее)
+            try:
+                priority = int(priority_text)  # Преобразование приоритета в число
+            except ValueError:  # Приоритет не является числом
+                raise ValueError(f"Недопустимый приоритет репозитория: {priority_text}")
+            repositories.append((priority, order, repository_url))  # Сохранение репозитория
+        repositories.sort()  # Упорядочивание по приоритету, затем по порядку в файле
+        config['repository_urls'] = [url for _priority, _order, url in repositories]  # Список URL по приоритету
+        config['repository_url'] = config['repository_urls'][0]  # Основной репозиторий
+
+        # Извлечение режима тестового репозитория
+        test_repo_mode_elem = root.find('test_repo_mode')  # Поиск элемента test_repo_mode
+        if test_repo_mode_elem is not None and test_repo_mode_elem.text:  # Проверка наличия и содержимого
+            test_repo_mode = test_repo_mode_elem.text.strip().lower()  # Очистка и приведение к нижнему регистру
+            valid_modes = ['true', 'false', 'local', 'remote']  # Допустимые значения
+            if test_repo_mode not in valid_modes:  # Проверка валидности значения
+                raise ValueError(f"Недопустимый режим работы: {test_repo_mode}")
+            config['test_repo_mode'] = test_repo_mode  # Сохранение в конфиг
+        else:
+            config['test_repo_mode'] = 'false'  # Значение по умолчанию
+
+        # Извлечение версии пакета
+        package_version_elem = root.find('package_version')  # Поиск элемента package_version
+        if package_version_elem is not None and package_version_elem.text:  # Проверка наличия и содержимого
+            package_version = package_version_elem.text.strip()  # Очистка текста
+            if not package_version:  # Проверка на пустую строку
+                raise ValueError("Версия пакета не может быть пустой строкой")
+            config['package_version'] = package_version  # Сохранение в конфиг
+        else:
+            config['package_version'] = None  # Значение по умолчанию: последняя доступная версия
+
+        # Извлечение настройки ASCII вывода
+        ascii_tree_output_elem = root.find('ascii_tree_output')  # Поиск элемента ascii_tree_output
+        if ascii_tree_output_elem is not None and ascii_tree_output_elem.text:  # Проверка наличия и содержимого
+            ascii_text = ascii_tree_output_elem.text.strip().lower()  # Очистка и приведение к нижнему регистру
+            valid_boolean_values = ['true', 'false', '1', '0', 'yes', 'no']  # Допустимые булевы значения
+            if ascii_text not in valid_boolean_values:  # Проверка валидности значения
+                raise ValueError(f"Недопустимое значение для ascii_tree_output: {ascii_tree_output_elem.text}")
+            config['ascii_tree_output'] = ascii_text in ['true', '1', 'yes']  # Преобразование в булево значение
+        else:
+            config['ascii_tree_output'] = False  # Значение по умолчанию
+
+        # Извлечение каталога дискового кеша
+        cache_dir_elem = root.find('cache_dir')  # Поиск элемента cache_dir
+        if cache_dir_elem is not None and cache_dir_elem.text and cache_dir_elem.text.strip():  # Проверка наличия и содержимого
+            config['cache_dir'] = os.path.expanduser(cache_dir_elem.text.strip())  # Сохранение в конфиг
+        else:
+            config['cache_dir'] = CACHE_DIR  # Значение по умолчанию
+
+        # Извлечение пути к бинарному снимку графа
+        snapshot_path_elem = root.find('snapshot_path')  # Поиск элемента snapshot_path
+        if snapshot_path_elem is not None and snapshot_path_elem.text and snapshot_path_elem.text.strip():  # Проверка наличия и содержимого
+            config['snapshot_path'] = os.path.expanduser(snapshot_path_elem.text.strip())  # Сохранение в конфиг
+        else:
+            config['snapshot_path'] = None  # Значение по умолчанию: снимок не используется
+
+        # Извлечение режима запроса
+        query_mode_elem = root.find('query_mode')  # Поиск элемента query_mode
+        if query_mode_elem is not None and query_mode_elem.text:  # Проверка наличия и содержимого
+            query_mode = query_mode_elem.text.strip().lower()  # Очистка и приведение к нижнему регистру
+            valid_query_modes = ['dependencies', 'reverse', 'closure', 'plan']  # Допустимые значения
+            if query_mode not in valid_query_modes:  # Проверка валидности значения
+                raise ValueError(f"Недопустимый режим запроса: {query_mode}")
+            config['query_mode'] = query_mode  # Сохранение в конфиг
+        else:
+            config['query_mode'] = 'dependencies'  # Значение по умолчанию
+
+        # Извлечение порядка сортировки отчета о замыканиях
+        report_sort_elem = root.find('report_sort')  # Поиск элемента report_sort
+        if report_sort_elem is not None and report_sort_elem.text:  # Проверка наличия и содержимого
+            report_sort = report_sort_elem.text.strip().lower()  # Очистка и приведение к нижнему регистру
+            valid_report_sorts = ['installed_size', 'closure_size', 'name']  # Допустимые значения
+            if report_sort not in valid_report_sorts:  # Проверка валидности значения
+                raise ValueError(f"Недопустимый порядок сортировки отчета: {report_sort}")
+            config['report_sort'] = report_sort  # Сохранение в конфиг
+        else:
+            config['report_sort'] = 'installed_size'  # Значение по умолчанию
+
+        # Извлечение режима без сети
+        offline_mode_elem = root.find('offline_mode')  # Поиск элемента offline_mode
+        if offline_mode_elem is not None and offline_mode_elem.text:  # Проверка наличия и содержимого
+            offline_text = offline_mode_elem.text.strip().lower()  # Очистка и приведение к нижнему регистру
+            if offline_text not in ['true', 'false', '1', '0', 'yes', 'no']:  # Проверка валидности значения
+                raise ValueError(f"Недопустимое значение для offline_mode: {offline_mode_elem.text}")
+            config['offline_mode'] = offline_text in ['true', '1', 'yes']  # Преобразование в булево значение
+        else:
+            config['offline_mode'] = False  # Значение по умолчанию
+
+        # Извлечение режима ограниченной памяти
+        lazy_index_elem = root.find('lazy_index')  # Поиск элемента lazy_index
+        if lazy_index_elem is not None and lazy_index_elem.text:  # Проверка наличия и содержимого
+            lazy_text = lazy_index_elem.text.strip().lower()  # Очистка и приведение к нижнему регистру
+            if lazy_text not in ['true', 'false', '1', '0', 'yes', 'no']:  # Проверка валидности значения
+                raise ValueError(f"Недопустимое значение для lazy_index: {lazy_index_elem.text}")
+            config['lazy_index'] = lazy_text in ['true', '1', 'yes']  # Преобразование в булево значение
+        else:
+            config['lazy_index'] = False  # Значение по умолчанию
+
+        # Извлечение предела LRU декодированных записей
+        record_cache_size_elem = root.find('record_cache_size')  # Поиск элемента record_cache_size
+        if record_cache_size_elem is not None and record_cache_size_elem.text:  # Проверка наличия и содержимого
+            cache_size_text = record_cache_size_elem.text.strip()  # Очистка текста
+            if not cache_size_text.isdigit() or int(cache_size_text) < 1:  # Проверка что это положительное число
+                raise ValueError(f"Недопустимый размер кеша записей: {record_cache_size_elem.text}")
+            config['record_cache_size'] = int(cache_size_text)  # Сохранение в конфиг
+        else:
+            config['record_cache_size'] = LAZY_RECORD_CACHE_SIZE  # Значение по умолчанию
+
+        return config  # Возврат конфигурации
+
+    except ET.ParseError as e:  # Обработка ошибок парсинга XML
+        raise ValueError(f"Ошибка парсинга XML: {e}")
+    except FileNotFoundError as e:  # Обработка ошибок файла
+        raise ValueError(f"Файл не найден: {e}")
+    except PermissionError as e:  # Обработка ошибок прав доступа
+        raise ValueError(f"Отсутствуют права доступа к файлу: {e}")
+    except Exception as e:  # Обработка всех остальных ошибок
+        raise ValueError(f"Неожиданная ошибка при загрузке конфигурации: {e}")
+
+
+# Поля записи APKINDEX, которые нужны для построения графа
+APKINDEX_FIELDS = ('P', 'V', 'D', 'p', 'I', 'S', 'C')
+
+# Символы, из которых состоят операторы версий в зависимостях (>=, <, ~, = и т.д.)
+VERSION_OPERATOR_CHARS = '<>=~'
+
+# Ранги суффиксов версий apk: до релиза (_alpha.._rc) и после него (_cvs.._p)
+APK_VERSION_SUFFIXES = {'alpha': 0, 'beta': 1, 'pre': 2, 'rc': 3, 'cvs': 5, 'svn': 6, 'git': 7, 'hg': 8, 'p': 9}
+APK_RELEASE_RANK = 4  # Ранг версии без суффикса (между _rc и _cvs)
+
+
+@functools.lru_cache(maxsize=None)
+def parse_apk_version(version):
+    """Разбирает версию apk (1.2.3a_rc1-r0) в ключ сравнения (None для некорректной версии)"""
+    main, separator, revision = version.rpartition('-r')  # Отделение номера сборки -rN
+    if not separator or not revision.isdigit():  # Номера сборки нет
+        main, revision = version, '0'  # Вся строка - версия
+    core, *suffixes = main.split('_')  # Числовая часть и суффиксы
+    letter = ''  # Необязательная буква после чисел (1.2.3a)
+    if core and core[-1].isalpha():  # Есть буква
+        letter = core[-1]  # Буква версии
+        core = core[:-1]  # Числовая часть без буквы
+    numbers = core.split('.')  # Числовые компоненты
+    if not all(number.isdigit() for number in numbers):  # Некорректная числовая часть
+        return None  # Версия не разбирается
+    suffix_key = []  # Ранги и номера суффиксов
+    for suffix in suffixes:  # Цикл по суффиксам
+        suffix_name = suffix.rstrip('0123456789')  # Имя суффикса
+        if suffix_name not in APK_VERSION_SUFFIXES:  # Неизвестный суффикс
+            return None  # Версия не разбирается
+        suffix_number = suffix[len(suffix_name):]  # Номер суффикса
+        suffix_key.append((APK_VERSION_SUFFIXES[suffix_name], int(suffix_number) if suffix_number else 0))  # Ранг и номер
+    suffix_key.append((APK_RELEASE_RANK, 0))  # Завершающий ранг: 1.0_rc1 < 1.0 < 1.0_p1
+    return tuple(int(number) for number in numbers), letter, tuple(suffix_key), int(revision)  # Ключ сравнения
+
+
+def version_sort_key(version):
+    """Возвращает ключ сортировки версии; некорректные версии упорядочиваются как строки перед корректными"""
+    key = parse_apk_version(version or '')  # Ключ из кеша разбора
+    return (1, key) if key is not None else (0, version or '')  # Корректные версии идут после некорректных
+
+
+def compare_apk_versions(left, right):
+    """Сравнивает две версии apk; возвращает -1, 0 или 1"""
+    left_key, right_key = version_sort_key(left), version_sort_key(right)  # Ключи сравнения
+    return (left_key > right_key) - (left_key < right_key)  # Результат сравнения
+
+
+def version_satisfies(version, operator, constraint):
+    """Проверяет, удовлетворяет ли версия ограничению (>=, <=, >, <, =, ~)"""
+    if not operator:  # Ограничения нет
+        return True  # Подходит любая версия
+    key, bound = parse_apk_version(version or ''), parse_apk_version(constraint)  # Ключи версий
+    if key is None or bound is None:  # Некорректная версия: только точное совпадение
+        return '=' in operator and version == constraint  # Сравнение строк
+    if '~' in operator:  # Нечеткое совпадение: совпадают компоненты, указанные в ограничении
+        return key[0][:len(bound[0])] == bound[0] and (not bound[1] or key[1] == bound[1])  # Префикс версии
+    if operator.startswith('>'):  # Больше (или равно)
+        return key > bound or ('=' in operator and key == bound)  # Сравнение ключей
+    if operator.startswith('<'):  # Меньше (или равно)
+        return key < bound or ('=' in operator and key == bound)  # Сравнение ключей
+    return key == bound  # Точное совпадение версии
+
+
+def iter_apkindex_records(lines):
+    """Последовательно выдает записи APKINDEX (словари полей) из итератора строк"""
+    record = {}  # Поля текущей записи
+    for line in lines:  # Цикл по строкам APKINDEX
+        line = line.rstrip('\r\n')  # Удаляем символы конца строки
+        if not line:  # Пустая строка разделяет записи
+            if record:  # Если запись накоплена
+                yield record  # Выдаем запись
+                record = {}  # Начинаем новую запись
+            continue  # Переходим к следующей строке
+        if len(line) > 1 and line[1] == ':' and line[0] in APKINDEX_FIELDS:  # Интересующее нас поле
+            record[line[0]] = line[2:]  # Сохраняем значение поля
+    if record:  # Последняя запись без завершающей пустой строки
+        yield record  # Выдаем последнюю запись
+
+
+def normalize_apkindex_record(record, repository):
+    """Приводит поля записи к рабочему виду: списки D: и p:, числовые размеры, репозиторий"""
+    dependencies = record.get('D', '')  # Зависимости: строка APKINDEX или готовый список
+    record['D'] = dependencies.split() if isinstance(dependencies, str) else list(dependencies)  # Список зависимостей
+    record['p'] = record.get('p', '').split()  # Список предоставляемых имен
+    record['repository'] = repository  # Репозиторий, из которого получена запись
+    for size_field in ('I', 'S'):  # Размеры установленного пакета и архива
+        value = record.get(size_field, '')  # Строковое значение размера
+        record[size_field] = int(value) if value.isdigit() else 0  # Преобразуем в число
+    return record  # Возврат записи
+
+
+def offer_provider(providers, provider_versions, provided, name, version):
+    """Делает пакет поставщиком имени, если его версия выше, чем у прежнего поставщика (как в apk)"""
+    provided_name, _operator, provided_version, _conflict = parse_dependency_token(provided)  # Имя и версия (so:x=1.2)
+    provided_version = provided_version or version  # Без версии в p: сравнивается версия самого пакета
+    if provided_name not in providers or compare_apk_versions(provided_version, provider_versions[provided_name]) > 0:
+        providers[provided_name] = name  # Поставщик с наибольшей версией (при равенстве остается первый)
+        provider_versions[provided_name] = provided_version  # Версия для следующих сравнений
+
+
+def build_apkindex_index(records, repository=None):
+    """Строит индекс записей APKINDEX по имени (последняя версия) и по паре (имя, версия)"""
+    by_name = {}  # Имя пакета -> запись наибольшей версии
+    by_name_version = {}  # (имя, версия) -> запись
+    packages = []  # Имена пакетов в порядке появления
+    providers = {}  # Предоставляемое имя (so:, cmd:, pc:, ...) -> имя пакета
+    provider_versions = {}  # Предоставляемое имя -> версия выбранного поставщика
+
+    for record in records:  # Цикл по всем записям
+        name = record.get('P')  # Имя пакета
+        if not name:  # Запись без имени пропускаем
+            continue  # Переходим к следующей записи
+        normalize_apkindex_record(record, repository)  # Списки и числа вместо строк полей
+        if name not in by_name:  # Первая запись с таким именем
+            by_name[name] = record  # Сохраняем запись по имени
+            packages.append(name)  # Запоминаем порядок
+        elif compare_apk_versions(record.get('V'), by_name[name].get('V')) > 0:  # Более новая версия того же пакета
+            by_name[name] = record  # По имени хранится последняя версия
+        by_name_version[(name, record.get('V'))] = record  # Сохраняем запись по имени и версии
+        for provided in record['p']:  # Цикл по предоставляемым именам
+            offer_provider(providers, provider_versions, provided, name, record.get('V'))  # Наибольшая версия поставщика
+
+    return {'by_name': by_name, 'by_name_version': by_name_version, 'packages': packages,
+            'providers': providers, 'provider_versions': provider_versions, 'candidates': {}}  # Возврат индекса (кандидаты сортируются при первом запросе)
+
+
+class LazyRecordStore:
+    """Записи одного APKINDEX в виде таблицы смещений в распакованных байтах (mmap); поля декодируются по запросу"""
+
+    def __init__(self, raw_path, repository):
+        self.repository = repository  # Репозиторий записей
+        self.number = next(LAZY_STORE_NUMBERS)  # Номер хранилища в ключах общего LRU
+        with open(raw_path, 'rb') as f:  # Распакованный APKINDEX
+            size = os.fstat(f.fileno()).st_size  # Размер файла
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b''  # Пустой файл не отображается
+        self.starts = array('Q')  # Начало каждой записи
+        self.stops = array('Q')  # Конец каждой записи
+
+    def scan(self):
+        """Один проход по байтам: границы записей и поля P:, V:, p:, нужные для ключей индекса"""
+        data = self.data  # Отображенный файл
+        position = 0  # Начало текущей записи
+        while position < len(data):  # Цикл по записям
+            separator = LAZY_RECORD_SEPARATOR.search(data, position)  # Пустые строки разделяют записи
+            end = separator.start() if separator else len(data)  # Последняя запись может идти до конца файла
+            name = version = provides = None  # Ключевые поля записи
+            for line in data[position:end].split(b'\n'):  # Временная копия одной записи
+                if line[:2] == b'P:':  # Имя пакета
+                    name = line[2:].rstrip(b'\r').decode('utf-8')  # Декодирование имени
+                elif line[:2] == b'V:':  # Версия пакета
+                    version = line[2:].rstrip(b'\r').decode('utf-8')  # Декодирование версии
+                elif line[:2] == b'p:':  # Предоставляемые имена
+                    provides = line[2:].decode('utf-8').split()  # Список имен
+            if name:  # Запись без имени пропускаем
+                self.starts.append(position)  # Смещение начала записи
+                self.stops.append(end)  # Смещение конца записи
+                yield len(self.starts) - 1, name, version, provides or ()  # Номер и ключевые поля
+            position = separator.end() if separator else end  # Следующая запись после пустых строк
+
+    def get(self, number):
+        """Возвращает запись по номеру: из LRU или декодируя ее байты"""
+        key = (self.number, number)  # Ключ записи в общем LRU
+        with LAZY_RECORD_LOCK:  # Доступ к LRU
+            record = LAZY_RECORD_LRU.get(key)  # Поиск в LRU
+            if record is not None:  # Запись уже декодирована
+                LAZY_RECORD_LRU.move_to_end(key)  # Отметка недавнего использования
+                count_metric('lazy_record_hits')  # Учет попадания
+                return record  # Возврат записи
+        lines = self.data[self.starts[number]:self.stops[number]].decode('utf-8').split('\n')  # Строки записи
+        record = normalize_apkindex_record(next(iter_apkindex_records(lines)), self.repository)  # Декодирование полей
+        count_metric('lazy_record_decodes')  # Учет декодирования
+        with LAZY_RECORD_LOCK:  # Доступ к LRU
+            LAZY_RECORD_LRU[key] = record  # Сохранение в LRU
+            while len(LAZY_RECORD_LRU) > max(1, LAZY_RECORD_CACHE_SIZE):  # Превышен общий предел
+                LAZY_RECORD_LRU.popitem(last=False)  # Вытеснение давно не использованной записи любого репозитория
+        return record  # Возврат записи
+
+
+class LazyRecordMapping(Mapping):
+    """Словарь ключ -> запись, хранящий только ссылки (номер хранилища и записи); запись декодируется при обращении"""
+
+    def __init__(self, stores, refs):
+        self.stores = stores  # Хранилища записей (по одному на репозиторий)
+        self.refs = refs  # Ключ -> (номер хранилища << 32) | номер записи
+
+    def __getitem__(self, key):
+        store_number, record_number = divmod(self.refs[key], 1 << 32)  # Разбор ссылки
+        return self.stores[store_number].get(record_number)  # Запись из хранилища
+
+    def __contains__(self, key):
+        return key in self.refs  # Проверка без декодирования
+
+    def __iter__(self):
+        return iter(self.refs)  # Ключи в порядке появления
+
+    def __len__(self):
+        return len(self.refs)  # Количество ключей
+
+
+def build_lazy_apkindex_index(raw_path, repository=None):
+    """Строит индекс с отложенным декодированием записей по распакованному APKINDEX"""
+    store = LazyRecordStore(raw_path, repository)  # Хранилище записей
+    by_name = {}  # Имя пакета -> номер записи наибольшей версии
+    latest = {}  # Имя пакета -> наибольшая версия
+    by_name_version = {}  # (имя, версия) -> номер записи
+    providers = {}  # Предоставляемое имя -> имя пакета
+    provider_versions = {}  # Предоставляемое имя -> версия выбранного поставщика
+    for number, name, version, provides in store.scan():  # Один проход по байтам
+        if name not in by_name or compare_apk_versions(version, latest[name]) > 0:  # Первая или более новая версия
+            by_name[name] = number  # По имени хранится последняя версия
+            latest[name] = version  # Версия для следующих сравнений
+        by_name_version[(name, version)] = number  # Запись по имени и версии
+        for provided in provides:  # Цикл по предоставляемым именам
+            offer_provider(providers, provider_versions, provided, name, version)  # Наибольшая версия поставщика
+    return {'by_name': LazyRecordMapping([store], by_name), 'by_name_version': LazyRecordMapping([store], by_name_version),
+            'packages': list(by_name), 'providers': providers, 'provider_versions': provider_versions,
+            'candidates': {}}  # Индекс того же вида, что и обычный
+
+
+def merge_lazy_apkindex_indexes(indexes):
+    """Объединяет индексы с отложенным декодированием, переписывая только ссылки на записи"""
+    stores = []  # Хранилища всех репозиториев
+    by_name, by_name_version, providers, provider_versions = {}, {}, {}, {}  # Объединенные ссылки и поставщики
+    latest = {}  # Имя пакета -> наибольшая версия среди репозиториев
+    for apkindex_index in indexes:  # Цикл от важного репозитория к менее важному
+        base = len(stores) << 32  # Сдвиг номеров хранилищ этого индекса
+        stores.extend(apkindex_index['by_name'].stores)  # Хранилища индекса
+        for key, ref in apkindex_index['by_name_version'].refs.items():  # Ссылки по версиям
+            by_name_version.setdefault(key, ref + base)  # Важный репозиторий имеет приоритет
+            name, version = key  # Имя и версия записи
+            if name not in by_name or compare_apk_versions(version, latest[name]) > 0:  # Более новая версия
+                by_name[name] = by_name_version[key]  # По имени - наибольшая версия (при равенстве - важный репозиторий)
+                latest[name] = version  # Версия для следующих сравнений
+        for provided_name, name in apkindex_index['providers'].items():  # Цикл по поставщикам
+            offer_provider(providers, provider_versions, provided_name, name,
+                           apkindex_index['provider_versions'][provided_name])  # При равенстве - важный репозиторий
+    return {'by_name': LazyRecordMapping(stores, by_name), 'by_name_version': LazyRecordMapping(stores, by_name_version),
+            'packages': list(by_name), 'providers': providers, 'provider_versions': provider_versions,
+            'candidates': {}}  # Объединенный индекс
+
+
+def parse_dependency_token(token):
+    """Разбирает токен зависимости на имя, оператор версии, версию и флаг конфликта"""
+    conflict = token.startswith('!')  # Конфликт обозначается восклицательным знаком
+    if conflict:  # Если это конфликт
+        token = token[1:]  # Убираем восклицательный знак
+
+    name_end = len(token)  # Позиция конца имени
+    for position, char in enumerate(token):  # Ищем начало оператора версии
+        if char in VERSION_OPERATOR_CHARS:  # Найден символ оператора
+            name_end = position  # Запоминаем конец имени
+            break  # Прерываем поиск
+
+    name = token[:name_end]  # Имя зависимости
+    rest = token[name_end:]  # Оператор и версия
+    operator_end = 0  # Позиция конца оператора
+    while operator_end < len(rest) and rest[operator_end] in VERSION_OPERATOR_CHARS:  # Оператор может быть составным
+        operator_end += 1  # Сдвигаем позицию
+    operator = rest[:operator_end]  # Оператор версии
+    version = rest[operator_end:]  # Версия
+
+    if '@' in name:  # Привязка к тегу репозитория (name@testing)
+        name = name.split('@', 1)[0]  # Отбрасываем тег
+
+    return name, operator, version, conflict  # Возврат разобранного токена
+
+
+def resolve_dependency(apkindex_index, token):
+    """Разрешает токен зависимости D: в имя пакета-поставщика (None для конфликтов)"""
+    name, _operator, _version, conflict = parse_dependency_token(token)  # Разбор токена
+    if conflict or not name:  # Конфликты не являются зависимостями
+        return None  # Нечего разрешать
+    if name in apkindex_index['by_name']:  # Имя является реальным пакетом
+        return sys.intern(name)  # Одна строка на имя вместо копии из каждого токена
+    return apkindex_index['providers'].get(name) or sys.intern(name)  # Поставщик или исходное имя, если поставщика нет
+
+
+def parse_apkindex(apkindex_content):
+    """Парсит содержимое APKINDEX в индекс записей за один проход"""
+    return build_apkindex_index(iter_apkindex_records(apkindex_content.split('\n')))  # Построение индекса
+
+
+def get_apkindex_url(repository_url):
+    """Формирует URL файла APKINDEX.tar.gz для репозитория"""
+    if repository_url.endswith('/'):  # Проверка завершается ли URL слешем
+        return repository_url + 'APKINDEX.tar.gz'  # Формирование URL без дополнительного слеша
+    return repository_url + '/APKINDEX.tar.gz'  # Формирование URL с добавлением слеша
+
+
+def get_repository_cache_dir(repository_url):
+    """Возвращает каталог дискового кеша для URL репозитория"""
+    key = hashlib.sha256(repository_url.encode('utf-8')).hexdigest()[:32]  # Ключ кеша по URL
+    return os.path.join(CACHE_DIR, key)  # Каталог репозитория в кеше
+
+
+def load_cache_metadata(cache_dir):
+    """Читает метаданные (ETag, Last-Modified) кешированного архива"""
+    meta_path = os.path.join(cache_dir, 'meta.json')  # Путь к файлу метаданных
+    try:
+        with open(meta_path, 'r', encoding='utf-8') as f:  # Открытие файла метаданных
+            return json.load(f)  # Возврат метаданных
+    except (OSError, ValueError):  # Метаданных нет или они повреждены
+        return {}  # Пустые метаданные
+
+
+def save_cache_metadata(cache_dir, metadata):
+    """Атомарно сохраняет метаданные кешированного архива"""
+    meta_path = os.path.join(cache_dir, 'meta.json')  # Путь к файлу метаданных
+    tmp_path = f"{meta_path}.{os.getpid()}.{threading.get_ident()}.tmp"  # Временный файл потока
+    with open(tmp_path, 'w', encoding='utf-8') as f:  # Запись во временный файл
+        json.dump(metadata, f, ensure_ascii=False, indent=2)  # Сериализация метаданных
+    os.replace(tmp_path, meta_path)  # Атомарная замена
+
+
+def mark_archive_validated(cache_dir, archive_path, metadata):
+    """Запоминает в метаданных кеша время перепроверки и контрольную сумму архива"""
+    metadata = dict(metadata, checked=time.time())  # Время последней перепроверки
+    if not metadata.get('sha256'):  # Архив скачан заново (после 304 сумма прежняя)
+        metadata['sha256'] = file_checksum(archive_path)  # Контрольная сумма архива
+    save_cache_metadata(cache_dir, metadata)  # Сохранение метаданных
+
+
+class TeeReader:
+    """Файловый объект для чтения, копирующий все прочитанные данные в другой файл"""
+
+    def __init__(self, source, sink):
+        self.source = source  # Исходный поток (HTTP-ответ)
+        self.sink = sink  # Файл, в который копируются данные
+        self.bytes_read = 0  # Количество прочитанных байт
+
+    def read(self, size=-1):
+        start = time.perf_counter()  # Начало чтения из сети
+        data = self.source.read(size)  # Чтение блока из источника
+        add_phase_time('network_read', time.perf_counter() - start)  # Время ожидания сети
+        if data:  # Если данные есть
+            self.sink.write(data)  # Копирование в файл
+            self.bytes_read += len(data)  # Учет прочитанных байт
+            count_metric('bytes_downloaded', len(data))  # Учет скачанных байт
+        return data  # Возврат блока читающему
+
+    def drain(self, chunk_size=64 * 1024):
+        """Дочитывает остаток источника (чтобы копия в файле была полной)"""
+        while self.read(chunk_size):  # Чтение до конца потока
+            pass  # Данные уже скопированы в read
+
+
+def get_mirror_stats_path():
+    """Возвращает путь к файлу статистики зеркал в каталоге кеша"""
+    return os.path.join(CACHE_DIR, MIRROR_STATS_FILE)  # Статистика общая для всех репозиториев
+
+
+def load_mirror_stats():
+    """Читает статистику задержек и ошибок зеркал прошлых запусков"""
+    try:
+        with open(get_mirror_stats_path(), 'r', encoding='utf-8') as f:  # Открытие файла статистики
+            return json.load(f)  # Возврат статистики
+    except (OSError, ValueError):  # Статистики нет или она повреждена
+        return {}  # Пустая статистика
+
+
+def record_mirror_result(mirror_url, latency=None, error=None):
+    """Обновляет статистику зеркала: сглаженную задержку ответа или ошибку; сохраняет файл атомарно"""
+    with MIRROR_STATS_LOCK:  # Одна запись за раз
+        stats = load_mirror_stats()  # Актуальная статистика с диска
+        entry = stats.setdefault(mirror_url, {'latency': None, 'successes': 0, 'failures': 0, 'consecutive_failures': 0})
+        if error is None:  # Успешный ответ
+            previous = entry['latency']  # Прежняя оценка задержки
+            entry['latency'] = latency if previous is None else 0.7 * previous + 0.3 * latency  # Экспоненциальное сглаживание
+            entry['successes'] += 1  # Учет успеха
+            entry['consecutive_failures'] = 0  # Серия ошибок прервана
+        else:
+            entry['failures'] += 1  # Учет ошибки
+            entry['consecutive_failures'] += 1  # Продолжение серии ошибок
+            entry['last_error'] = str(error)[:200]  # Последняя ошибка
+        entry['updated'] = time.time()  # Время обновления
+        os.makedirs(CACHE_DIR, exist_ok=True)  # Создание каталога кеша
+        tmp_path = get_mirror_stats_path() + f'.{os.getpid()}.tmp'  # Временный файл процесса
+        with open(tmp_path, 'w', encoding='utf-8') as f:  # Запись во временный файл
+            json.dump(stats, f, ensure_ascii=False, indent=2)  # Сериализация статистики
+        os.replace(tmp_path, get_mirror_stats_path())  # Атомарная замена
+
+
+def mirror_score(entry):
+    """Оценка зеркала для выбора: сглаженная задержка плюс штраф за серию ошибок (меньше - лучше)"""
+    if entry is None or entry['latency'] is None:  # Зеркало еще ни разу не ответило
+        return float('inf')  # В конец списка
+    return entry['latency'] + entry['consecutive_failures'] * MIRROR_FAILURE_PENALTY  # Задержка со штрафом
+
+
+def probe_mirror(mirror_url):
+    """Пробный HEAD-запрос к APKINDEX зеркала; возвращает время ответа в секундах"""
+    request = urllib.request.Request(get_apkindex_url(mirror_url), method='HEAD')  # Запрос без тела архива
+    count_metric('mirror_probes')  # Учет пробного запроса
+    start = time.perf_counter()  # Начало запроса
+    with urllib.request.urlopen(request, timeout=MIRROR_PROBE_TIMEOUT):  # Ожидание заголовков ответа
+        return time.perf_counter() - start  # Время ответа
+
+
+def rank_mirrors(mirror_urls):
+    """Упорядочивает зеркала по статистике; зеркала без статистики или с давними ошибками сначала опрашиваются"""
+    stats = load_mirror_stats()  # Статистика прошлых запусков
+    unknown = [url for url in mirror_urls if url not in stats or (stats[url]['consecutive_failures'] and
+               time.time() - stats[url].get('updated', 0) > MIRROR_RETRY_INTERVAL)]  # Зеркала для опроса
+    if unknown:  # Нужен пробный опрос
+        def probe(url):
+            try:
+                record_mirror_result(url, latency=probe_mirror(url))  # Задержка ответа
+            except (OSError, ValueError) as e:  # Сетевая ошибка или таймаут
+                record_mirror_result(url, error=e)  # Ошибка зеркала
+        with ThreadPoolExecutor(max_workers=len(unknown)) as executor:  # Опрос всех неизвестных зеркал сразу
+            list(executor.map(probe, unknown))  # Ожидание всех пробных запросов
+        stats = load_mirror_stats()  # Статистика с результатами опроса
+    order = {url: position for position, url in enumerate(mirror_urls)}  # Порядок из конфигурации
+    ranked = sorted(mirror_urls, key=lambda url: (mirror_score(stats.get(url)), order[url]))  # Лучшие первыми
+    healthy = sum(1 for url in ranked if not stats.get(url, {}).get('consecutive_failures'))  # Зеркала без ошибок
+    return ranked, healthy  # Порядок и число зеркал, пригодных для гонки
+
+
+def validate_apkindex_archive(archive_path):
+    """Проверяет, что архив целиком распаковывается (контрольная сумма gzip) и содержит APKINDEX"""
+    found = False  # Найден ли APKINDEX
+    try:
+        with tarfile.open(archive_path, mode='r|gz') as tar:  # Потоковое чтение всего архива
+            for member in tar:  # Цикл по элементам архива
+                member_file = tar.extractfile(member)  # Поток содержимого элемента
+                while member_file is not None and member_file.read(64 * 1024):  # Полное чтение элемента
+                    pass  # Данные нужны только для проверки
+                found = found or member.name == 'APKINDEX'  # Отметка индекса
+    except Exception as e:  # Поврежденный gzip или tar
+        raise ValueError(f"Поврежденный архив APKINDEX: {e}")
+    if not found:  # Архив без индекса
+        raise ValueError("В архиве отсутствует файл APKINDEX")
+
+
+class MirrorCancelled(Exception):
+    """Загрузка с зеркала отменена: другое зеркало уже отдало архив"""
+
+
+def download_from_mirror(mirror_url, headers, tmp_path, cancel_event):
+    """Скачивает и проверяет архив одного зеркала; возвращает ('downloaded'|'not_modified', заголовки ответа)"""
+    request = urllib.request.Request(get_apkindex_url(mirror_url), headers=headers)  # Запрос (возможно, условный)
+    count_metric('http_requests')  # Учет HTTP-запроса
+    start = time.perf_counter()  # Начало запроса
+    try:
+        response = urllib.request.urlopen(request, timeout=HTTP_TIMEOUT)  # Ожидание заголовков
+    except urllib.error.HTTPError as e:  # Ответ с кодом ошибки
+        if e.code == 304:  # Архив не изменился
+            record_mirror_result(mirror_url, latency=time.perf_counter() - start)  # Зеркало ответило
+            return 'not_modified', e.headers  # Кеш актуален
+        raise  # Остальные ошибки пробрасываем
+    latency = time.perf_counter() - start  # Задержка до заголовков ответа (учитывается только после проверки архива)
+    try:
+        with response, open(tmp_path, 'wb') as sink:  # Поток ответа и временный файл зеркала
+            tee = TeeReader(response, sink)  # Чтение с записью в файл и учетом байт
+            while tee.read(64 * 1024):  # Чтение блоками
+                if cancel_event.is_set():  # Другое зеркало уже победило
+                    raise MirrorCancelled()  # Прерываем загрузку
+        validate_apkindex_archive(tmp_path)  # Битый архив считается ошибкой зеркала
+    except BaseException:  # Загрузка прервана, отменена или архив поврежден
+        if os.path.exists(tmp_path):  # Удаляем неполную копию
+            os.remove(tmp_path)  # Удаление временного файла
+        raise  # Пробрасываем ошибку дальше
+    record_mirror_result(mirror_url, latency=latency)  # Успех засчитывается только целому архиву
+    return 'downloaded', response.headers  # Архив скачан и проверен
+
+
+def fetch_from_mirrors(repository_url, mirror_urls, headers, archive_path):
+    """Гонка загрузки между самыми быстрыми зеркалами с отменой проигравших и переходом к следующим при ошибках"""
+    candidates, healthy = rank_mirrors(mirror_urls)  # Зеркала от лучшего к худшему
+    cancel_event = threading.Event()  # Сигнал отмены для проигравших
+    results = queue.Queue()  # Результаты потоков загрузки
+    errors = []  # Ошибки зеркал
+
+    def race(position, mirror_url):
+        tmp_path = f"{archive_path}.{os.getpid()}.{threading.get_ident()}.{position}.tmp"  # Отдельный временный файл зеркала
+        try:
+            status, response_headers = download_from_mirror(mirror_url, headers, tmp_path, cancel_event)  # Загрузка
+            if cancel_event.is_set() and status == 'downloaded':  # Зеркало закончило уже после победителя
+                os.remove(tmp_path)  # Лишняя копия не нужна
+                raise MirrorCancelled()  # Считаем загрузку отмененной
+            results.put((mirror_url, tmp_path, status, response_headers, None))  # Успех
+        except MirrorCancelled:  # Проигравшее зеркало
+            results.put((mirror_url, tmp_path, 'cancelled', None, None))  # Отмена не считается ошибкой
+        except Exception as e:  # Таймаут, ошибка HTTP или битый архив
+            record_mirror_result(mirror_url, error=e)  # Штраф зеркалу (и после победы другого)
+            results.put((mirror_url, tmp_path, 'failed', None, e))  # Ошибка зеркала
+
+    started = [0]  # Количество запущенных загрузок
+
+    def start_next():
+        if not candidates:  # Зеркала закончились
+            return False  # Запускать нечего
+        mirror_url = candidates.pop(0)  # Лучшее из оставшихся
+        print(f"Скачиваем {get_apkindex_url(mirror_url)}...")  # Сообщение о начале загрузки
+        threading.Thread(target=race, args=(started[0], mirror_url), daemon=True).start()  # Фоновый поток
+        started[0] += 1  # Учет запущенной загрузки
+        return True  # Загрузка запущена
+
+    os.makedirs(os.path.dirname(archive_path), exist_ok=True)  # Создание каталога кеша
+    race_width = max(1, min(MIRROR_RACE_WIDTH, healthy))  # Сбоящие зеркала в гонку не берутся, только на замену
+    running = sum(start_next() for _ in range(race_width))  # Гонка нескольких лучших зеркал
+    while running:  # Ожидание первого успешного зеркала
+        mirror_url, tmp_path, status, response_headers, error = results.get()  # Очередной результат
+        running -= 1  # Поток завершился
+        if status in ('downloaded', 'not_modified'):  # Победитель
+            cancel_event.set()  # Отмена остальных загрузок
+            if status == 'downloaded':  # Новый архив
+                os.replace(tmp_path, archive_path)  # Атомарная замена архива в кеше
+            return mirror_url, status, response_headers  # Зеркало, результат и заголовки
+        if status == 'failed':  # Ошибка зеркала
+            print(f"Зеркало {mirror_url} недоступно: {error}")  # Сообщение об ошибке
+            errors.append(f"{mirror_url}: {error}")  # Сохранение ошибки
+            count_metric('mirror_failovers')  # Учет перехода к другому зеркалу
+            running += start_next()  # Замена упавшего зеркала следующим
+    raise ValueError(f"Ни одно зеркало {repository_url} не отдало APKINDEX: " + "; ".join(errors))
+
+
+@contextlib.contextmanager
+def open_apkindex_archive(repository_url):
+    """Открывает поток APKINDEX.tar.gz: из дискового кеша или из сети с одновременной записью в кеш"""
+    cache_dir = get_repository_cache_dir(repository_url)  # Каталог кеша репозитория
+    archive_path = os.path.join(cache_dir, 'APKINDEX.tar.gz')  # Путь к кешированному архиву
+    metadata = load_cache_metadata(cache_dir)  # Метаданные прошлой загрузки
+    has_cached = os.path.isfile(archive_path)  # Есть ли локальная копия
+
+    if OFFLINE_MODE:  # Режим без сети
+        if not has_cached:  # Локальной копии нет
+            raise ValueError(f"Нет локальной копии APKINDEX для {repository_url} (режим offline)")
+        print(f"Используем кеш {archive_path} (режим offline)")  # Сообщение об использовании кеша
+        count_metric('disk_cache_hits')  # Архив взят из кеша без сети
+        with open(archive_path, 'rb') as f:  # Открытие локальной копии
+            yield f  # Отдаем поток читающему
+        return  # Сеть не используется
+
+    if repository_url in VALIDATED_ARCHIVES and has_cached:  # Архив уже перепроверен в этом запуске
+        with open(archive_path, 'rb') as f:  # Открытие локальной копии
+            yield f  # Отдаем поток читающему
+        return  # Повторный запрос не нужен
+
+    conditional_headers = {}  # Заголовки условного запроса
+    if has_cached:  # Если есть локальная копия, делаем условный запрос
+        if metadata.get('etag'):  # Есть ETag
+            conditional_headers['If-None-Match'] = metadata['etag']  # Условие по ETag
+        if metadata.get('last_modified'):  # Есть Last-Modified
+            conditional_headers['If-Modified-Since'] = metadata['last_modified']  # Условие по дате
+
+    mirror_urls = REPOSITORY_MIRRORS.get(repository_url)  # Зеркала репозитория
+    if mirror_urls and len(mirror_urls) > 1:  # Несколько зеркал: гонка с переходом при ошибках
+        mirror_url, status, headers = fetch_from_mirrors(repository_url, mirror_urls,
+                                                         conditional_headers if has_cached else {}, archive_path)
+        VALIDATED_ARCHIVES.add(repository_url)  # Запоминаем перепроверку
+        if status == 'not_modified':  # Архив не изменился
+            print("APKINDEX не изменился, используем кеш")  # Сообщение об использовании кеша
+            count_metric('disk_cache_hits')  # Ответ 304: используем кеш
+            mark_archive_validated(cache_dir, archive_path, metadata)  # Время перепроверки
+        else:
+            count_metric('disk_cache_misses')  # Архив скачан заново
+            mark_archive_validated(cache_dir, archive_path, {  # Метаданные для следующей перепроверки
+                'url': repository_url,  # URL репозитория
+                'mirror': mirror_url,  # Зеркало, отдавшее архив
+                'etag': headers.get('ETag'),  # ETag ответа
+                'last_modified': headers.get('Last-Modified'),  # Дата изменения
+            })
+        with open(archive_path, 'rb') as f:  # Проверенная локальная копия
+            yield f  # Отдаем поток читающему
+        return  # Загрузка завершена
+
+    apkindex_url = get_apkindex_url(repository_url)  # URL архива
+    request = urllib.request.Request(apkindex_url, headers=conditional_headers)  # HTTP-запрос
+
+    print(f"Скачиваем {apkindex_url}...")  # Сообщение о начале загрузки
+    count_metric('http_requests')  # Учет HTTP-запроса
+    try:
+        response = urllib.request.urlopen(request, timeout=HTTP_TIMEOUT)  # Выполнение запроса
+    except urllib.error.HTTPError as e:  # Ответ с кодом ошибки
+        if e.code == 304 and has_cached:  # Архив не изменился
+            print("APKINDEX не изменился, используем кеш")  # Сообщение об использовании кеша
+            VALIDATED_ARCHIVES.add(repository_url)  # Запоминаем перепроверку
+            count_metric('disk_cache_hits')  # Ответ 304: используем кеш
+            mark_archive_validated(cache_dir, archive_path, metadata)  # Время перепроверки
+            with open(archive_path, 'rb') as f:  # Открытие локальной копии
+                yield f  # Отдаем поток читающему
+            return  # Загрузка не нужна
+        raise  # Остальные ошибки пробрасываем
+
+    count_metric('disk_cache_misses')  # Архив скачивается заново
+    os.makedirs(cache_dir, exist_ok=True)  # Создание каталога кеша
+    tmp_path = f"{archive_path}.{os.getpid()}.{threading.get_ident()}.tmp"  # Временный файл потока (стороны сравнения грузятся параллельно)
+    try:
+        with response, open(tmp_path, 'wb') as sink:  # Поток ответа и временный файл кеша
+            tee = TeeReader(response, sink)  # Чтение с одновременной записью в кеш
+            yield tee  # Разбор идет параллельно с загрузкой
+            tee.drain()  # Дочитываем хвост архива для полной копии
+            headers = response.headers  # Заголовки ответа
+    except BaseException:  # Загрузка или разбор прерваны
+        if os.path.exists(tmp_path):  # Удаляем неполную копию
+            os.remove(tmp_path)  # Удаление временного файла
+        raise  # Пробрасываем ошибку дальше
+    os.replace(tmp_path, archive_path)  # Атомарная замена архива в кеше
+    VALIDATED_ARCHIVES.add(repository_url)  # Запоминаем перепроверку
+
+    mark_archive_validated(cache_dir, archive_path, {  # Сохранение метаданных для следующей перепроверки
+        'url': repository_url,  # URL репозитория
+        'etag': headers.get('ETag'),  # ETag ответа
+        'last_modified': headers.get('Last-Modified'),  # Дата изменения
+    })
+
+
+def fetch_apkindex_archive(repository_url):
+    """Возвращает путь к актуальному APKINDEX.tar.gz в дисковом кеше с условной перепроверкой"""
+    with open_apkindex_archive(repository_url):  # Перепроверка и при необходимости загрузка
+        pass  # Менеджер контекста сам дочитывает и сохраняет архив
+    return os.path.join(get_repository_cache_dir(repository_url), 'APKINDEX.tar.gz')  # Путь к архиву
+
+
+def iter_stream_lines(binary_stream, chunk_size=64 * 1024):
+    """Читает бинарный поток блоками и выдает декодированные строки без загрузки всего потока в память"""
+    tail = b''  # Неполная строка с конца предыдущего блока
+    while True:  # Чтение блоками
+        start = time.perf_counter()  # Начало чтения (распаковка gzip/tar и ожидание источника)
+        chunk = binary_stream.read(chunk_size)  # Очередной блок
+        add_phase_time('archive_read', time.perf_counter() - start)  # Время распаковки вместе с чтением источника
+        if not chunk:  # Поток закончился
+            break  # Выход из цикла
+        count_metric('bytes_decompressed', len(chunk))  # Учет распакованных байт
+        lines = (tail + chunk).split(b'\n')  # Разбиение на строки
+        tail = lines.pop()  # Последняя строка может быть неполной
+        for line in lines:  # Цикл по полным строкам
+            yield line.decode('utf-8')  # Выдаем декодированную строку
+    if tail:  # Последняя строка без перевода строки
+        yield tail.decode('utf-8')  # Выдаем ее
+
+
+def iter_apkindex_archive_lines(archive_stream):
+    """Потоково распаковывает gzip и tar и выдает строки файла APKINDEX"""
+    with tarfile.open(fileobj=archive_stream, mode='r|gz') as tar:  # Потоковое чтение tar.gz без перемотки
+        for member in tar:  # Цикл по элементам архива в порядке следования
+            if member.name != 'APKINDEX':  # Подпись и DESCRIPTION пропускаем
+                continue  # Переходим к следующему элементу
+            member_file = tar.extractfile(member)  # Поток содержимого APKINDEX
+            yield from iter_stream_lines(member_file)  # Построчное декодирование по мере распаковки
+            return  # APKINDEX в архиве один
+    raise ValueError("В архиве отсутствует файл APKINDEX")  # Архив без индекса
+
+
+def load_apkindex_index(repository_url):
+    """Потоково получает APKINDEX.tar.gz одного репозитория (через дисковый кеш) и строит индекс записей"""
+    if LAZY_INDEX:  # Режим ограниченной памяти
+        return load_lazy_apkindex_index(repository_url)  # Записи декодируются по запросу
+    with open_apkindex_archive(repository_url) as archive_stream:  # Поток архива из кеша или сети
+        lines = iter_apkindex_archive_lines(archive_stream)  # Строки APKINDEX по мере распаковки
+        return build_apkindex_index(iter_apkindex_records(lines), repository_url)  # Разбор по мере поступления
+
+
+def load_lazy_apkindex_index(repository_url):
+    """Распаковывает APKINDEX репозитория в файл кеша (если архив изменился) и строит по нему индекс с отложенным декодированием"""
+    cache_dir = get_repository_cache_dir(repository_url)  # Каталог кеша репозитория
+    raw_path = os.path.join(cache_dir, 'APKINDEX.raw')  # Распакованный индекс
+    archive_path = fetch_apkindex_archive(repository_url)  # Перепроверка и при необходимости загрузка архива
+    metadata = load_cache_metadata(cache_dir)  # Метаданные архива
+    checksum = metadata.get('sha256') or file_checksum(archive_path)  # Сумма архива (без метаданных - по файлу)
+    if os.path.isfile(raw_path) and metadata.get('raw_sha256') == checksum:  # Архив не менялся с прошлой распаковки
+        return build_lazy_apkindex_index(raw_path, repository_url)  # Готовый файл используется повторно
+
+    with tarfile.open(archive_path, mode='r|gz') as tar:  # Потоковая распаковка локальной копии
+        member = next((member for member in tar if member.name == 'APKINDEX'), None)  # Элемент индекса
+        if member is None:  # Архив без индекса
+            raise ValueError("В архиве отсутствует файл APKINDEX")
+        tmp_path = f"{raw_path}.{os.getpid()}.{threading.get_ident()}.tmp"  # Временный файл потока
+        with open(tmp_path, 'wb') as raw:  # Запись распакованных байт
+            member_file = tar.extractfile(member)  # Поток содержимого APKINDEX
+            while True:  # Копирование блоками
+                chunk = member_file.read(64 * 1024)  # Очередной блок
+                if not chunk:  # Конец элемента
+                    break  # Выход из цикла
+                count_metric('bytes_decompressed', len(chunk))  # Учет распакованных байт
+                raw.write(chunk)  # Запись блока
+    os.replace(tmp_path, raw_path)  # Атомарная замена (прежнее отображение остается действительным)
+    save_cache_metadata(cache_dir, dict(load_cache_metadata(cache_dir), raw_sha256=checksum))  # Сумма распакованного архива
+    return build_lazy_apkindex_index(raw_path, repository_url)  # Индекс по таблице смещений
+
+
+def merge_apkindex_indexes(indexes):
+    """Объединяет индексы нескольких репозиториев (в порядке убывания приоритета); по имени - наибольшая версия"""
+    if all(isinstance(apkindex_index['by_name'], LazyRecordMapping) for apkindex_index in indexes):  # Отложенные индексы
+        return merge_lazy_apkindex_indexes(indexes)  # Объединение без декодирования записей
+    merged = {'by_name': {}, 'by_name_version': {}, 'packages': [], 'providers': {}, 'provider_versions': {},
+              'candidates': {}}  # Объединенный индекс
+    for apkindex_index in indexes:  # Цикл по индексам от важного к менее важному
+        for name in apkindex_index['packages']:  # Цикл по пакетам репозитория
+            record = apkindex_index['by_name'][name]  # Последняя версия пакета в этом репозитории
+            if name not in merged['by_name']:  # Пакет еще не предоставлен более важным репозиторием
+                merged['by_name'][name] = record  # Запись из этого репозитория
+                merged['packages'].append(name)  # Запоминаем порядок
+            elif compare_apk_versions(record.get('V'), merged['by_name'][name].get('V')) > 0:  # Здесь версия новее
+                merged['by_name'][name] = record  # При равных версиях остается важный репозиторий
+        for key, record in apkindex_index['by_name_version'].items():  # Цикл по версиям пакетов
+            merged['by_name_version'].setdefault(key, record)  # Важный репозиторий имеет приоритет
+        for provided_name, name in apkindex_index['providers'].items():  # Цикл по поставщикам
+            offer_provider(merged['providers'], merged['provider_versions'], provided_name, name,
+                           apkindex_index['provider_versions'][provided_name])  # При равенстве - важный репозиторий
+    return merged  # Возврат объединенного индекса
+
+
+def download_and_parse_apkindex(repository_url):
+    """Получает индекс APKINDEX одного или нескольких репозиториев (параллельно) с кешированием"""
+    global APKINDEX_CACHE, APKINDEX_URL  # Объявление глобальных переменных для кеширования
+
+    if isinstance(repository_url, (list, tuple)):  # Передан список репозиториев
+        repository_url = tuple(repository_url)  # Кортеж используется как ключ кеша
+    if APKINDEX_URL == repository_url and APKINDEX_CACHE is not None:  # Проверка кеша
+        return APKINDEX_CACHE  # Возврат кешированного индекса (обычное обращение, не кеш-попадание в метриках)
+
+    try:
+        with measure_phase('download_and_parse'):  # Загрузка, распаковка и разбор (идут одновременно)
+            if isinstance(repository_url, tuple):  # Несколько репозиториев
+                with ThreadPoolExecutor(max_workers=max(1, len(repository_url))) as executor:  # Пул потоков загрузки
+                    indexes = list(executor.map(load_apkindex_index, repository_url))  # Параллельная загрузка с сохранением порядка
+                apkindex_index = indexes[0] if len(indexes) == 1 else merge_apkindex_indexes(indexes)  # Объединение
+            else:
+                apkindex_index = load_apkindex_index(repository_url)  # Один репозиторий
+
+        APKINDEX_CACHE = apkindex_index  # Сохранение индекса в кеш
+        APKINDEX_URL = repository_url  # Сохранение URL в кеш
+
+        return apkindex_index  # Возврат индекса
+
+    except Exception as e:  # Обработка всех исключений
+        raise ValueError(f"Ошибка при загрузке APKINDEX: {e}")  # Преобразование в ValueError с сообщением
+
+
+def get_all_packages_from_apkindex(repository_url):
+    """Получает список всех пакетов из APKINDEX"""
+    apkindex_index = download_and_parse_apkindex(repository_url)  # Загрузка и индексирование APKINDEX
+    return list(apkindex_index['packages'])  # Возврат списка всех уникальных пакетов
+
+
+def iter_test_repository_records(lines):
+    """Выдает записи тестового репозитория (строки вида "A: B, C") в формате записей APKINDEX"""
+    for line in lines:  # Цикл по строкам файла
+        line = line.strip()  # Удаление пробелов в начале и конце
+        if line and ':' in line and not line.startswith('#'):  # Проверка на валидную строку (не пустая, содержит :, не комментарий)
+            pkg, deps_str = line.split(':', 1)  # Разделение строки на имя пакета и зависимости
+            pkg = pkg.strip()  # Очистка имени пакета от пробелов
+            if pkg:  # Если имя не пустое
+                yield {'P': pkg, 'D': [dep.strip() for dep in deps_str.split(',') if dep.strip()]}  # Запись пакета
+
+
+def load_test_repository_index(test_repo_path):
+    """Строит индекс тестового репозитория за один потоковый проход по файлу с кешированием"""
+    global APKINDEX_CACHE, APKINDEX_URL  # Объявление глобальных переменных для кеширования
+
+    cache_key = ('test', test_repo_path)  # Ключ кеша, не совпадающий с URL репозиториев
+    if APKINDEX_URL == cache_key and APKINDEX_CACHE is not None:  # Проверка кеша
+        return APKINDEX_CACHE  # Возврат кешированного индекса
+
+    try:
+        if not os.path.exists(test_repo_path):  # Проверка существования файла
+            raise ValueError(f"Тестовый файл не найден: {test_repo_path}")  # Ошибка если файл не найден
+
+        with open(test_repo_path, 'r', encoding='utf-8') as f:  # Открытие файла для чтения
+            test_index = build_apkindex_index(iter_test_repository_records(f), test_repo_path)  # Построчный разбор
+
+        APKINDEX_CACHE = test_index  # Сохранение индекса в кеш
+        APKINDEX_URL = cache_key  # Сохранение ключа в кеш
+        return test_index  # Возврат индекса
+
+    except Exception as e:  # Обработка всех исключений
+        raise ValueError(f"Ошибка чтения тестового файла: {e}")  # Преобразование исключения в ValueError
+
+
+def get_all_packages_from_test_file(test_repo_path):
+    """Получает список всех пакетов из тестового файла"""
+    return list(load_test_repository_index(test_repo_path)['packages'])  # Возврат списка всех пакетов
+
+
+def get_version_candidates(apkindex_index, package_name):
+    """Возвращает версии пакета, отсортированные по возрастанию: (ключи сортировки, строки версий); строится один раз на имя"""
+    if 'versions' not in apkindex_index:  # Группировка версий по имени выполняется один раз на индекс
+        versions = {}  # Имя -> строки всех версий
+        for name, version in apkindex_index['by_name_version']:  # Цикл по ключам (записи не декодируются)
+            versions.setdefault(name, []).append(version)  # Версия пакета
+        apkindex_index['versions'] = versions  # Сохранение группировки
+    candidates = apkindex_index['candidates'].get(package_name)  # Кеш отсортированных кандидатов
+    if candidates is None:  # Кандидаты еще не сортировались
+        versions = sorted(apkindex_index['versions'].get(package_name, ()), key=version_sort_key)  # Сортировка по версии apk
+        candidates = ([version_sort_key(version) for version in versions], versions)  # Ключи и версии
+        apkindex_index['candidates'][package_name] = candidates  # Сохранение в кеш
+    return candidates  # Возврат кандидатов
+
+
+def select_version_candidate(apkindex_index, package_name, operator, constraint):
+    """Выбирает наибольшую версию пакета, удовлетворяющую ограничению, бинарным поиском (None, если подходящей нет)"""
+    if not operator:  # Ограничения нет
+        return apkindex_index['by_name'].get(package_name)  # Наибольшая версия (по имени хранится последняя)
+    keys, versions = get_version_candidates(apkindex_index, package_name)  # Отсортированные кандидаты
+    bound = parse_apk_version(constraint)  # Ключ ограничения
+    if bound is None:  # Некорректное ограничение: только точное совпадение строки
+        return apkindex_index['by_name_version'].get((package_name, constraint)) if constraint in versions else None
+    if '~' in operator:  # Нечеткое совпадение: верхняя граница по числовому префиксу
+        position = bisect.bisect_left(keys, (1, (bound[0] + (float('inf'),),))) - 1  # Последний кандидат с префиксом
+    elif operator.startswith('<'):  # Меньше (или равно)
+        position = (bisect.bisect_right if '=' in operator else bisect.bisect_left)(keys, (1, bound)) - 1  # Граница
+    elif operator.startswith('>'):  # Больше (или равно): наибольшая версия
+        position = len(versions) - 1  # Последний кандидат
+    else:  # Точное совпадение
+        position = bisect.bisect_right(keys, (1, bound)) - 1  # Последний кандидат не больше ограничения
+    while position >= 0 and keys[position][0] == 1:  # Просмотр вниз (для ~ с буквой версии)
+        if version_satisfies(versions[position], operator, constraint):  # Кандидат подходит
+            return apkindex_index['by_name_version'][(package_name, versions[position])]  # Наибольшая подходящая версия
+        if '~' not in operator:  # Для остальных операторов граница точная
+            break  # Подходящих версий нет
+        if keys[position][1][0][:len(bound[0])] != bound[0]:  # Вышли за числовой префикс
+            break  # Подходящих версий нет
+        position -= 1  # Следующий кандидат
+    return None  # Подходящей версии нет
+
+
+def find_package_record(apkindex_index, package_name, package_version):
+    """Находит запись пакета: последняя версия, точная версия или ограничение вида ">=1.2" / "~3.1" """
+    if not package_version:  # Версия не задана
+        return apkindex_index['by_name'].get(package_name)  # Последняя версия
+    if package_version[0] in VERSION_OPERATOR_CHARS:  # Задано ограничение
+        _name, operator, constraint, _conflict = parse_dependency_token(package_name + package_version)  # Разбор
+        return select_version_candidate(apkindex_index, package_name, operator, constraint)  # Выбор версии
+    return apkindex_index['by_name_version'].get((package_name, package_version))  # Точная версия
+
+
+def find_package_dependencies(apkindex_index, package_name, package_version):
+    """Ищет зависимости пакета в индексе APKINDEX"""
+    if isinstance(apkindex_index, str):  # Передано сырое содержимое APKINDEX
+        apkindex_index = parse_apkindex(apkindex_index)  # Строим индекс
+
+    count_metric('dependency_lookups')  # Учет поиска в индексе
+    record = find_package_record(apkindex_index, package_name, package_version)  # Запись нужной версии
+
+    if record is None:  # Пакет не найден
+        count_metric('dependency_lookup_misses')  # Учет промаха
+        return []  # Зависимостей нет
+
+    if 'resolved' not in record:  # Зависимости записи еще не разрешались
+        record['resolved'] = resolve_record_dependencies(apkindex_index, record)  # Запоминаем результат в записи
+
+    return list(record['resolved'])  # Возвращаем копию списка зависимостей
+
+
+def resolve_dependency_versions(apkindex_index, record):
+    """Выбирает версии зависимостей записи по ограничениям D: (>=, <, ~ ...); возвращает словарь имя -> версия"""
+    pins = {}  # Выбранные версии
+    for token in record['D']:  # Цикл по токенам D:
+        name, operator, constraint, conflict = parse_dependency_token(token)  # Разбор токена
+        if conflict or not operator or name not in apkindex_index['by_name']:  # Ограничение на реальный пакет
+            continue  # Версия по умолчанию
+        candidate = select_version_candidate(apkindex_index, name, operator, constraint)  # Наибольшая подходящая версия
+        if candidate is None:  # Ограничение не выполнимо
+            count_metric('unsatisfied_constraints')  # Учет невыполнимого ограничения
+        else:
+            pins[name] = candidate.get('V')  # Версия зависимости
+    return pins  # Возврат выбранных версий
+
+
+def get_dependency_versions(package_name, package_version, repository_url, is_test_mode):
+    """Возвращает версии, выбранные для зависимостей пакета по ограничениям D: (пусто в тестовом режиме)"""
+    if is_test_mode:  # В тестовом файле версий нет
+        return {}  # Ограничений нет
+    apkindex_index = download_and_parse_apkindex(repository_url)  # Индекс из кеша
+    record = find_package_record(apkindex_index, package_name, package_version)  # Запись пакета
+    if record is None:  # Пакет не найден
+        return {}  # Ограничений нет
+    if 'pins' not in record:  # Версии еще не выбирались
+        record['pins'] = resolve_dependency_versions(apkindex_index, record)  # Запоминаем результат в записи
+    return record['pins']  # Выбранные версии
+
+
+def resolve_record_dependencies(apkindex_index, record):
+    """Разрешает токены D: записи в имена пакетов без конфликтов, петель и дублей"""
+    resolved = []  # Разрешенные имена пакетов
+    for token in record['D']:  # Цикл по токенам D:
+        dependency = resolve_dependency(apkindex_index, token)  # Разрешение через индекс поставщиков
+        if dependency and dependency != record['P'] and dependency not in resolved:  # Без конфликтов, петель и дублей
+            resolved.append(dependency)  # Добавляем зависимость
+    return resolved  # Возврат списка зависимостей
+
+
+def read_dependencies_from_test_file(package_name, test_repo_path):
+    """Возвращает зависимости из индекса тестового файла (для тестового режима)"""
+    record = load_test_repository_index(test_repo_path)['by_name'].get(package_name)  # Поиск по индексу за O(1)
+    if record is None:  # Пакет не найден
+        return []  # Возврат пустого списка
+    return list(record['D'])  # Возврат копии списка зависимостей
+
+
+def get_package_dependencies(package_name, package_version, repository_url, is_test_mode):
+    """Универсальная функция для получения зависимостей"""
+    if is_test_mode:  # Проверка режима работы
+        return read_dependencies_from_test_file(package_name, repository_url)  # Чтение из тестового файла
+    else:  # Режим работы с реальным репозиторием
+        apkindex_index = download_and_parse_apkindex(repository_url)  # Загрузка индекса APKINDEX (из кеша)
+        return find_package_dependencies(apkindex_index, package_name, package_version)  # Поиск зависимостей по индексу
+
+
+def get_package_repository(package_name, repository_url, is_test_mode):
+    """Возвращает репозиторий, предоставивший пакет (None, если пакет не найден)"""
+    if is_test_mode:  # В тестовом режиме репозиторий - это тестовый файл
+        return repository_url  # Путь к тестовому файлу
+    record = download_and_parse_apkindex(repository_url)['by_name'].get(package_name)  # Запись пакета
+    return record['repository'] if record else None  # Репозиторий записи
+
+
+def build_dependency_graph(package_name, package_version, repository_path, is_test_mode, pin_versions=False):
+    """Строит граф зависимостей для одного пакета итеративным обходом в глубину (без ограничения глубины).
+    С pin_versions зависимости раскрываются в версиях, выбранных по ограничениям D:, иначе в версиях по умолчанию.
+    Возвращает имена узлов, добавленных этим обходом"""
+    stack = [(package_name, package_version)]  # Явный стек обхода вместо рекурсии
+    added = []  # Впервые обработанные узлы
+    nodes_visited = 0  # Счетчик посещенных узлов
+    edges_visited = 0  # Счетчик просмотренных ребер
+
+    while stack:  # Пока есть необработанные пакеты
+        name, version = stack.pop()  # Очередной пакет
+        if name in visited:  # Если пакет уже обработан
+            continue  # Переходим к следующему
+        visited.add(name)  # Добавляем пакет в обработанные
+        added.append(name)  # Узел добавлен этим обходом
+        nodes_visited += 1  # Учет узла
+
+        try:
+            dependencies = get_package_dependencies(name, version, repository_path, is_test_mode)  # Получаем зависимости
+        except Exception as e:  # Обработка ошибок
+            dependency_graph[name] = ["ERROR: " + str(e)]  # Сохраняем ошибку
+            continue  # Зависимости такого пакета не обходим
+
+        dependency_graph[name] = dependencies  # Сохраняем зависимости в граф (ребра циклов не теряются)
+        node_repository[name] = get_package_repository(name, repository_path, is_test_mode)  # Источник узла
+
+        edges_visited += len(dependencies)  # Учет ребер
+        pins = get_dependency_versions(name, version, repository_path, is_test_mode) if pin_versions else {}  # Версии
+        for dep in reversed(dependencies):  # Обратный порядок сохраняет порядок обхода как в рекурсии
+            if dep not in visited:  # Только еще не обработанные зависимости
+                stack.append((dep, pins.get(dep)))  # Откладываем зависимость в стек
+
+    count_metric('nodes_visited', nodes_visited)  # Сохранение счетчика узлов
+    count_metric('edges_visited', edges_visited)  # Сохранение счетчика ребер
+    return added  # Возврат добавленных узлов
+
+
+def init_pool_worker(state):
+    """Инициализатор рабочего процесса: запоминает данные, переданные пулу через initargs (при fork без сериализации)"""
+    global WORKER_STATE  # Объявление глобальной переменной рабочего процесса
+    WORKER_STATE = state  # Данные только читаются
+
+
+def resolve_partition(bounds, is_test_mode):
+    """Обрабатывает диапазон пакетов в рабочем процессе и возвращает его массивами, а не списками имен на узел:
+    количество зависимостей, цели ребер (позиция пакета в индексе или номер зависимости вне индекса) и репозитории"""
+    start, end = bounds  # Границы диапазона в списке пакетов
+    apkindex_index = WORKER_STATE['index']  # Индекс, переданный инициализатором
+    positions = WORKER_STATE['positions']  # Имя пакета -> позиция в списке пакетов индекса
+    package_count = len(positions)  # Номера зависимостей вне индекса идут после позиций пакетов
+    counts = array('I')  # Количество зависимостей каждого пакета диапазона
+    targets = array('I')  # Цели ребер подряд
+    dangling = {}  # Зависимости вне индекса (станут листьями) -> номер в диапазоне
+    repositories = {}  # Репозиторий -> номер в диапазоне
+    repository_ids = array('H')  # Номер репозитория каждого пакета диапазона
+    for name in apkindex_index['packages'][start:end]:  # Цикл по пакетам диапазона
+        record = apkindex_index['by_name'][name]  # Запись пакета
+        if is_test_mode:  # В тестовом файле зависимости уже являются именами пакетов
+            dependencies = record['D']  # Список зависимостей
+        else:
+            dependencies = resolve_record_dependencies(apkindex_index, record)  # Разрешение через поставщиков
+        counts.append(len(dependencies))  # Длина списка ребер пакета
+        for dep in dependencies:  # Цикл по зависимостям
+            position = positions.get(dep)  # Позиция зависимости в индексе
+            if position is None:  # Зависимость вне индекса
+                position = package_count + dangling.setdefault(dep, len(dangling))  # Номер после пакетов индекса
+            targets.append(position)  # Цель ребра
+        repository_ids.append(repositories.setdefault(record['repository'], len(repositories)))  # Источник пакета
+    return counts, targets, list(dangling), list(repositories), repository_ids  # Возврат результатов диапазона
+
+
+def merge_partitions(packages, positions, partitions, dangling_repository):
+    """Объединяет массивы диапазонов в компактный граф с отсортированными именами, как у build_compact_graph"""
+    dangling_names = set()  # Зависимости вне индекса из всех диапазонов
+    for partition in partitions:  # Цикл по диапазонам
+        dangling_names.update(partition[2])  # Листья диапазона
+    names = [sys.intern(name) for name in sorted(dangling_names.union(packages))]  # Отсортированные интернированные имена
+    ids = {name: node_id for node_id, name in enumerate(names)}  # Имя -> целочисленный ID
+    package_ids = [ids[name] for name in packages]  # Позиция в индексе -> ID
+
+    row_offsets = array('I', [0])  # Смещения списков ребер в порядке пакетов индекса
+    row_targets = array('I')  # Цели ребер в целочисленных ID
+    repository_of = dict.fromkeys(dangling_names, dangling_repository)  # Источники узлов
+    package_repositories = []  # Источник каждого пакета в порядке индекса
+    for counts, targets, dangling, repositories, repository_ids in partitions:  # Объединение в порядке пакетов индекса
+        lookup = package_ids + [ids[dep] for dep in dangling]  # Номер цели в диапазоне -> ID
+        row_targets.extend(map(lookup.__getitem__, targets))  # Перевод целей без списков имен
+        row_offsets.extend(itertools.islice(itertools.accumulate(counts, initial=row_offsets[-1]), 1, None))  # Концы списков
+        package_repositories.extend(map(repositories.__getitem__, repository_ids))  # Источники пакетов диапазона
+    repository_of.update(zip(packages, package_repositories))  # Источники пакетов индекса
+
+    forward_offsets = array('I', [0])  # Смещения начала списков ребер в порядке ID (CSR)
+    forward_targets = array('I')  # Целевые узлы ребер подряд
+    for name in names:  # Цикл по узлам в порядке ID
+        position = positions.get(name)  # Позиция в индексе (у листьев вне индекса ребер нет)
+        if position is not None:  # Пакет индекса
+            forward_targets.extend(row_targets[row_offsets[position]:row_offsets[position + 1]])  # Ребра узла
+        forward_offsets.append(len(forward_targets))  # Конец списка ребер узла
+
+    compact = {'names': names, 'ids': ids,
+               'forward': (forward_offsets, forward_targets),
+               'reverse': build_reverse_edges(len(names), forward_offsets, forward_targets)}  # Компактный граф
+    return {'compact': compact, 'repositories': repository_of}  # Граф и источники узлов
+
+
+def build_dependency_graph_parallel(repository_url, is_test_mode, jobs):
+    """Строит граф всех пакетов индекса в пуле процессов и возвращает его, не изменяя глобальные структуры.
+    Рабочие процессы возвращают массивы ребер, основной процесс собирает из них компактный граф"""
+    apkindex_index = load_test_repository_index(repository_url) if is_test_mode \
+        else download_and_parse_apkindex(repository_url)  # Индекс загружается до запуска процессов
+    packages = apkindex_index['packages']  # Пакеты в порядке индекса
+    positions = {name: position for position, name in enumerate(packages)}  # Имя -> позиция (наследуется при fork)
+    package_count = len(packages)  # Количество пакетов
+    chunk_size = max(1, -(-package_count // (jobs * 4)))  # Несколько диапазонов на процесс для балансировки
+    bounds = [(start, min(start + chunk_size, package_count)) for start in range(0, package_count, chunk_size)]  # Диапазоны
+
+    state = {'index': apkindex_index, 'positions': positions}  # Данные рабочих процессов
+    with ProcessPoolExecutor(max_workers=jobs, mp_context=multiprocessing.get_context('fork'),
+                             initializer=init_pool_worker, initargs=(state,)) as executor:  # Данные наследуются при fork
+        partitions = list(executor.map(resolve_partition, bounds, [is_test_mode] * len(bounds)))  # Порядок диапазонов сохраняется
+
+    return merge_partitions(packages, positions, partitions, repository_url if is_test_mode else None)  # Граф пула
+
+
+def install_built_graph(graph):
+    """Делает граф, построенный в пуле процессов, текущим: CSR, представление поверх него, источники и посещенные узлы"""
+    global compact_graph, dependency_graph  # Объявление глобальных переменных
+    compact_graph = graph['compact']  # Компактный граф
+    dependency_graph = CompactAdjacency(compact_graph)  # Списки зависимостей строятся при обращении
+    node_repository.update(graph['repositories'])  # Источники узлов
+    visited.update(compact_graph['names'])  # Все узлы обработаны
+    count_metric('nodes_visited', len(compact_graph['names']))  # Сохранение счетчика узлов
+    count_metric('edges_visited', len(compact_graph['forward'][1]))  # Сохранение счетчика ребер
+
+
+def find_strongly_connected_components(graph):
+    """Находит сильно связные компоненты графа итеративным алгоритмом Тарьяна за O(V + E)"""
+    index_of = {}  # Порядковый номер посещения узла
+    lowlink = {}  # Минимальный номер, достижимый из поддерева узла
+    on_stack = set()  # Узлы в стеке Тарьяна
+    stack = []  # Стек Тарьяна
+    components = []  # Найденные компоненты (в обратном топологическом порядке)
+    counter = 0  # Счетчик номеров посещения
+
+    for start in graph:  # Цикл по всем узлам графа
+        if start in index_of:  # Узел уже посещен
+            continue  # Переходим к следующему
+        index_of[start] = lowlink[start] = counter  # Нумеруем стартовый узел
+        counter += 1  # Увеличиваем счетчик
+        stack.append(start)  # Кладем узел в стек Тарьяна
+        on_stack.add(start)  # Отмечаем нахождение в стеке
+        work = [(start, iter(graph.get(start, ())))]  # Явный стек обхода: узел и итератор по его ребрам
+
+        while work:  # Пока обход не завершен
+            node, children = work[-1]  # Текущий узел и его оставшиеся ребра
+            for child in children:  # Продолжаем перебор ребер
+                if child not in index_of:  # Непосещенный узел - спускаемся в него
+                    index_of[child] = lowlink[child] = counter  # Нумеруем узел
+                    counter += 1  # Увеличиваем счетчик
+                    stack.append(child)  # Кладем узел в стек Тарьяна
+                    on_stack.add(child)  # Отмечаем нахождение в стеке
+                    work.append((child, iter(graph.get(child, ()))))  # Обход ребер потомка
+                    break  # Продолжим текущий узел после потомка
+                elif child in on_stack:  # Обратное ребро внутри текущей компоненты
+                    lowlink[node] = min(lowlink[node], index_of[child])  # Обновляем lowlink
+            else:  # Все ребра узла обработаны
+                work.pop()  # Завершаем узел
+                if work:  # Передаем lowlink родителю
+                    parent = work[-1][0]  # Родительский узел
+                    lowlink[parent] = min(lowlink[parent], lowlink[node])  # Обновляем lowlink родителя
+                if lowlink[node] == index_of[node]:  # Узел - корень компоненты
+                    component = []  # Узлы компоненты
+                    while True:  # Снимаем компоненту со стека
+                        member = stack.pop()  # Узел компоненты
+                        on_stack.discard(member)  # Снимаем отметку
+                        component.append(member)  # Добавляем в компоненту
+                        if member == node:  # Дошли до корня
+                            break  # Компонента собрана
+                    components.append(component)  # Сохраняем компоненту
+
+    return components  # Возврат компонент
+
+
+def update_dependency_cycles():
+    """Вычисляет сильно связные компоненты графа и сохраняет найденные циклы"""
+    dependency_cycles.clear()  # Очистка прошлых циклов
+    scc_id.clear()  # Очистка прошлых номеров компонент
+    scc_components[:] = find_strongly_connected_components(dependency_graph)  # Компоненты (сначала стоки)
+    for number, component in enumerate(scc_components):  # Цикл по компонентам
+        for member in component:  # Цикл по узлам компоненты
+            scc_id[member] = number  # Номер компоненты узла
+        node = component[0]  # Любой узел компоненты
+        if len(component) > 1 or node in dependency_graph.get(node, ()):  # Несколько узлов или петля
+            dependency_cycles.append(sorted(component))  # Сохраняем цикл
+
+
+def build_compact_graph(graph):
+    """Строит компактный граф: интернированные имена -> целочисленные ID, прямые и обратные ребра в CSR"""
+    name_set = set(graph)  # Все узлы графа
+    for dependencies in graph.values():  # Узлы, встречающиеся только как зависимости
+        name_set.update(dependencies)  # Добавляем их
+    names = [sys.intern(name) for name in sorted(name_set)]  # Отсортированные интернированные имена
+    ids = {name: node_id for node_id, name in enumerate(names)}  # Имя -> целочисленный ID
+
+    forward_offsets = array('I', [0])  # Смещения начала списков ребер (CSR)
+    forward_targets = array('I')  # Целевые узлы ребер подряд
+    for name in names:  # Цикл по узлам в порядке ID
+        forward_targets.extend(ids[dep] for dep in graph.get(name, ()))  # Ребра узла
+        forward_offsets.append(len(forward_targets))  # Конец списка ребер узла
+
+    return {'names': names, 'ids': ids,
+            'forward': (forward_offsets, forward_targets),
+            'reverse': build_reverse_edges(len(names), forward_offsets, forward_targets)}  # Возврат компактного графа
+
+
+def build_reverse_edges(node_count, forward_offsets, forward_targets):
+    """Строит обратные ребра в CSR по прямым сортировкой подсчетом"""
+    reverse_offsets = array('I', [0]) * (node_count + 1)  # Смещения обратных ребер
+    for target in forward_targets:  # Подсчет входящих ребер (сортировка подсчетом)
+        reverse_offsets[target + 1] += 1  # Увеличиваем счетчик узла
+    for node_id in range(node_count):  # Префиксные суммы
+        reverse_offsets[node_id + 1] += reverse_offsets[node_id]  # Смещение следующего узла
+    reverse_targets = array('I', [0]) * len(forward_targets)  # Источники обратных ребер
+    fill = array('I', reverse_offsets[:node_count])  # Текущая позиция заполнения для каждого узла
+    for source in range(node_count):  # Цикл по источникам ребер
+        for position in range(forward_offsets[source], forward_offsets[source + 1]):  # Ребра источника
+            target = forward_targets[position]  # Целевой узел
+            reverse_targets[fill[target]] = source  # Записываем обратное ребро
+            fill[target] += 1  # Сдвигаем позицию
+    return reverse_offsets, reverse_targets  # Возврат обратных ребер
+
+
+def compact_neighbors(compact, node_id, direction='forward'):
+    """Возвращает соседей узла (срез массива целочисленных ID) в прямом или обратном направлении"""
+    offsets, targets = compact[direction]  # Массивы CSR нужного направления
+    return targets[offsets[node_id]:offsets[node_id + 1]]  # Срез ребер узла
+
+
+def compact_reachable(compact, start_ids, direction='forward'):
+    """Возвращает ID всех узлов, достижимых из стартовых (без самих стартовых, если они не в цикле)"""
+    offsets, targets = compact[direction]  # Массивы CSR нужного направления
+    seen = bytearray(len(offsets) - 1)  # Отметки посещения по ID
+    stack = list(start_ids)  # Стек обхода
+    reached = []  # Достижимые узлы
+    while stack:  # Итеративный обход
+        node_id = stack.pop()  # Очередной узел
+        for position in range(offsets[node_id], offsets[node_id + 1]):  # Ребра узла
+            target = targets[position]  # Соседний узел
+            if not seen[target]:  # Еще не посещен
+                seen[target] = 1  # Отмечаем
+                reached.append(target)  # Добавляем в результат
+                stack.append(target)  # Продолжаем обход из него
+    return reached  # Возврат ID достижимых узлов
+
+
+class CompactAdjacency(MutableMapping):
+    """Граф пакет -> список зависимостей поверх массивов CSR: списки строятся при обращении и не хранятся.
+    Изменения (инкрементальное обновление) копятся в небольшом словаре поверх CSR до следующего перестроения;
+    для обратных запросов к ним ведется отдельный индекс ссылок"""
+
+    def __init__(self, compact):
+        self.compact = compact  # Компактный граф
+        self.overlay = {}  # Измененные и новые узлы -> зависимости
+        self.removed = set()  # Удаленные узлы CSR
+        self.overlay_referrers = {}  # Зависимость -> измененные узлы, которые на нее ссылаются
+
+    def __getitem__(self, name):
+        if name in self.overlay:  # Узел изменен после построения CSR
+            return self.overlay[name]  # Новые зависимости
+        if name in self.removed:  # Узел удален
+            raise KeyError(name)
+        names = self.compact['names']  # Имена по ID
+        return [names[target] for target in compact_neighbors(self.compact, self.compact['ids'][name])]  # Список имен
+
+    def __setitem__(self, name, dependencies):
+        self.drop_overlay_references(name)  # Прежние ссылки измененного узла
+        self.overlay[name] = dependencies  # Новые зависимости узла
+        for dep in dependencies:  # Индекс ссылок новых зависимостей
+            self.overlay_referrers.setdefault(dep, {})[name] = None  # Упорядоченное множество ссылающихся
+        self.removed.discard(name)  # Узел снова есть в графе
+
+    def __delitem__(self, name):
+        if name not in self:  # Узла нет
+            raise KeyError(name)
+        self.drop_overlay_references(name)  # Ссылки удаленного узла
+        self.overlay.pop(name, None)  # Удаление изменений
+        if name in self.compact['ids']:  # Узел есть в CSR
+            self.removed.add(name)  # Отметка удаления
+
+    def __contains__(self, name):
+        return name in self.overlay or (name in self.compact['ids'] and name not in self.removed)  # Без построения списка
+
+    def __iter__(self):
+        for name in self.compact['names']:  # Узлы CSR
+            if name not in self.removed:  # Кроме удаленных
+                yield name  # Имя узла
+        for name in self.overlay:  # Новые узлы
+            if name not in self.compact['ids']:  # Которых нет в CSR
+                yield name  # Имя узла
+
+    def __len__(self):
+        added = sum(1 for name in self.overlay if name not in self.compact['ids'])  # Новые узлы
+        return len(self.compact['names']) - len(self.removed) + added  # Количество узлов
+
+    def drop_overlay_references(self, name):
+        """Убирает из индекса ссылок зависимости, записанные для узла в словаре изменений"""
+        for dep in self.overlay.get(name, ()):  # Прежние зависимости измененного узла
+            sources = self.overlay_referrers.get(dep)  # Ссылающиеся на зависимость
+            if sources is not None:  # Ссылка еще учтена
+                sources.pop(name, None)  # Удаление ссылки
+                if not sources:  # Ссылок не осталось
+                    del self.overlay_referrers[dep]  # Удаление записи
+
+    def referrers(self, name):
+        """Возвращает узлы, напрямую зависящие от name: обратные ребра CSR без измененных и удаленных узлов и ссылки изменений"""
+        sources = []  # Имена ссылающихся узлов
+        node_id = self.compact['ids'].get(name)  # ID узла в CSR
+        if node_id is not None:  # Узел есть в CSR
+            names = self.compact['names']  # Имена по ID
+            sources = [names[source] for source in compact_neighbors(self.compact, node_id, 'reverse')
+                       if names[source] not in self.overlay and names[source] not in self.removed]  # Неизмененные ребра
+        sources.extend(self.overlay_referrers.get(name, ()))  # Ребра из измененных узлов
+        return sources  # Возврат имен
+
+
+def update_compact_graph():
+    """Перестраивает компактное представление текущего графа; словарь списков заменяется представлением поверх CSR"""
+    global compact_graph, dependency_graph  # Объявление глобальных переменных
+    compact_graph = build_compact_graph(dependency_graph)  # Компактный граф
+    dependency_graph = CompactAdjacency(compact_graph)  # Списки больше не хранятся отдельно от CSR
+
+
+def ensure_compact_graph(limit=0):
+    """Переносит изменения, накопленные поверх CSR, в новый CSR, если изменено больше limit узлов"""
+    if compact_graph is None or len(dependency_graph.overlay) + len(dependency_graph.removed) > limit:  # Нужен новый CSR
+        update_compact_graph()  # Линейное перестроение
+
+
+def compact_referrers(name):
+    """Возвращает имена пакетов, напрямую зависящих от name: обратные ребра CSR с учетом накопленных изменений"""
+    if not isinstance(dependency_graph, CompactAdjacency):  # Компактный граф еще не построен
+        return []  # Никто не зависит
+    return dependency_graph.referrers(name)  # Имена ссылающихся узлов
+
+
+def find_reverse_reachable(start_names):
+    """Возвращает стартовые узлы и все узлы, транзитивно зависящие от них (обход по обратным ребрам с изменениями)"""
+    reached = {name for name in start_names if name in dependency_graph}  # Стартовые узлы графа
+    stack = list(reached)  # Стек обхода
+    while stack:  # Итеративный обход
+        for source in compact_referrers(stack.pop()):  # Зависящие от узла
+            if source not in reached:  # Еще не посещен
+                reached.add(source)  # Отмечаем
+                stack.append(source)  # Продолжаем обход из него
+    return reached  # Возврат имен
+
+
+def get_package_record(package_name, repository_url, is_test_mode):
+    """Возвращает запись APKINDEX пакета (None в тестовом режиме или если пакет не найден)"""
+    if is_test_mode:  # В тестовом файле метаданных пакетов нет
+        return None  # Записи нет
+    return download_and_parse_apkindex(repository_url)['by_name'].get(package_name)  # Запись из индекса
+
+
+def get_archive_checksum(repository_url, revalidate=True):
+    """Возвращает SHA-256 архива APKINDEX из метаданных кеша; сеть нужна только при перепроверке"""
+    cache_dir = get_repository_cache_dir(repository_url)  # Каталог кеша репозитория
+    archive_path = os.path.join(cache_dir, 'APKINDEX.tar.gz')  # Путь к кешированному архиву
+    metadata = load_cache_metadata(cache_dir)  # Метаданные прошлой перепроверки
+    fresh = (os.path.isfile(archive_path) and metadata.get('sha256') and
+             time.time() - metadata.get('checked', 0) < CACHE_REVALIDATE_AGE)  # Метаданные еще не устарели
+    if revalidate or not fresh:  # Перепроверка по запросу или по возрасту метаданных
+        fetch_apkindex_archive(repository_url)  # Условный запрос (304 при отсутствии изменений)
+        metadata = load_cache_metadata(cache_dir)  # Обновленные метаданные
+    return metadata.get('sha256') or file_checksum(archive_path)  # Сумма из метаданных (offline - по файлу)
+
+
+def get_source_checksum(repository_url, is_test_mode, revalidate=True):
+    """Вычисляет контрольную сумму исходных данных графа (архивов APKINDEX или тестового файла)"""
+    if is_test_mode:  # Тестовый режим
+        return file_checksum(repository_url)  # Сумма тестового файла
+    urls = repository_url if isinstance(repository_url, (list, tuple)) else [repository_url]  # Список URL
+    digest = hashlib.sha256()  # Общая контрольная сумма
+    for url in urls:  # Цикл по репозиториям в порядке приоритета
+        digest.update(get_archive_checksum(url, revalidate).encode('ascii'))  # Сумма архива репозитория
+    return digest.hexdigest()  # Шестнадцатеричная строка
+
+
+def pack_strings(strings):
+    """Упаковывает строки в таблицу смещений и общий блок байт UTF-8"""
+    offsets = array('I', [0])  # Смещения строк в блоке
+    blob = bytearray()  # Общий блок байт
+    for string in strings:  # Цикл по строкам
+        blob += (string or '').encode('utf-8')  # Байты строки
+        offsets.append(len(blob))  # Конец строки
+    return offsets, bytes(blob)  # Возврат таблицы и блока
+
+
+def save_graph_snapshot(snapshot_path, source_checksum, repository_url, is_test_mode):
+    """Сохраняет компактный граф и метаданные пакетов в версионированный бинарный снимок"""
+    ensure_compact_graph()  # CSR без накопленных изменений
+    names = compact_graph['names']  # Имена узлов (отсортированы - это позволяет искать бинарным поиском)
+    records = [get_package_record(name, repository_url, is_test_mode) for name in names]  # Записи APKINDEX узлов
+
+    name_offsets, name_blob = pack_strings(names)  # Таблица имен
+    version_offsets, version_blob = pack_strings(record and record.get('V') for record in records)  # Таблица версий
+    repository_offsets, repository_blob = pack_strings(node_repository.get(name) for name in names)  # Таблица репозиториев
+    sections = {
+        'name_offsets': name_offsets, 'name_blob': name_blob,
+        'version_offsets': version_offsets, 'version_blob': version_blob,
+        'repository_offsets': repository_offsets, 'repository_blob': repository_blob,
+        'forward_offsets': compact_graph['forward'][0], 'forward_targets': compact_graph['forward'][1],
+        'reverse_offsets': compact_graph['reverse'][0], 'reverse_targets': compact_graph['reverse'][1],
+        'installed_sizes': array('Q', (record['I'] if record else 0 for record in records)),
+        'package_sizes': array('Q', (record['S'] if record else 0 for record in records)),
+    }  # Секции снимка
+
+    table_size = SNAPSHOT_HEADER.size + SNAPSHOT_SECTION.size * len(SNAPSHOT_SECTIONS)  # Размер заголовка и таблицы секций
+    position = (table_size + 7) // 8 * 8  # Данные выравниваются по 8 байт
+    layout = []  # Смещения и длины секций
+    for name in SNAPSHOT_SECTIONS:  # Цикл по секциям
+        data = sections[name]  # Данные секции
+        length = len(data) * data.itemsize if isinstance(data, array) else len(data)  # Длина в байтах
+        layout.append((position, length))  # Запоминаем размещение
+        position = (position + length + 7) // 8 * 8  # Следующая секция с выравниванием
+
+    tmp_path = snapshot_path + '.tmp'  # Временный файл
+    with open(tmp_path, 'wb') as f:  # Запись снимка
+        f.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_FORMAT_VERSION, len(names),
+                                     len(compact_graph['forward'][1]), len(SNAPSHOT_SECTIONS),
+                                     1 if sys.byteorder == 'little' else 0, source_checksum.encode('ascii')))  # Заголовок
+        for offset, length in layout:  # Таблица секций
+            f.write(SNAPSHOT_SECTION.pack(offset, length))  # Смещение и длина
+        for name, (offset, length) in zip(SNAPSHOT_SECTIONS, layout):  # Данные секций
+            f.write(b'\0' * (offset - f.tell()))  # Выравнивание
+            data = sections[name]  # Данные секции
+            f.write(data.tobytes() if isinstance(data, array) else data)  # Запись данных
+    os.replace(tmp_path, snapshot_path)  # Атомарная замена снимка
+
+
+def load_graph_snapshot(snapshot_path, source_checksum=None):
+    """Отображает снимок графа в память; возвращает None, если снимка нет, он устарел или несовместим"""
+    if not os.path.isfile(snapshot_path):  # Снимка нет
+        return None  # Нужно строить граф
+    with open(snapshot_path, 'rb') as f:  # Открытие файла снимка
+        try:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)  # Отображение в память без чтения
+        except ValueError:  # Пустой файл
+            return None  # Снимок непригоден
+    if len(mapped) < SNAPSHOT_HEADER.size:  # Файл короче заголовка
+        mapped.close()  # Освобождаем отображение
+        return None  # Снимок непригоден
+
+    magic, version, node_count, edge_count, section_count, little_endian, checksum = \
+        SNAPSHOT_HEADER.unpack_from(mapped, 0)  # Разбор заголовка
+    checksum = checksum.rstrip(b'\0').decode('ascii', 'replace')  # Контрольная сумма исходных данных
+    if (magic != SNAPSHOT_MAGIC or version != SNAPSHOT_FORMAT_VERSION or  # Чужой файл или другая версия формата
+            little_endian != (1 if sys.byteorder == 'little' else 0) or  # Другая платформа
+            section_count != len(SNAPSHOT_SECTIONS) or  # Другой набор секций
+            (source_checksum is not None and checksum != source_checksum)):  # Исходный APKINDEX изменился
+        mapped.close()  # Освобождаем отображение (файл уже закрыт)
+        return None  # Снимок несовместим или устарел
+
+    view = memoryview(mapped)  # Представление без копирования
+    snapshot = {'mmap': mapped, 'node_count': node_count, 'edge_count': edge_count, 'checksum': checksum}  # Снимок
+    for number, name in enumerate(SNAPSHOT_SECTIONS):  # Цикл по секциям
+        offset, length = SNAPSHOT_SECTION.unpack_from(mapped, SNAPSHOT_HEADER.size + number * SNAPSHOT_SECTION.size)  # Размещение
+        section = view[offset:offset + length]  # Срез без копирования
+        if name.endswith('_blob'):  # Блок строк
+            snapshot[name] = section  # Байты как есть
+        else:  # Числовой массив
+            snapshot[name] = section.cast('Q' if name.endswith('_sizes') else 'I')  # Типизированное представление
+    snapshot['forward'] = (snapshot['forward_offsets'], snapshot['forward_targets'])  # Прямые ребра CSR
+    snapshot['reverse'] = (snapshot['reverse_offsets'], snapshot['reverse_targets'])  # Обратные ребра CSR
+    return snapshot  # Возврат снимка
+
+
+def snapshot_string(snapshot, table, node_id):
+    """Декодирует строку узла из таблицы снимка ('name', 'version' или 'repository')"""
+    offsets = snapshot[table + '_offsets']  # Смещения строк
+    return bytes(snapshot[table + '_blob'][offsets[node_id]:offsets[node_id + 1]]).decode('utf-8')  # Строка узла
+
+
+def snapshot_find_id(snapshot, package_name):
+    """Находит ID узла по имени бинарным поиском по отсортированной таблице имен снимка"""
+    target = package_name.encode('utf-8')  # Искомое имя в байтах (порядок UTF-8 совпадает с порядком строк)
+    offsets = snapshot['name_offsets']  # Смещения имен
+    blob = snapshot['name_blob']  # Блок имен
+    low, high = 0, snapshot['node_count']  # Границы поиска
+    while low < high:  # Бинарный поиск
+        middle = (low + high) // 2  # Середина
+        name = bytes(blob[offsets[middle]:offsets[middle + 1]])  # Имя в середине
+        if name < target:  # Искомое правее
+            low = middle + 1  # Сдвигаем нижнюю границу
+        else:
+            high = middle  # Сдвигаем верхнюю границу
+    if low < snapshot['node_count'] and bytes(blob[offsets[low]:offsets[low + 1]]) == target:  # Имя найдено
+        return low  # ID узла
+    return None  # Узла нет
+
+
+def display_snapshot_query(snapshot, package_name):
+    """Выводит сведения о пакете и его зависимостях, используя только снимок графа"""
+    node_id = snapshot_find_id(snapshot, package_name)  # ID пакета
+    if node_id is None:  # Пакета нет в графе
+        print(f"Пакет {package_name} не найден в графе")  # Сообщение
+        return  # Нечего выводить
+    direct = [snapshot_string(snapshot, 'name', dep) for dep in compact_neighbors(snapshot, node_id)]  # Прямые зависимости
+    transitive = [dep for dep in compact_reachable(snapshot, [node_id]) if dep != node_id]  # Транзитивные зависимости
+    installed = sum(snapshot['installed_sizes'][dep] for dep in transitive)  # Размер зависимостей
+    print(f"\nПакет: {package_name} {snapshot_string(snapshot, 'version', node_id)}".rstrip())  # Имя и версия
+    repository = snapshot_string(snapshot, 'repository', node_id)  # Репозиторий пакета
+    if repository:  # Если репозиторий известен
+        print(f"Репозиторий: {repository}")  # Вывод репозитория
+    print(f"Прямые зависимости: [{', '.join(direct)}]")  # Вывод прямых зависимостей
+    print(f"Транзитивных зависимостей: {len(transitive)}")  # Вывод размера замыкания
+    print(f"Установленный размер зависимостей: {installed} байт")  # Вывод суммарного размера
+
+
+def graph_store_find_id(store, package_name):
+    """Находит ID узла по имени в компактном графе или в снимке"""
+    if 'ids' in store:  # Компактный граф в памяти
+        return store['ids'].get(package_name)  # Поиск в словаре
+    return snapshot_find_id(store, package_name)  # Бинарный поиск в снимке
+
+
+def graph_store_name(store, node_id):
+    """Возвращает имя узла по ID в компактном графе или в снимке"""
+    if 'names' in store:  # Компактный граф в памяти
+        return store['names'][node_id]  # Имя из списка
+    return snapshot_string(store, 'name', node_id)  # Имя из таблицы снимка
+
+
+def find_dependencies(store, package_name):
+    """Возвращает прямые и транзитивные зависимости пакета (None, если пакета нет в графе)"""
+    node_id = graph_store_find_id(store, package_name)  # ID пакета
+    if node_id is None:  # Пакета нет в графе
+        return None  # Нечего искать
+    direct = sorted(graph_store_name(store, dep) for dep in compact_neighbors(store, node_id))  # Прямые зависимости
+    transitive = sorted(graph_store_name(store, dep) for dep in compact_reachable(store, [node_id])
+                        if dep != node_id)  # Транзитивные зависимости
+    return direct, transitive  # Возврат зависимостей
+
+
+def find_reverse_dependencies(store, package_name):
+    """Возвращает прямые и транзитивные обратные зависимости пакета (None, если пакета нет в графе)"""
+    node_id = graph_store_find_id(store, package_name)  # ID пакета
+    if node_id is None:  # Пакета нет в графе
+        return None  # Нечего искать
+    direct = sorted(graph_store_name(store, dep) for dep in compact_neighbors(store, node_id, 'reverse'))  # Кто зависит напрямую
+    transitive = sorted(graph_store_name(store, dep) for dep in compact_reachable(store, [node_id], 'reverse')
+                        if dep != node_id)  # Кто зависит транзитивно
+    return direct, transitive  # Возврат обратных зависимостей
+
+
+def display_reverse_dependencies(store, package_name):
+    """Выводит пакеты, которые прямо и транзитивно зависят от заданного пакета"""
+    start = time.perf_counter()  # Начало замера запроса
+    result = find_reverse_dependencies(store, package_name)  # Запрос к обратному индексу
+    elapsed = (time.perf_counter() - start) * 1000  # Время запроса в миллисекундах
+    if result is None:  # Пакета нет в графе
+        print(f"Пакет {package_name} не найден в графе")  # Сообщение
+        return  # Нечего выводить
+    direct, transitive = result  # Результат запроса
+    print(f"\nОбратные зависимости пакета {package_name}")  # Заголовок
+    print(f"Прямые ({len(direct)}): [{', '.join(direct)}]")  # Вывод прямых обратных зависимостей
+    print(f"Транзитивные ({len(transitive)}): [{', '.join(transitive)}]")  # Вывод транзитивных обратных зависимостей
+    print(f"Запрос выполнен за {elapsed:.3f} мс")  # Время запроса
+
+
+def build_bit_planes(values):
+    """Раскладывает неотрицательные числа по битовым плоскостям: плоскость k - множество ID, у которых установлен бит k"""
+    width = max(values, default=0).bit_length()  # Количество плоскостей
+    planes = [bytearray((len(values) + 7) // 8) for _ in range(width)]  # Битовые множества в виде байтов
+    for node_id, value in enumerate(values):  # Цикл по значениям
+        bit = 0  # Номер плоскости
+        while value:  # Пока есть установленные биты
+            if value & 1:  # Бит установлен
+                planes[bit][node_id >> 3] |= 1 << (node_id & 7)  # Добавляем ID в плоскость
+            value >>= 1  # Следующий бит
+            bit += 1  # Следующая плоскость
+    return [int.from_bytes(plane, 'little') for plane in planes]  # Плоскости как целые числа-битсеты
+
+
+def compute_closure_report(repository_url, is_test_mode):
+    """Вычисляет для каждого пакета размер транзитивного замыкания и суммарный установленный размер за один проход"""
+    if compact_graph is None or not scc_components:  # Граф еще не построен
+        raise ValueError("Граф зависимостей не построен")
+    ensure_compact_graph()  # CSR без накопленных изменений
+    sizes = get_installed_sizes(compact_graph['names'], repository_url, is_test_mode)  # Размеры узлов
+    if BUILD_JOBS > 1 and 'fork' in multiprocessing.get_all_start_methods():  # Пул процессов
+        report = compute_closure_sizes_parallel(compact_graph, scc_components, scc_id, sizes, BUILD_JOBS)  # По частям DAG
+    else:
+        report = compute_closure_sizes(compact_graph, scc_components, scc_id, sizes)  # Один проход по сжатому DAG
+    node_closures.clear()  # Прежние размеры замыканий
+    node_closures.update((row['package'], (row['closure_size'], row['installed_size'])) for row in report)  # Для обновлений
+    return report  # Возврат отчета
+
+
+def get_installed_sizes(names, repository_url, is_test_mode):
+    """Возвращает установленный размер (I:) каждого узла из списка (0, если записи нет)"""
+    sizes = []  # Размеры по порядку имен
+    for name in names:  # Цикл по узлам
+        record = get_package_record(name, repository_url, is_test_mode)  # Запись APKINDEX
+        sizes.append(record['I'] if record else 0)  # Размер или 0
+    return sizes  # Возврат размеров
+
+
+def compute_closure_sizes(compact, components, component_of, sizes):
+    """Вычисляет размеры замыканий по компактному графу и его компонентам. Компоненты обрабатываются от стоков
+    алгоритмом Кана по сжатому DAG, поэтому их порядок в списке не важен; строки отчета идут в порядке компонент"""
+    names = compact['names']  # Имена узлов
+    ids = compact['ids']  # Имя -> ID
+    planes = build_bit_planes(sizes)  # Битовые плоскости размеров для взвешенного подсчета
+
+    # Сколько компонент-родителей еще не обработано: по нулю битсет потомка освобождается
+    component_count = len(components)  # Количество компонент
+    pending_parents = [0] * component_count  # Необработанные родители компоненты
+    children = []  # Дочерние компоненты в сжатом DAG
+    parents = [[] for _ in range(component_count)]  # Родительские компоненты в сжатом DAG
+    for number, component in enumerate(components):  # Цикл по компонентам
+        targets = set()  # Дочерние компоненты
+        for member in component:  # Цикл по узлам компоненты
+            for target in compact_neighbors(compact, ids[member]):  # Ребра узла
+                child = component_of.get(names[target], number)  # Компонента цели
+                if child != number:  # Ребро вне компоненты
+                    targets.add(child)  # Запоминаем потомка
+        children.append(targets)  # Потомки компоненты
+        for child in targets:  # Учет родителя у каждого потомка
+            pending_parents[child] += 1  # Увеличиваем счетчик
+            parents[child].append(number)  # Родитель ждет потомка
+
+    pending_children = [len(targets) for targets in children]  # Необработанные потомки компоненты
+    ready = [number for number in range(component_count) if not pending_children[number]]  # Стоки сжатого DAG
+    component_bits = [0] * component_count  # Битсеты замыканий (живут, пока нужны родителям)
+    closures = [None] * component_count  # (пакетов, байт) каждой компоненты
+    while ready:  # Потомки обрабатываются раньше родителей
+        number = ready.pop()  # Компонента, все потомки которой обработаны
+        component = components[number]  # Узлы компоненты
+        bits = 0  # Замыкание компоненты
+        for member in component:  # Узлы самой компоненты
+            bits |= 1 << ids[member]  # Добавляем узел
+        for child in children[number]:  # Объединение замыканий потомков
+            bits |= component_bits[child]  # Мемоизированное замыкание
+            pending_parents[child] -= 1  # Родитель обработан
+            if not pending_parents[child]:  # Потомок больше никому не нужен
+                component_bits[child] = 0  # Освобождаем память
+        if pending_parents[number]:  # Компонента понадобится родителям
+            component_bits[number] = bits  # Сохраняем замыкание
+
+        closure_size = bits.bit_count()  # Количество пакетов в замыкании (включая сам пакет)
+        installed_size = sum((bits & plane).bit_count() << k for k, plane in enumerate(planes))  # Взвешенный подсчет
+        closures[number] = closure_size, installed_size  # Узлы компоненты имеют одно и то же замыкание
+        for parent in parents[number]:  # Родители ждут на одного потомка меньше
+            pending_children[parent] -= 1  # Потомок обработан
+            if not pending_children[parent]:  # Все потомки родителя обработаны
+                ready.append(parent)  # Родитель готов
+
+    report = []  # Строки отчета
+    for number, component in enumerate(components):  # Порядок компонент в списке
+        closure_size, installed_size = closures[number]  # Замыкание компоненты
+        for member in component:  # Узлы компоненты
+            report.append({'package': member, 'closure_size': closure_size, 'installed_size': installed_size})
+    return report  # Возврат отчета
+
+
+def find_set_root(parents, item):
+    """Возвращает представителя множества в системе непересекающихся множеств (со сжатием путей делением пополам)"""
+    while parents[item] != item:  # Пока не дошли до корня
+        parents[item] = parents[parents[item]]  # Сокращаем путь
+        item = parents[item]  # Переходим к родителю
+    return item  # Корень множества
+
+
+def partition_condensed_dag(compact, components, component_of, parts):
+    """Делит сжатый DAG на независимые части (слабо связные компоненты) и раскладывает их по parts группам,
+    выравнивая количество узлов; номера компонент в группе идут по возрастанию"""
+    names = compact['names']  # Имена узлов
+    ids = compact['ids']  # Имя -> ID
+    parents = list(range(len(components)))  # Непересекающиеся множества компонент
+    for number, component in enumerate(components):  # Цикл по компонентам
+        for member in component:  # Цикл по узлам компоненты
+            for target in compact_neighbors(compact, ids[member]):  # Ребра узла
+                child = find_set_root(parents, component_of.get(names[target], number))  # Множество потомка
+                root = find_set_root(parents, number)  # Множество компоненты
+                if child != root:  # Ребро связывает разные части
+                    parents[child] = root  # Объединяем части
+
+    pieces = {}  # Корень множества -> номера компонент части
+    for number in range(len(components)):  # Цикл по компонентам
+        pieces.setdefault(find_set_root(parents, number), []).append(number)  # Компонента в своей части
+    groups = [[] for _ in range(parts)]  # Группы частей
+    loads = [0] * parts  # Количество узлов в группе
+    for piece in sorted(pieces.values(), key=lambda numbers: -sum(len(components[n]) for n in numbers)):  # Крупные первыми
+        lightest = loads.index(min(loads))  # Наименее загруженная группа
+        groups[lightest].extend(piece)  # Часть целиком в одну группу
+        loads[lightest] += sum(len(components[number]) for number in piece)  # Учет узлов
+    return [sorted(group) for group in groups if group]  # Непустые группы
+
+
+def closure_partition(numbers):
+    """Вычисляет замыкания группы компонент в рабочем процессе; возвращает ID узлов и размеры массивами"""
+    compact = WORKER_STATE['compact']  # Компактный граф, переданный инициализатором
+    part = [WORKER_STATE['components'][number] for number in numbers]  # Компоненты группы
+    part_of = {member: local for local, component in enumerate(part) for member in component}  # Узел -> номер в группе
+    node_ids, closure_sizes, installed_sizes = array('I'), array('I'), array('Q')  # Результаты группы
+    for row in compute_closure_sizes(compact, part, part_of, WORKER_STATE['sizes']):  # Проход по части DAG
+        node_ids.append(compact['ids'][row['package']])  # ID узла
+        closure_sizes.append(row['closure_size'])  # Количество пакетов замыкания
+        installed_sizes.append(row['installed_size'])  # Установленный размер замыкания
+    return node_ids, closure_sizes, installed_sizes  # Возврат результатов группы
+
+
+def compute_closure_sizes_parallel(compact, components, component_of, sizes, jobs):
+    """Вычисляет размеры замыканий в пуле процессов: независимые части сжатого DAG обрабатываются параллельно,
+    отчет собирается в порядке компонент, как при последовательном проходе"""
+    groups = partition_condensed_dag(compact, components, component_of, jobs)  # Группы независимых частей
+    if len(groups) < 2:  # Весь DAG связан - параллелить нечего
+        return compute_closure_sizes(compact, components, component_of, sizes)  # Последовательный проход
+
+    state = {'compact': compact, 'components': components, 'sizes': sizes}  # Данные рабочих процессов
+    with ProcessPoolExecutor(max_workers=len(groups), mp_context=multiprocessing.get_context('fork'),
+                             initializer=init_pool_worker, initargs=(state,)) as executor:  # Данные наследуются при fork
+        results = list(executor.map(closure_partition, groups))  # Замыкания групп
+
+    closure_of = {}  # ID узла -> (пакетов, байт)
+    for node_ids, closure_sizes, installed_sizes in results:  # Цикл по группам
+        closure_of.update(zip(node_ids, zip(closure_sizes, installed_sizes)))  # Результаты группы
+    ids = compact['ids']  # Имя -> ID
+    report = []  # Строки отчета
+    for component in components:  # Порядок компонент, как у последовательного прохода
+        for member in component:  # Узлы компоненты
+            closure_size, installed_size = closure_of[ids[member]]  # Размеры замыкания узла
+            report.append({'package': member, 'closure_size': closure_size, 'installed_size': installed_size})
+    return report  # Возврат отчета
+
+
+def display_closure_report(report, sort_by='installed_size'):
+    """Выводит отчет о замыканиях, отсортированный по размеру, количеству пакетов или имени"""
+    if sort_by == 'name':  # Сортировка по имени
+        rows = sorted(report, key=lambda row: row['package'])  # По возрастанию имени
+    else:  # Сортировка по числовому столбцу
+        rows = sorted(report, key=lambda row: (-row[sort_by], row['package']))  # По убыванию, затем по имени
+    print("\n" + "=" * 60)  # Верхняя разделительная линия
+    print("ОТЧЕТ О ТРАНЗИТИВНЫХ ЗАМЫКАНИЯХ")  # Заголовок
+    print("=" * 60)  # Нижняя разделительная линия
+    print(f"{'пакет':<40} {'пакетов':>8} {'байт':>14}")  # Шапка таблицы
+    for row in rows:  # Цикл по строкам отчета
+        print(f"{row['package']:<40} {row['closure_size']:>8} {row['installed_size']:>14}")  # Строка таблицы
+
+
+def load_batch_roots(batch_path):
+    """Читает корневые пакеты из файла JSONL (по объекту {"package": ..., "version": ...} на строку)"""
+    roots = []  # Пары (имя, версия)
+    try:
+        with open(batch_path, 'r', encoding='utf-8') as f:  # Открытие файла
+            for line_number, line in enumerate(f, 1):  # Цикл по строкам
+                line = line.strip()  # Очистка строки
+                if not line:  # Пустые строки пропускаем
+                    continue  # Следующая строка
+                entry = json.loads(line)  # Разбор объекта
+                name = entry.get('package') if isinstance(entry, dict) else None  # Имя пакета
+                if not isinstance(name, str) or not name.strip():  # Имя обязательно
+                    raise ValueError(f"Строка {line_number}: не указано поле package")
+                version = entry.get('version')  # Необязательная версия
+                roots.append((name.strip(), str(version).strip() if version else None))  # Сохранение корня
+    except OSError as e:  # Ошибка чтения файла
+        raise ValueError(f"Не удалось прочитать файл пакетов: {e}")
+    except json.JSONDecodeError as e:  # Ошибка формата строки
+        raise ValueError(f"Ошибка разбора файла пакетов: {e}")
+    if not roots:  # Пустой список
+        raise ValueError(f"Файл пакетов не содержит ни одного пакета: {batch_path}")
+    return roots  # Возврат корней
+
+
+def build_batch_dependency_graph(roots, repository_url, is_test_mode):
+    """Строит общий граф для нескольких корневых пакетов: общий индекс и общее множество посещенных узлов"""
+    with measure_phase('graph_build'):  # Обход графа
+        for name, version in roots:  # Цикл по корням
+            if name not in visited:  # Общие подграфы раскрываются один раз
+                build_dependency_graph(name, version, repository_url, is_test_mode, pin_versions=True)  # Обход от корня
+    with measure_phase('scc'):  # Поиск сильно связных компонент
+        update_dependency_cycles()  # Циклы общего графа
+    with measure_phase('compact_graph'):  # Построение компактного графа
+        update_compact_graph()  # Компактное представление для запросов по корням
+
+
+def display_batch_results(roots):
+    """Выводит зависимости каждого корневого пакета из общего графа"""
+    with measure_phase('output'):  # Замер времени вывода
+        print(f"\nПакетный режим: {len(roots)} корней, {len(dependency_graph)} узлов в общем графе")  # Сводка
+        for name, version in roots:  # Цикл по корням
+            print(f"\nПакет: {name} {version or ''}".rstrip())  # Имя и версия корня
+            result = find_dependencies(compact_graph, name)  # Запрос к общему графу
+            if result is None:  # Корня нет в графе
+                print("  не найден в графе")  # Сообщение
+                continue  # Следующий корень
+            direct, transitive = result  # Зависимости корня
+            print(f"  Прямые ({len(direct)}): [{', '.join(direct)}]")  # Прямые зависимости
+            print(f"  Транзитивные ({len(transitive)}): [{', '.join(transitive)}]")  # Транзитивные зависимости
+            cycle = [member for member in scc_components[scc_id[name]] if member != name] \
+                if name in scc_id and len(scc_components[scc_id[name]]) > 1 else []  # Цикл, в который входит корень
+            if cycle:  # Корень входит в цикл
+                print(f"  В цикле с: [{', '.join(sorted(cycle))}]")  # Вывод цикла
+
+
+def plan_install_order(root_name, repository_url, is_test_mode):
+    """Строит план установки замыкания пакета: волны Кана по сжатому DAG (зависимости раньше зависящих от них)"""
+    root_id = compact_graph['ids'].get(root_name)  # ID корня
+    if root_id is None:  # Пакета нет в графе
+        return None  # Планировать нечего
+    names = compact_graph['names']  # Имена по ID
+    offsets, targets = compact_graph['forward']  # Массивы CSR прямых ребер
+    closure = compact_reachable(compact_graph, [root_id])  # Транзитивные зависимости корня
+    if root_id not in closure:  # Корень не в цикле с зависимостями
+        closure.append(root_id)  # Корень тоже устанавливается
+
+    members = {}  # Компонента -> ID ее узлов из замыкания (циклы сжимаются в одну вершину)
+    for node_id in closure:  # Цикл по узлам замыкания
+        members.setdefault(scc_id[names[node_id]], []).append(node_id)  # Узел в своей компоненте
+    pending = {}  # Компонента -> количество еще не установленных зависимостей-компонент
+    dependents = {component: [] for component in members}  # Компонента -> компоненты, зависящие от нее
+    for component, node_ids in members.items():  # Ребра сжатого DAG
+        dependency_components = set()  # Компоненты-зависимости
+        for node_id in node_ids:  # Цикл по узлам компоненты
+            for position in range(offsets[node_id], offsets[node_id + 1]):  # Ребра узла
+                target_component = scc_id[names[targets[position]]]  # Компонента зависимости
+                if target_component != component:  # Ребра внутри цикла не учитываются
+                    dependency_components.add(target_component)  # Зависимость компоненты
+        pending[component] = len(dependency_components)  # Число зависимостей
+        for target_component in dependency_components:  # Обратные ребра сжатого DAG
+            dependents[target_component].append(component)  # Компонента ждет зависимость
+
+    waves = []  # Волны установки
+    wave = [component for component, count in pending.items() if count == 0]  # Компоненты без зависимостей
+    while wave:  # Алгоритм Кана по уровням
+        groups = sorted(sorted(names[node_id] for node_id in members[component]) for component in wave)  # Пакеты волны
+        records = [get_package_record(name, repository_url, is_test_mode) for group in groups for name in group]  # Записи
+        waves.append({
+            'groups': groups,  # Пакеты волны (циклы - группами)
+            'download_size': sum(record['S'] for record in records if record),  # Размер загрузки (S:)
+            'installed_size': sum(record['I'] for record in records if record),  # Установленный размер (I:)
+        })
+        next_wave = []  # Следующая волна
+        for component in wave:  # Установленные компоненты
+            for dependent in dependents[component]:  # Компоненты, ждущие установленную
+                pending[dependent] -= 1  # Одна зависимость выполнена
+                if pending[dependent] == 0:  # Все зависимости установлены
+                    next_wave.append(dependent)  # Можно устанавливать
+        wave = next_wave  # Переход к следующей волне
+    return waves  # Возврат плана
+
+
+def display_install_plan(root_name, waves):
+    """Выводит план установки по волнам с размерами загрузки"""
+    if waves is None:  # Пакета нет в графе
+        print(f"Пакет {root_name} не найден в графе")  # Сообщение
+        return  # Нечего выводить
+    package_count = sum(len(group) for wave in waves for group in wave['groups'])  # Пакетов в плане
+    print(f"\nПлан установки пакета {root_name}: {package_count} пакетов, {len(waves)} волн")  # Заголовок
+    for number, wave in enumerate(waves, 1):  # Цикл по волнам
+        print(f"Волна {number}: {sum(len(group) for group in wave['groups'])} пакетов, "
+              f"загрузка {wave['download_size']} байт, установка {wave['installed_size']} байт")  # Сводка волны
+        print("  " + ", ".join(group[0] if len(group) == 1 else f"[{', '.join(group)}] (цикл)"
+                               for group in wave['groups']))  # Пакеты волны
+
+
+def load_side_index(config):
+    """Загружает индекс одной стороны сравнения (репозитории конфигурации) без глобального кеша индекса"""
+    is_test_mode = config['test_repo_mode'] in ['true', 'local']  # Тестовый режим стороны
+    try:
+        if is_test_mode:  # Тестовый файл
+            with open(config['repository_url'], 'r', encoding='utf-8') as f:  # Открытие файла
+                return build_apkindex_index(iter_test_repository_records(f), config['repository_url']), True  # Индекс файла
+        indexes = [load_apkindex_index(url) for url in config['repository_urls']]  # Репозитории по приоритету
+        return (indexes[0] if len(indexes) == 1 else merge_apkindex_indexes(indexes)), False  # Индекс стороны
+    except ValueError:  # Сообщение уже понятное
+        raise  # Пробрасываем как есть
+    except Exception as e:  # Ошибки сети и файловой системы
+        raise ValueError(f"Ошибка при загрузке {config['repository_url']}: {e}")  # Преобразование в ValueError
+
+
+def analyze_repository_side(apkindex_index, is_test_mode):
+    """Строит граф стороны сравнения и размеры замыканий всех ее пакетов, не трогая глобальный граф"""
+    graph = {}  # Пакет -> зависимости
+    for name in apkindex_index['packages']:  # Цикл по пакетам индекса
+        record = apkindex_index['by_name'][name]  # Запись пакета
+        graph[name] = list(record['D']) if is_test_mode else resolve_record_dependencies(apkindex_index, record)  # Ребра
+    compact = build_compact_graph(graph)  # Компактный граф стороны
+    components = find_strongly_connected_components(graph)  # Компоненты (сначала стоки)
+    component_of = {member: number for number, component in enumerate(components) for member in component}  # Узел -> компонента
+    sizes = []  # Установленные размеры по ID
+    for name in compact['names']:  # Цикл по узлам
+        record = apkindex_index['by_name'].get(name)  # Запись пакета
+        sizes.append(record['I'] if record else 0)  # Размер или 0
+    closure = {row['package']: row for row in compute_closure_sizes(compact, components, component_of, sizes)}  # Замыкания
+    return {'index': apkindex_index, 'graph': graph, 'closure': closure}  # Данные стороны
+
+
+def diff_repository_sides(old_side, new_side):
+    """Сопоставляет две стороны по имени пакета (хеш-соединение) и вычисляет разницу версий, ребер и замыканий"""
+    old_records, new_records = old_side['index']['by_name'], new_side['index']['by_name']  # Записи сторон
+    rows = []  # Строки отчета
+    for name in sorted(old_records.keys() | new_records.keys()):  # Объединение имен
+        old_record, new_record = old_records.get(name), new_records.get(name)  # Записи сторон
+        old_deps = set(old_side['graph'].get(name, ()))  # Прежние зависимости
+        new_deps = set(new_side['graph'].get(name, ()))  # Новые зависимости
+        old_closure = old_side['closure'][name]['closure_size'] if old_record else 0  # Прежний размер замыкания
+        new_closure = new_side['closure'][name]['closure_size'] if new_record else 0  # Новый размер замыкания
+        old_installed = old_side['closure'][name]['installed_size'] if old_record else 0  # Прежний размер установки
+        new_installed = new_side['closure'][name]['installed_size'] if new_record else 0  # Новый размер установки
+        old_version = old_record.get('V') if old_record else None  # Прежняя версия
+        new_version = new_record.get('V') if new_record else None  # Новая версия
+        if old_record is None:  # Пакет появился
+            status = 'added'  # Новый пакет
+        elif new_record is None:  # Пакет исчез
+            status = 'removed'  # Удаленный пакет
+        elif old_version != new_version or old_deps != new_deps or old_closure != new_closure:  # Что-то изменилось
+            status = 'changed'  # Измененный пакет
+        else:
+            continue  # Пакет не изменился
+        rows.append({
+            'package': name, 'status': status,  # Имя и вид изменения
+            'old_version': old_version, 'new_version': new_version,  # Версии
+            'version_change': compare_apk_versions(new_version, old_version) if old_record and new_record else 0,  # Рост версии
+            'deps_added': sorted(new_deps - old_deps), 'deps_removed': sorted(old_deps - new_deps),  # Изменения ребер
+            'closure_delta': new_closure - old_closure,  # Изменение размера замыкания
+            'installed_delta': new_installed - old_installed,  # Изменение установленного размера замыкания
+        })
+    return rows  # Возврат различий
+
+
+def display_repository_diff(old_label, new_label, old_side, new_side, rows):
+    """Выводит сводку и построчную разницу двух репозиториев"""
+    counts = {'added': 0, 'removed': 0, 'changed': 0}  # Количество по видам изменений
+    for row in rows:  # Подсчет
+        counts[row['status']] += 1  # Учет строки
+    print(f"\nСравнение {old_label} -> {new_label}")  # Заголовок
+    print(f"Пакетов: {len(old_side['index']['by_name'])} -> {len(new_side['index']['by_name'])} "
+          f"(+{counts['added']} -{counts['removed']} ~{counts['changed']})")  # Сводка
+    print(f"Изменили версию: {sum(1 for row in rows if row['status'] == 'changed' and row['old_version'] != row['new_version'])}, "
+          f"изменили зависимости: {sum(1 for row in rows if row['status'] == 'changed' and (row['deps_added'] or row['deps_removed']))}")
+    for row in rows:  # Цикл по изменениям
+        if row['status'] == 'added':  # Новый пакет
+            print(f"+ {row['package']} {row['new_version'] or ''}".rstrip())  # Вывод нового пакета
+            continue  # Следующая строка
+        if row['status'] == 'removed':  # Удаленный пакет
+            print(f"- {row['package']} {row['old_version'] or ''}".rstrip())  # Вывод удаленного пакета
+            continue  # Следующая строка
+        parts = [f"~ {row['package']}"]  # Части строки изменения
+        if row['old_version'] != row['new_version']:  # Версия изменилась
+            direction = '' if row['version_change'] >= 0 else ' (понижение)'  # Откат версии отмечается
+            parts.append(f"{row['old_version']} -> {row['new_version']}{direction}")  # Версии
+        if row['deps_added'] or row['deps_removed']:  # Зависимости изменились
+            parts.append(f"зависимости +[{', '.join(row['deps_added'])}] -[{', '.join(row['deps_removed'])}]")  # Ребра
+        if row['closure_delta'] or row['installed_delta']:  # Замыкание изменилось
+            parts.append(f"замыкание {row['closure_delta']:+d}, размер {row['installed_delta']:+d} байт")  # Замыкание
+        print("  ".join(parts))  # Вывод строки
+
+
+def run_repository_diff(config_paths):
+    """Параллельно загружает индексы двух и более конфигураций и выводит разницу соседних пар"""
+    if len(config_paths) < 2:  # Сравнивать нечего
+        raise ValueError("Для сравнения нужны как минимум две конфигурации")
+    configs = [parse_config(path) for path in config_paths]  # Конфигурации сторон
+    apply_cache_settings(configs[0])  # Общий дисковый кеш
+    for config in configs[1:]:  # Зеркала остальных сторон
+        REPOSITORY_MIRRORS.update(config['repository_mirrors'])  # Регистрация зеркал
+    with contextlib.redirect_stdout(sys.stderr):  # Сообщения о загрузке не смешиваются с отчетом
+        with ThreadPoolExecutor(max_workers=len(configs)) as executor:  # Параллельная загрузка сторон
+            loaded = list(executor.map(load_side_index, configs))  # Индексы сторон в порядке аргументов
+    with measure_phase('diff_analyze'):  # Графы и замыкания сторон
+        sides = [analyze_repository_side(apkindex_index, is_test_mode) for apkindex_index, is_test_mode in loaded]  # Стороны
+    labels = [os.path.basename(path) for path in config_paths]  # Подписи сторон
+    with measure_phase('output'):  # Сравнение и вывод
+        for position in range(1, len(sides)):  # Соседние пары сторон
+            rows = diff_repository_sides(sides[position - 1], sides[position])  # Хеш-соединение по имени
+            display_repository_diff(labels[position - 1], labels[position], sides[position - 1], sides[position], rows)
+
+
+def reset_graph_state():
+    """Очищает глобальные структуры графа перед новым построением"""
+    global compact_graph, dependency_graph  # Объявление глобальных переменных
+    dependency_graph = {}  # Новый словарь графа (прежний мог быть представлением поверх CSR)
+    visited.clear()  # Очистка посещенных пакетов
+    node_repository.clear()  # Очистка источников узлов
+    dependency_cycles.clear()  # Очистка циклов
+    scc_id.clear()  # Очистка номеров компонент
+    scc_components.clear()  # Очистка компонент
+    compact_graph = None  # Сброс компактного графа
+    node_closures.clear()  # Очистка размеров замыканий
+
+
+def build_complete_dependency_graph(repository_url, is_test_mode):
+    """Строит полный граф всех пакетов в репозитории"""
+    print("\nПостроение полного графа зависимостей...")  # Сообщение о начале построения
+
+    if is_test_mode:  # Если тестовый режим
+        all_packages = get_all_packages_from_test_file(repository_url)  # Получаем пакеты из тестового файла
+        print(f"Найдено пакетов в тестовом файле: {len(all_packages)}")  # Вывод количества пакетов
+    else:  # Если рабочий режим
+        all_packages = get_all_packages_from_apkindex(repository_url)  # Получаем пакеты из APKINDEX
+        print(f"Найдено пакетов в репозитории: {len(all_packages)}")  # Вывод количества пакетов
+
+    total_packages = len(all_packages)  # Сохраняем общее количество пакетов
+
+    # Убираем поштучный вывод, оставляем только общий прогресс
+    with measure_phase('graph_build'):  # Обход графа
+        parallel = BUILD_JOBS > 1 and not visited and 'fork' in multiprocessing.get_all_start_methods()  # Пул процессов
+        if parallel:  # Параллельное построение
+            install_built_graph(build_dependency_graph_parallel(repository_url, is_test_mode, BUILD_JOBS))  # Граф пула
+        else:
+            for package in all_packages:  # Цикл по всем пакетам
+                if package not in visited:  # Если пакет еще не обработан
+                    build_dependency_graph(package, None, repository_url, is_test_mode)  # Строим граф для пакета
+
+    with measure_phase('compact_graph'):  # Построение компактного графа
+        if not parallel:  # Граф пула уже собран в CSR
+            update_compact_graph()  # Компактное представление для обходов и экспорта
+    with measure_phase('scc'):  # Поиск сильно связных компонент (обход в порядке ID, как после пула)
+        update_dependency_cycles()  # Поиск циклов через сильно связные компоненты
+
+    print(f"Обработано пакетов: {len(visited)}/{total_packages}")  # Вывод прогресса обработки
+    print("Полный граф построен!")  # Сообщение о завершении
+
+def get_source_index(repository_url, is_test_mode):
+    """Возвращает индекс источника графа: тестового файла или APKINDEX (из кеша в памяти)"""
+    if is_test_mode:  # Тестовый режим
+        return load_test_repository_index(repository_url)  # Индекс тестового файла
+    return download_and_parse_apkindex(repository_url)  # Индекс APKINDEX
+
+
+def record_fingerprint(record):
+    """Возвращает отпечаток записи для сравнения индексов: версия, контрольная сумма C: и репозиторий"""
+    if record.get('C'):  # В APKINDEX контрольная сумма меняется вместе с содержимым пакета
+        return record.get('V'), record['C'], record['repository']  # Версия, контрольная сумма, репозиторий
+    return record.get('V'), tuple(record['D']), tuple(record['p']), record['repository']  # Без C: сравниваем поля целиком
+
+
+def diff_apkindex_indexes(old_index, new_index):
+    """Сравнивает два индекса по имени, версии и контрольной сумме; возвращает добавленные, удаленные и измененные пакеты"""
+    old_by_name = old_index['by_name']  # Старые записи
+    new_by_name = new_index['by_name']  # Новые записи
+    added = sorted(name for name in new_by_name if name not in old_by_name)  # Новые пакеты
+    removed = sorted(name for name in old_by_name if name not in new_by_name)  # Удаленные пакеты
+    changed = sorted(name for name, record in new_by_name.items()
+                     if name in old_by_name and record_fingerprint(record) != record_fingerprint(old_by_name[name]))  # Измененные
+    return {'added': added, 'removed': removed, 'changed': changed}  # Возврат различий
+
+
+def find_affected_nodes(old_index, new_index, changed_names):
+    """Находит узлы, зависимости которых нужно разрешить заново после изменения пакетов"""
+    provided_names = set(changed_names)  # Имена, разрешение которых могло измениться
+    for name in changed_names:  # Цикл по измененным пакетам
+        for apkindex_index in (old_index, new_index):  # Старая и новая запись пакета
+            record = apkindex_index['by_name'].get(name)  # Запись пакета
+            if record:  # Пакет есть в индексе
+                provided_names.update(parse_dependency_token(token)[0] for token in record['p'])  # Предоставляемые имена
+    affected = set(changed_names)  # Сами измененные пакеты
+    for provided_name in provided_names:  # Цикл по затронутым именам
+        affected.update(compact_referrers(provided_name))  # Кто ссылался на имя напрямую
+        provider = old_index['providers'].get(provided_name)  # Прежний поставщик имени
+        if provider:  # Имя разрешалось через поставщика
+            affected.add(provider)  # Сам поставщик мог зависеть от своего имени (петля не попадает в обратный граф)
+            affected.update(compact_referrers(provider))  # Кто зависел от прежнего поставщика
+    return affected  # Возврат затронутых узлов
+
+
+def apply_graph_changes(affected, new_index, repository_url, is_test_mode):
+    """Заново разрешает зависимости затронутых узлов и удаляет узлы без ссылок.
+    Возвращает (добавлено ребер, удалено ребер, новые узлы, удаленные узлы)"""
+    edges_added = edges_removed = 0  # Счетчики ребер
+    added_nodes = set()  # Узлы, которых не было в графе
+    removed_nodes = set()  # Узлы, удаленные из графа
+    orphans = set()  # Узлы, которые могли потерять всех зависящих от них
+    for name in sorted(affected):  # Цикл по затронутым узлам
+        old_dependencies = dependency_graph.get(name, [])  # Прежние зависимости
+        if name in new_index['by_name']:  # Пакет есть в новом индексе
+            new_dependencies = get_package_dependencies(name, None, repository_url, is_test_mode)  # Новые зависимости
+        else:
+            new_dependencies = []  # Пакет удален: узел остается листом, пока на него ссылаются
+        orphans.update(old_dependencies)  # Прежние зависимости могли потерять последнюю ссылку
+        edges_removed += len(set(old_dependencies) - set(new_dependencies))  # Исчезнувшие ребра
+        edges_added += len(set(new_dependencies) - set(old_dependencies))  # Появившиеся ребра
+        if name not in dependency_graph:  # Новый пакет
+            added_nodes.add(name)  # Учет нового узла
+        dependency_graph[name] = new_dependencies  # Новые зависимости узла
+        visited.add(name)  # Узел обработан
+        node_repository[name] = get_package_repository(name, repository_url, is_test_mode)  # Источник узла
+        orphans.add(name)  # Удаленный пакет без ссылок тоже убирается
+
+    for name in affected:  # Новые узлы, впервые появившиеся среди зависимостей
+        for dep in dependency_graph[name]:  # Цикл по зависимостям
+            if dep not in visited:  # Узла еще нет в графе
+                added_nodes.update(build_dependency_graph(dep, None, repository_url, is_test_mode))  # Новый подграф
+    for name in orphans:  # Узлы вне индекса, на которые больше никто не ссылается
+        if name in new_index['by_name'] or name not in dependency_graph or compact_referrers(name):  # Узел остается
+            continue  # Следующий кандидат
+        del dependency_graph[name]  # Удаление узла
+        visited.discard(name)  # Удаление из обработанных
+        node_repository.pop(name, None)  # Удаление источника
+        removed_nodes.add(name)  # Учет удаленного узла
+    return edges_added, edges_removed, added_nodes - removed_nodes, removed_nodes  # Возврат изменений
+
+
+def update_dependency_cycles_incremental(changed_nodes, removed_nodes):
+    """Пересчитывает сильно связные компоненты только в области изменений: среди потомков измененных узлов и в прежних
+    компонентах, которые их пересекают. Номера получают только объединившиеся или распавшиеся компоненты (и компоненты,
+    перенесенные на освободившиеся номера); циклы остальных компонент не пересобираются"""
+    region = set()  # Узлы, компоненты которых пересчитываются
+    stack = [name for name in changed_nodes if name in dependency_graph]  # Стек обхода
+    region.update(stack)  # Стартовые узлы
+    while stack:  # Итеративный обход потомков
+        for dep in dependency_graph.get(stack.pop(), ()):  # Зависимости узла
+            if dep not in region:  # Еще не посещен
+                region.add(dep)  # Отмечаем
+                stack.append(dep)  # Продолжаем обход
+    dropped = {scc_id[name] for name in region | set(removed_nodes) if name in scc_id}  # Прежние компоненты области
+    for number in dropped:  # Цикл мог распасться и вне потомков: прежняя компонента пересчитывается целиком
+        region.update(member for member in scc_components[number] if member in dependency_graph)  # Узлы компоненты
+    for name in removed_nodes:  # Удаленные узлы
+        scc_id.pop(name, None)  # Номер больше не нужен
+
+    # Любой цикл через узел области целиком лежит в области, поэтому ребра наружу при поиске не нужны
+    subgraph = {name: [dep for dep in dependency_graph.get(name, ()) if dep in region] for name in region}  # Подграф
+    new_components = find_strongly_connected_components(subgraph)  # Компоненты области
+    stale = {tuple(sorted(scc_components[number])) for number in dropped}  # Прежние компоненты области
+    dependency_cycles[:] = [cycle for cycle in dependency_cycles if tuple(cycle) not in stale]  # Циклы вне области
+
+    previous = {frozenset(scc_components[number]): number for number in dropped}  # Состав -> прежний номер
+    free = []  # Номера, освободившиеся после объединения или распада
+    placed = []  # Компоненты, которым нужен номер
+    for component in new_components:  # Цикл по компонентам области
+        number = previous.pop(frozenset(component), None)  # Прежний номер той же компоненты
+        if number is None:  # Компонента объединилась или распалась
+            placed.append(component)  # Номер выдается ниже
+        else:
+            scc_components[number] = component  # Номер и номера узлов не меняются
+    free.extend(previous.values())  # Номера исчезнувших компонент
+    for component in placed:  # Новые компоненты занимают свободные номера или добавляются в конец
+        number = free.pop() if free else len(scc_components)  # Номер компоненты
+        if number == len(scc_components):  # Свободных номеров нет
+            scc_components.append(component)  # Новый номер
+        else:
+            scc_components[number] = component  # Освободившийся номер
+        for member in component:  # Цикл по узлам компоненты
+            scc_id[member] = number  # Номер компоненты узла
+    for number in sorted(free, reverse=True):  # Лишние номера занимает последняя компонента списка
+        moved = scc_components.pop()  # Последняя компонента
+        if number < len(scc_components):  # Номер внутри списка
+            scc_components[number] = moved  # Перенос компоненты
+            for member in moved:  # Цикл по узлам перенесенной компоненты
+                scc_id[member] = number  # Новый номер узла
+
+    for component in new_components:  # Циклы области
+        node = component[0]  # Любой узел компоненты
+        if len(component) > 1 or node in dependency_graph.get(node, ()):  # Несколько узлов или петля
+            dependency_cycles.append(sorted(component))  # Сохраняем цикл
+
+
+def update_node_closures(names, removed_nodes, repository_url, is_test_mode):
+    """Пересчитывает размеры замыканий только для узлов names (предков изменений) по подграфу их замыканий"""
+    for name in removed_nodes:  # Удаленные узлы
+        node_closures.pop(name, None)  # Размер больше не нужен
+    area = set(names)  # Узлы, от которых зависят замыкания names
+    stack = list(area)  # Стек обхода
+    while stack:  # Итеративный обход
+        for dep in dependency_graph.get(stack.pop(), ()):  # Зависимости узла
+            if dep not in area:  # Еще не посещен
+                area.add(dep)  # Отмечаем
+                stack.append(dep)  # Продолжаем обход
+    compact = build_compact_graph({name: dependency_graph.get(name, []) for name in area})  # CSR области
+    components = [scc_components[number] for number in sorted({scc_id[name] for name in area})]  # Компоненты области
+    component_of = {member: number for number, component in enumerate(components) for member in component}  # Номера
+    sizes = get_installed_sizes(compact['names'], repository_url, is_test_mode)  # Размеры узлов области
+    for row in compute_closure_sizes(compact, components, component_of, sizes):  # Замыкания области
+        if row['package'] in names:  # Замыкания остальных узлов области не изменились
+            node_closures[row['package']] = row['closure_size'], row['installed_size']  # Новый размер
+
+
+def refresh_dependency_graph(repository_url, is_test_mode):
+    """Перечитывает источник и обновляет только затронутые изменениями узлы, компоненты и размеры замыканий;
+    изменения копятся поверх CSR, пока их не станет больше порога. Возвращает отчет"""
+    global APKINDEX_CACHE, APKINDEX_URL  # Объявление глобальных переменных
+    old_index = get_source_index(repository_url, is_test_mode)  # Индекс, по которому построен текущий граф
+    APKINDEX_CACHE = None  # Сброс кеша индекса
+    APKINDEX_URL = None  # Сброс URL индекса
+    new_index = get_source_index(repository_url, is_test_mode)  # Новый индекс
+    diff = diff_apkindex_indexes(old_index, new_index)  # Различия индексов
+    diff['versions'] = {name: (old_index['by_name'][name].get('V'), new_index['by_name'][name].get('V'))
+                        for name in diff['changed']}  # Прежние и новые версии
+    changed_names = diff['added'] + diff['removed'] + diff['changed']  # Все измененные пакеты
+    old_cycles = {tuple(cycle) for cycle in dependency_cycles}  # Циклы до обновления
+    if not changed_names:  # Источник не изменился по содержимому
+        diff.update({'affected': 0, 'edges_added': 0, 'edges_removed': 0, 'closure_changed': 0,
+                     'new_cycles': [], 'broken_cycles': []})  # Пустой отчет
+        return diff  # Граф актуален
+
+    with measure_phase('graph_update'):  # Обновление узлов и ребер
+        affected = find_affected_nodes(old_index, new_index, changed_names)  # Узлы для повторного разрешения
+        edges_added, edges_removed, new_nodes, removed_nodes = apply_graph_changes(
+            affected, new_index, repository_url, is_test_mode)  # Обновление поверх CSR
+    with measure_phase('scc'):  # Пересчет компонент области изменений
+        update_dependency_cycles_incremental(affected | new_nodes, removed_nodes)  # Локальный пересчет
+    with measure_phase('compact_graph'):  # Перестроение CSR только после накопления изменений
+        ensure_compact_graph(max(OVERLAY_COMPACT_MIN, OVERLAY_COMPACT_RATIO * len(compact_graph['names'])))  # Порог
+    with measure_phase('closure'):  # Размеры замыканий предков изменений
+        ancestors = find_reverse_reachable(affected | new_nodes)  # Пакеты, чьи замыкания могли измениться
+        if node_closures:  # Замыкания уже вычислялись: обновляются только предки изменений
+            update_node_closures(ancestors, removed_nodes, repository_url, is_test_mode)  # Пересчет по области
+
+    new_cycles = {tuple(cycle) for cycle in dependency_cycles}  # Циклы после обновления
+    diff.update({
+        'affected': len(affected),  # Узлы с заново разрешенными зависимостями
+        'edges_added': edges_added,  # Новые ребра
+        'edges_removed': edges_removed,  # Удаленные ребра
+        'closure_changed': len(ancestors),  # Пакеты, чьи транзитивные замыкания могли измениться
+        'new_cycles': sorted(new_cycles - old_cycles),  # Появившиеся циклы
+        'broken_cycles': sorted(old_cycles - new_cycles),  # Исчезнувшие циклы
+    })
+    return diff  # Возврат отчета
+
+
+def display_refresh_report(report):
+    """Выводит отчет об инкрементальном обновлении графа"""
+    print(f"\nИзменения индекса: +{len(report['added'])} -{len(report['removed'])} ~{len(report['changed'])}")  # Сводка
+    for name in report['added']:  # Новые пакеты
+        print(f"  + {name}")  # Вывод нового пакета
+    for name in report['removed']:  # Удаленные пакеты
+        print(f"  - {name}")  # Вывод удаленного пакета
+    for name in report['changed']:  # Измененные пакеты
+        old_version, new_version = report['versions'][name]  # Версии до и после
+        print(f"  ~ {name} {old_version} -> {new_version}" if old_version or new_version else f"  ~ {name}")  # Вывод изменения
+    print(f"Затронуто узлов: {report['affected']}, ребер добавлено: {report['edges_added']}, "
+          f"удалено: {report['edges_removed']}")  # Объем обновления
+    print(f"Пакетов с измененным замыканием: {report['closure_changed']}")  # Затронутые предки
+    for label, cycles in (('NEW CYCLE', report['new_cycles']), ('BROKEN CYCLE', report['broken_cycles'])):  # Изменения циклов
+        for cycle in cycles:  # Цикл по циклам
+            shown = ', '.join(cycle[:10]) + (f", ... (всего {len(cycle)})" if len(cycle) > 10 else '')  # Крупные циклы сокращаем
+            print(f"  {label}: {shown}")  # Вывод цикла
+
+
+def display_dependency_graph():
+    """Выводит построенный граф зависимостей"""
+    with measure_phase('output'):  # Замер времени вывода
+        print_dependency_graph()  # Вывод графа
+
+
+def print_dependency_graph():
+    """Печатает граф зависимостей, найденные циклы и сводку по репозиториям"""
+    print("\n" + "=" * 60)  # Верхняя разделительная линия
+    print("ПОЛНЫЙ ГРАФ ЗАВИСИМОСТЕЙ РЕПОЗИТОРИЯ")  # Заголовок
+    print("=" * 60)  # Нижняя разделительная линия
+
+    # Сортируем пакеты для удобства чтения
+    sorted_packages = sorted(dependency_graph.keys())  # Сортировка имен пакетов
+
+    for package in sorted_packages:  # Цикл по всем пакетам
+        dependencies = dependency_graph[package]  # Получение зависимостей пакета
+        if dependencies:  # Если зависимости есть
+            deps_str = ", ".join(dependencies)  # Формирование строки зависимостей
+            print(f"{package} -> [{deps_str}]")  # Вывод пакета с зависимостями
+        else:  # Если зависимостей нет
+            print(f"{package} -> []")  # Вывод пакета без зависимостей
+
+    print(f"\nВсего пакетов в графе: {len(dependency_graph)}")  # Вывод общего количества пакетов
+
+    if dependency_cycles:  # Если найдены циклы
+        print(f"\nЦиклических зависимостей (сильно связных компонент): {len(dependency_cycles)}")  # Заголовок
+        for component in dependency_cycles:  # Цикл по компонентам
+            print(f"  CYCLE: {', '.join(component)}")  # Вывод узлов цикла
+
+    repository_counts = {}  # Количество узлов по репозиториям
+    for package in dependency_graph:  # Цикл по узлам графа
+        repository = node_repository.get(package) or "не найден"  # Источник узла
+        repository_counts[repository] = repository_counts.get(repository, 0) + 1  # Подсчет
+    if len(repository_counts) > 1:  # Сводка полезна только для нескольких источников
+        print("Узлов по репозиториям:")  # Заголовок сводки
+        for repository, count in sorted(repository_counts.items()):  # Цикл по репозиториям
+            print(f"  {repository}: {count}")  # Вывод количества
+
+def render_ascii_tree(root_name, stream):
+    """Пишет ASCII-дерево зависимостей пакета в поток построчно; уже раскрытые поддеревья выводятся ссылкой"""
+    write = stream.write  # Запись в буферизованный поток без сборки общей строки
+    expanded = set()  # Пакеты, поддерево которых уже выведено
+    path = set()  # Пакеты на текущем пути от корня (для циклов)
+    stack = [(root_name, '', '')]  # Явный стек: (имя, префикс строки, префикс потомков)
+    lines = 0  # Количество выведенных строк
+    while stack:  # Пока есть узлы для вывода
+        name, line_prefix, child_prefix = stack.pop()  # Очередной элемент стека
+        if line_prefix is None:  # Маркер выхода из поддерева
+            path.discard(name)  # Узел покидает текущий путь
+            continue  # Следующий элемент
+        lines += 1  # Учет строки
+        if name in path:  # Зависимость ведет обратно на текущий путь
+            write(f"{line_prefix}{name} (цикл)\n")  # Ссылка на цикл
+            continue  # Поддерево не раскрываем
+        if name in expanded:  # Поддерево уже выведено выше
+            write(f"{line_prefix}{name} (*)\n")  # Обратная ссылка
+            continue  # Поддерево не раскрываем повторно
+        write(f"{line_prefix}{name}\n")  # Строка пакета
+        dependencies = dependency_graph.get(name)  # Зависимости пакета
+        if not dependencies:  # Лист дерева
+            continue  # Раскрывать нечего
+        expanded.add(name)  # Поддерево раскрывается один раз
+        path.add(name)  # Узел на текущем пути
+        stack.append((name, None, None))  # Маркер выхода после всех потомков
+        last = len(dependencies) - 1  # Индекс последней зависимости
+        for index in range(last, -1, -1):  # Обратный порядок: первая зависимость выводится первой
+            if index == last:  # Последняя зависимость
+                stack.append((dependencies[index], child_prefix + '\\-- ', child_prefix + '    '))  # Угол ветки
+            else:
+                stack.append((dependencies[index], child_prefix + '+-- ', child_prefix + '|   '))  # Продолжение ветки
+    return lines  # Количество строк дерева
+
+
+def display_ascii_tree(root_name):
+    """Выводит ASCII-дерево зависимостей корневого пакета"""
+    with measure_phase('output'):  # Замер времени вывода
+        if root_name not in dependency_graph:  # Корня нет в графе
+            print(f"Пакет {root_name} не найден в графе")  # Сообщение
+            return  # Нечего выводить
+        print(f"\nДерево зависимостей пакета {root_name} ((*) - поддерево выведено выше):")  # Заголовок
+        lines = render_ascii_tree(root_name, sys.stdout)  # Построчная запись в буферизованный stdout
+        sys.stdout.flush()  # Сброс буфера
+        count_metric('tree_lines', lines)  # Учет выведенных строк
+
+
+def iter_export_nodes(repository_url, is_test_mode):
+    """Выдает атрибуты узлов компактного графа по одному (ID, имя, версия, репозиторий, размер, компонента)"""
+    for node_id, name in enumerate(compact_graph['names']):  # Цикл по узлам в порядке ID
+        record = get_package_record(name, repository_url, is_test_mode)  # Запись APKINDEX
+        yield {
+            'id': node_id,  # Целочисленный ID
+            'name': name,  # Имя пакета
+            'version': record['V'] if record else None,  # Версия
+            'repository': node_repository.get(name),  # Репозиторий
+            'installed_size': record['I'] if record else 0,  # Установленный размер
+            'scc': scc_id.get(name),  # Номер сильно связной компоненты
+        }
+
+
+def iter_export_edges():
+    """Выдает ребра компактного графа парами (ID источника, ID цели)"""
+    offsets, targets = compact_graph['forward']  # Массивы CSR прямых ребер
+    for source in range(len(offsets) - 1):  # Цикл по источникам
+        for position in range(offsets[source], offsets[source + 1]):  # Ребра источника
+            yield source, targets[position]  # Ребро
+
+
+def iter_jsonl_export(repository_url, is_test_mode):
+    """Выдает строки экспорта JSON Lines: сначала узлы, затем ребра"""
+    for node in iter_export_nodes(repository_url, is_test_mode):  # Цикл по узлам
+        yield json.dumps({'type': 'node', **node}, ensure_ascii=False) + '\n'  # Строка узла
+    names = compact_graph['names']  # Имена по ID
+    for source, target in iter_export_edges():  # Цикл по ребрам
+        yield json.dumps({'type': 'edge', 'source': names[source], 'target': names[target]},
+                         ensure_ascii=False) + '\n'  # Строка ребра
+
+
+def dot_quote(value):
+    """Заключает значение в кавычки по правилам Graphviz DOT"""
+    return '"' + str(value).replace('\\', '\\\\').replace('"', '\\"') + '"'  # Экранирование
+
+
+def iter_dot_export(repository_url, is_test_mode):
+    """Выдает строки экспорта Graphviz DOT"""
+    yield 'digraph dependencies {\n'  # Начало графа
+    for node in iter_export_nodes(repository_url, is_test_mode):  # Цикл по узлам
+        attributes = ', '.join(f"{key}={dot_quote(node[key])}"
+                               for key in ('version', 'repository', 'installed_size', 'scc')
+                               if node[key] is not None)  # Атрибуты узла
+        yield f"  {dot_quote(node['name'])} [{attributes}];\n"  # Строка узла
+    names = compact_graph['names']  # Имена по ID
+    for source, target in iter_export_edges():  # Цикл по ребрам
+        yield f"  {dot_quote(names[source])} -> {dot_quote(names[target])};\n"  # Строка ребра
+    yield '}\n'  # Конец графа
+
+
+# Атрибуты узлов GraphML: имя атрибута -> тип
+GRAPHML_KEYS = (('name', 'string'), ('version', 'string'), ('repository', 'string'),
+                ('installed_size', 'long'), ('scc', 'int'))
+
+
+def iter_graphml_export(repository_url, is_test_mode):
+    """Выдает строки экспорта GraphML"""
+    yield '<?xml version="1.0" encoding="UTF-8"?>\n'  # Заголовок XML
+    yield '<graphml xmlns="http://graphml.graphdrawing.org/xmlns">\n'  # Корневой элемент
+    for key, key_type in GRAPHML_KEYS:  # Объявления атрибутов
+        yield f'  <key id="{key}" for="node" attr.name="{key}" attr.type="{key_type}"/>\n'  # Атрибут узла
+    yield '  <graph id="dependencies" edgedefault="directed">\n'  # Начало графа
+    for node in iter_export_nodes(repository_url, is_test_mode):  # Цикл по узлам
+        data = ''.join(f'<data key="{key}">{escape(str(node[key]))}</data>'
+                       for key, _key_type in GRAPHML_KEYS if node[key] is not None)  # Атрибуты узла
+        yield f'    <node id="n{node["id"]}">{data}</node>\n'  # Строка узла
+    for source, target in iter_export_edges():  # Цикл по ребрам
+        yield f'    <edge source="n{source}" target="n{target}"/>\n'  # Строка ребра
+    yield '  </graph>\n</graphml>\n'  # Конец документа
+
+
+# Генераторы экспорта по форматам
+EXPORT_FORMATS = {'jsonl': iter_jsonl_export, 'dot': iter_dot_export, 'graphml': iter_graphml_export}
+
+
+def export_graph(export_format, output_path, repository_url, is_test_mode):
+    """Записывает граф в выбранном формате в файл или stdout (путь "-") без сборки результата в памяти"""
+    lines = EXPORT_FORMATS[export_format](repository_url, is_test_mode)  # Генератор строк
+    with measure_phase('output'):  # Замер времени вывода
+        if output_path == '-':  # Вывод в stdout
+            sys.stdout.writelines(lines)  # Построчная запись
+            sys.stdout.flush()  # Сброс буфера
+        else:
+            with open(output_path, 'w', encoding='utf-8', buffering=1024 * 1024) as f:  # Буферизованный файл
+                f.writelines(lines)  # Построчная запись
+
+
+def create_test_files():
+    """Создает тестовые файлы для демонстрации"""
+    test_files = {
+        "test_simple.txt": """A: B, C
+B: D
+C: E
+D: 
+E: F
+F:""",
+
+        "test_cycle.txt": """A: B
+B: C  
+C: A
+D: E
+E:""",
+
+        "test_diamond.txt": """A: B, C
+B: D
+C: D
+D: E
+E:""",
+
+        "test_complex.txt": """A: B, C, F
+B: D, E
+C: G
+D: H
+E: H, I
+F: J
+G: K
+H: 
+I: J
+J: 
+K: L
+L:"""
+    }
+
+    for filename, content in test_files.items():  # Цикл по всем тестовым файлам
+        if not os.path.exists(filename):  # Проверка существования файла
+            with open(filename, 'w', encoding='utf-8') as f:  # Открытие файла для записи
+                f.write(content)  # Запись содержимого в файл
+            print(f"Создан тестовый файл: {filename}")  # Сообщение о создании файла
+
+
+def interactive_test_mode():
+    """Интерактивный режим тестирования"""
+    print("\n" + "=" * 50)  # Разделительная линия
+    print("ИНТЕРАКТИВНЫЙ РЕЖИМ ТЕСТИРОВАНИЯ")  # Заголовок
+    print("=" * 50)  # Разделительная линия
+
+    while True:  # Бесконечный цикл для ввода пути
+        file_path = input("\nВведите путь к тестовому файлу (например: test_simple.txt): ").strip()  # Запрос пути
+
+        if not file_path:  # Проверка пустого ввода
+            print("Путь не может быть пустым!")  # Сообщение об ошибке
+            continue  # Повтор запроса
+
+        if not file_path.endswith('.txt'):  # Проверка расширения
+            file_path += '.txt'  # Добавление расширения .txt
+
+        if os.path.exists(file_path):  # Проверка существования файла
+            break  # Выход из цикла если файл найден
+        else:
+            print(f"Файл '{file_path}' не найден!")  # Сообщение об ошибке
+            create_test_files()  # Создание тестовых файлов
+            print("Доступные тестовые файлы:")  # Вывод списка файлов
+            for file in ["test_simple.txt", "test_cycle.txt", "test_diamond.txt", "test_complex.txt"]:  # Цикл по файлам
+                if os.path.exists(file):  # Проверка существования файла
+                    print(f"  - {file}")  # Вывод имени файла
+
+    print(f"\nАнализируем файл {file_path}...")  # Сообщение о начале анализа
+
+    # Очищаем глобальные структуры
+    reset_graph_state()  # Очистка структур графа
+    global APKINDEX_CACHE, APKINDEX_URL  # Объявление глобальных переменных
+    APKINDEX_CACHE = None  # Сброс кеша APKINDEX
+    APKINDEX_URL = None  # Сброс URL APKINDEX
+
+    # Строим полный граф
+    build_complete_dependency_graph(file_path, True)  # Построение графа в тестовом режиме
+    display_dependency_graph()  # Вывод графа зависимостей
+
+
+def capture_daemon_state(repository_url, is_test_mode, source_checksum):
+    """Копирует построенный граф в неизменяемое состояние демона (глобальные структуры очищаются при перестроении)"""
+    versions = {}  # Версии пакетов
+    for name in dependency_graph:  # Цикл по узлам графа
+        record = get_package_record(name, repository_url, is_test_mode)  # Запись APKINDEX
+        versions[name] = record['V'] if record else None  # Версия пакета
+    cycles = [list(cycle) for cycle in dependency_cycles]  # Копия найденных циклов
+    ensure_compact_graph()  # Демону нужен CSR без накопленных изменений
+    return {
+        'graph': compact_graph,  # Компактный граф (новый объект при каждом построении)
+        'cycles': cycles,  # Циклы графа
+        'cycle_of': {name: number for number, cycle in enumerate(cycles) for name in cycle},  # Узел -> номер цикла
+        'versions': versions,  # Версии пакетов
+        'repositories': dict(node_repository),  # Копия источников узлов
+        'checksum': source_checksum,  # Контрольная сумма исходных данных
+        'loaded_at': time.time(),  # Время построения
+    }
+
+
+def reload_daemon_state(repository_url, is_test_mode):
+    """Перепроверяет исходный APKINDEX и перестраивает граф демона, если он изменился; возвращает True при перестроении"""
+    global DAEMON_STATE, APKINDEX_CACHE, APKINDEX_URL  # Объявление глобальных переменных
+    with DAEMON_LOCK:  # Одно перестроение за раз
+        VALIDATED_ARCHIVES.clear()  # Разрешаем условные запросы к репозиториям
+        checksum = get_source_checksum(repository_url, is_test_mode)  # Контрольная сумма (304 без изменений)
+        if DAEMON_STATE is not None and DAEMON_STATE['checksum'] == checksum:  # Источник не изменился
+            return False  # Граф актуален
+        if DAEMON_STATE is not None:  # Граф уже построен: обновляем только изменившиеся пакеты
+            display_refresh_report(refresh_dependency_graph(repository_url, is_test_mode))  # Инкрементальное обновление
+            DAEMON_STATE = capture_daemon_state(repository_url, is_test_mode, checksum)  # Атомарная замена состояния
+            return True  # Граф обновлен
+        reset_graph_state()  # Очистка глобальных структур
+        APKINDEX_CACHE = None  # Сброс кеша индекса
+        APKINDEX_URL = None  # Сброс URL индекса
+        build_complete_dependency_graph(repository_url, is_test_mode)  # Построение графа
+        DAEMON_STATE = capture_daemon_state(repository_url, is_test_mode, checksum)  # Атомарная замена состояния
+        return True  # Граф перестроен
+
+
+def answer_daemon_query(state, path, params):
+    """Отвечает на запрос к демону; возвращает (HTTP-код, словарь ответа)"""
+    if path == '/status':  # Состояние демона
+        return 200, {'nodes': len(state['versions']), 'cycles': len(state['cycles']),
+                     'checksum': state['checksum'], 'loaded_at': state['loaded_at']}
+    if path == '/cycles':  # Все циклы графа
+        return 200, {'cycles': state['cycles']}
+    if path not in ('/deps', '/rdeps'):  # Неизвестный запрос
+        return 404, {'error': f"Неизвестный запрос: {path}"}
+    package_name = params.get('package', [''])[0]  # Имя пакета из параметров
+    if not package_name:  # Пакет не указан
+        return 400, {'error': "Не указан параметр package"}
+    finder = find_dependencies if path == '/deps' else find_reverse_dependencies  # Направление обхода
+    result = finder(state['graph'], package_name)  # Запрос к компактному графу
+    if result is None:  # Пакета нет в графе
+        return 404, {'error': f"Пакет {package_name} не найден в графе"}
+    direct, transitive = result  # Результат запроса
+    number = state['cycle_of'].get(package_name)  # Номер цикла, в который входит пакет
+    cycle = state['cycles'][number] if number is not None else None  # Цикл за O(1) без перебора
+    return 200, {'package': package_name, 'version': state['versions'].get(package_name),
+                 'repository': state['repositories'].get(package_name),
+                 'direct': direct, 'transitive': transitive, 'cycle': cycle}
+
+
+class DaemonRequestHandler(http.server.BaseHTTPRequestHandler):
+    """Обработчик HTTP-демона: отвечает на запросы deps, rdeps, cycles и status в формате JSON"""
+
+    def do_GET(self):
+        start = time.perf_counter()  # Начало обработки запроса
+        url = urllib.parse.urlsplit(self.path)  # Разбор адреса запроса
+        state = DAEMON_STATE  # Текущее состояние (ссылка не меняется во время ответа)
+        if state is None:  # Граф еще строится
+            status, body = 503, {'error': "Граф еще не построен"}
+        else:
+            status, body = answer_daemon_query(state, url.path, urllib.parse.parse_qs(url.query))  # Ответ на запрос
+        body['elapsed_ms'] = round((time.perf_counter() - start) * 1000, 3)  # Время ответа
+        data = json.dumps(body, ensure_ascii=False).encode('utf-8')  # Сериализация ответа
+        self.send_response(status)  # Код ответа
+        self.send_header('Content-Type', 'application/json; charset=utf-8')  # Тип содержимого
+        self.send_header('Content-Length', str(len(data)))  # Длина ответа
+        self.end_headers()  # Конец заголовков
+        self.wfile.write(data)  # Тело ответа
+
+    def log_message(self, format, *args):
+        pass  # Журнал запросов не выводим
+
+
+def daemon_reload_loop(repository_url, is_test_mode, interval, stop_event):
+    """Периодически перепроверяет APKINDEX и перестраивает граф демона в фоне"""
+    while not stop_event.wait(interval):  # Ожидание следующей проверки
+        try:
+            if reload_daemon_state(repository_url, is_test_mode):  # Источник изменился
+                print(f"Граф перестроен: {len(DAEMON_STATE['versions'])} пакетов")  # Сообщение
+        except Exception as e:  # Ошибка сети или разбора
+            print(f"Ошибка перезагрузки графа, используется прежний: {e}")  # Продолжаем со старым графом
+
+
+def run_daemon(repository_url, is_test_mode, port=DAEMON_PORT, interval=DAEMON_RELOAD_INTERVAL):
+    """Строит граф один раз и отвечает на запросы по локальному HTTP до остановки"""
+    reload_daemon_state(repository_url, is_test_mode)  # Начальное построение графа
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', port), DaemonRequestHandler)  # Сервер на localhost
+    stop_event = threading.Event()  # Сигнал остановки фоновой перезагрузки
+    reloader = threading.Thread(target=daemon_reload_loop,
+                                args=(repository_url, is_test_mode, interval, stop_event), daemon=True)  # Фоновый поток
+    reloader.start()  # Запуск перезагрузки
+    print(f"Демон запущен: http://127.0.0.1:{server.server_address[1]} (запросы /deps, /rdeps, /cycles, /status)")
+    try:
+        server.serve_forever()  # Обработка запросов
+    except KeyboardInterrupt:  # Остановка по Ctrl+C
+        print("Демон остановлен")  # Сообщение
+    finally:
+        stop_event.set()  # Остановка фоновой перезагрузки
+        server.server_close()  # Закрытие сокета
+
+
+def file_checksum(path):
+    """Вычисляет SHA-256 файла, читая его блоками"""
+    digest = hashlib.sha256()  # Контрольная сумма
+    with open(path, 'rb') as f:  # Чтение файла
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):  # Чтение блоками
+            digest.update(chunk)  # Обновление контрольной суммы
+    return digest.hexdigest()  # Шестнадцатеричная строка
+
+
+def poll_repository_checksums(repository_url, is_test_mode):
+    """Условно перепроверяет каждый источник графа; возвращает словарь источник -> контрольная сумма"""
+    if is_test_mode:  # Тестовый файл проверяется напрямую
+        return {repository_url: file_checksum(repository_url)}  # Контрольная сумма файла
+    VALIDATED_ARCHIVES.clear()  # Каждый опрос заново делает условные запросы
+    urls = repository_url if isinstance(repository_url, (list, tuple)) else [repository_url]  # Список URL
+    with contextlib.redirect_stdout(StringIO()):  # Сообщения о загрузке не засоряют вывод событий
+        return {url: file_checksum(fetch_apkindex_archive(url)) for url in urls}  # 304 не скачивает архив заново
+
+
+def next_poll_delay(interval, failures, jitter=WATCH_JITTER, max_backoff=WATCH_MAX_BACKOFF):
+    """Вычисляет паузу до следующего опроса: экспоненциальная задержка после ошибок и случайный разброс"""
+    delay = min(interval * (2 ** failures), max(interval, max_backoff))  # Экспоненциальная задержка после ошибок
+    return delay * (1 + random.uniform(-jitter, jitter))  # Случайный разброс
+
+
+def print_watch_event(event):
+    """Выводит событие режима наблюдения одной строкой JSON"""
+    print(json.dumps(event, ensure_ascii=False), flush=True)  # Строка события
+
+
+def watch_repositories(repository_url, is_test_mode, interval=WATCH_INTERVAL, jitter=WATCH_JITTER,
+                       on_event=print_watch_event, max_polls=None, stop_event=None):
+    """Периодически опрашивает источники и обновляет граф в памяти только при изменении индекса"""
+    stop_event = stop_event or threading.Event()  # Сигнал остановки
+    checksums = None  # Контрольные суммы источников на момент построения графа
+    failures = 0  # Подряд неудачных опросов
+    poll = 0  # Номер опроса
+    while max_polls is None or poll < max_polls:  # Цикл опросов
+        poll += 1  # Следующий опрос
+        event = {'poll': poll, 'time': time.strftime('%Y-%m-%dT%H:%M:%S')}  # Событие опроса
+        start = time.perf_counter()  # Начало опроса
+        try:
+            new_checksums = poll_repository_checksums(repository_url, is_test_mode)  # Условные запросы
+            if checksums is None:  # Первый опрос: полное построение
+                with contextlib.redirect_stdout(StringIO()):  # Сообщения построения не засоряют вывод событий
+                    reset_graph_state()  # Очистка глобальных структур
+                    build_complete_dependency_graph(repository_url, is_test_mode)  # Построение графа
+                event.update({'status': 'built', 'nodes': len(dependency_graph), 'cycles': len(dependency_cycles)})
+            elif new_checksums != checksums:  # Индекс изменился
+                report = refresh_dependency_graph(repository_url, is_test_mode)  # Инкрементальное обновление
+                event.update({
+                    'status': 'changed',  # Граф обновлен
+                    'repositories': sorted(source for source in new_checksums
+                                           if new_checksums[source] != checksums.get(source)),  # Изменившиеся источники
+                    'added': report['added'], 'removed': report['removed'], 'changed': report['changed'],
+                    'edges_added': report['edges_added'], 'edges_removed': report['edges_removed'],
+                    'closure_changed': report['closure_changed'],
+                    'new_cycles': report['new_cycles'], 'broken_cycles': report['broken_cycles'],
+                    'nodes': len(dependency_graph),
+                })
+            else:
+                event.update({'status': 'unchanged', 'nodes': len(dependency_graph)})  # Граф актуален
+            checksums = new_checksums  # Запоминаем состояние источников
+            failures = 0  # Сброс счетчика ошибок
+        except Exception as e:  # Ошибка сети или разбора: граф остается прежним
+            failures += 1  # Учет ошибки
+            event.update({'status': 'error', 'error': str(e), 'failures': failures})  # Событие ошибки
+        event['elapsed_ms'] = round((time.perf_counter() - start) * 1000, 3)  # Время опроса
+        delay = next_poll_delay(interval, failures, jitter)  # Пауза до следующего опроса
+        event['next_poll_in'] = round(delay, 3)  # Пауза в событии
+        on_event(event)  # Передача события
+        if max_polls is not None and poll >= max_polls:  # Заданное число опросов выполнено
+            break  # Завершение наблюдения
+        if stop_event.wait(delay):  # Ожидание с возможностью остановки
+            break  # Остановка по сигналу
+
+
+def apply_cache_settings(config):
+    """Применяет настройки дискового кеша и режима offline из конфигурации"""
+    global CACHE_DIR, OFFLINE_MODE, LAZY_INDEX, LAZY_RECORD_CACHE_SIZE  # Объявление глобальных переменных
+    CACHE_DIR = config.get('cache_dir', CACHE_DIR)  # Каталог кеша
+    OFFLINE_MODE = config.get('offline_mode', False) or '--offline' in sys.argv  # Режим без сети
+    REPOSITORY_MIRRORS.update(config.get('repository_mirrors', {}))  # Зеркала репозиториев конфигурации
+    LAZY_INDEX = config.get('lazy_index', False) or '--lazy-index' in sys.argv  # Отложенное декодирование записей
+    LAZY_RECORD_CACHE_SIZE = config.get('record_cache_size', LAZY_RECORD_CACHE_SIZE)  # Предел LRU записей
+
+
+def get_option_value(option):
+    """Возвращает значение параметра командной строки вида "--option value" (None, если параметра нет)"""
+    if option in sys.argv:  # Параметр указан
+        position = sys.argv.index(option)  # Позиция параметра
+        if position + 1 < len(sys.argv):  # Значение указано
+            return sys.argv[position + 1]  # Значение параметра
+        raise ValueError(f"Не указано значение параметра {option}")
+    return None  # Параметра нет
+
+
+def main():
+    """Точка входа: запуск приложения с необязательным профилированием и выводом метрик"""
+    try:
+        metrics_format = get_option_value('--metrics')  # Формат вывода метрик
+        profile_path = get_option_value('--profile')  # Файл для статистики cProfile
+    except ValueError as e:  # Параметр без значения
+        print(f"Ошибка: {e}")  # Выводим сообщение об ошибке
+        sys.exit(1)  # Выход с ошибкой
+    if metrics_format not in (None, 'json'):  # Поддерживается только JSON
+        print(f"Ошибка: неподдерживаемый формат метрик: {metrics_format}")  # Выводим сообщение об ошибке
+        sys.exit(1)  # Выход с ошибкой
+
+    reset_metrics()  # Метрики считаются с начала запуска
+    profiler = cProfile.Profile() if profile_path else None  # Профилировщик по запросу
+    if profiler:  # Профилирование включено
+        profiler.enable()  # Начало профилирования
+    try:
+        with measure_phase('total'):  # Общее время запуска
+            run_application()  # Основная логика
+    finally:
+        if profiler:  # Профилирование включено
+            profiler.disable()  # Конец профилирования
+            profiler.dump_stats(profile_path)  # Сохранение статистики
+            pstats.Stats(profiler, stream=sys.stderr).sort_stats('cumulative').print_stats(20)  # Краткая сводка
+        if metrics_format == 'json':  # Вывод метрик
+            json.dump(collect_metrics(), sys.stderr, ensure_ascii=False, indent=2)  # Метрики в stderr
+            sys.stderr.write('\n')  # Перевод строки
+
+
+def run_application():
+    """Основная функция приложения"""
+    if len(sys.argv) < 2:  # Проверяем количество аргументов
+        print("Использование:")  # Выводим справку
+        print("  python main.py <config.xml>    - режим с конфигурационным файлом")
+        print("  python main.py <config.xml> --offline - использовать только дисковый кеш APKINDEX")
+        print("  python main.py <config.xml> --revalidate - перепроверить архивы по сети перед открытием снимка")
+        print("  python main.py <config.xml> --reverse - вывести пакеты, зависящие от package_name")
+        print("  python main.py <config.xml> --serve [--port 8780] [--reload-interval 300] - демон запросов по HTTP")
+        print("  python main.py <config.xml> --batch roots.jsonl - зависимости множества корневых пакетов за один обход")
+        print("  python main.py <config.xml> --export jsonl|dot|graphml [--output file] - экспорт графа (по умолчанию в stdout)")
+        print("  python main.py <config.xml> --watch [--interval 60] [--jitter 0.1] - следить за репозиториями и обновлять граф")
+        print("  python main.py <config.xml> --jobs 8 - строить полный граф в пуле из 8 процессов")
+        print("  python main.py <config.xml> --plan - план установки package_name по волнам")
+        print("  python main.py <config.xml> --metrics json - вывести метрики фаз и счетчики в stderr")
+        print("  python main.py <config.xml> --profile out.prof - профилировать весь запуск через cProfile")
+        print("  python main.py --interactive   - интерактивный тестовый режим")
+        print("  python main.py --diff old.xml new.xml [...] - сравнить репозитории (версии, зависимости, замыкания)")
+        sys.exit(1)  # Выход с ошибкой
+
+    if sys.argv[1] == "--interactive":  # Если запрошен интерактивный режим
+        interactive_test_mode()  # Запускаем интерактивный режим
+    elif sys.argv[1] == "--diff":  # Если запрошено сравнение репозиториев
+        try:
+            run_repository_diff([arg for arg in sys.argv[2:] if arg.endswith('.xml')])  # Сравнение конфигураций
+        except ValueError as e:  # Обрабатываем ошибки конфигурации и загрузки
+            print(f"Ошибка: {e}")  # Выводим сообщение об ошибке
+            sys.exit(1)  # Выход с ошибкой
+    else:
+        config_path = sys.argv[1]  # Получаем путь к конфигурационному файлу
+        try:
+            # Этап 1: Загрузка конфигурации
+            config = parse_config(config_path)  # Парсим конфигурационный файл
+            apply_cache_settings(config)  # Настраиваем дисковый кеш
+            global BUILD_JOBS  # Объявляем глобальную переменную
+            BUILD_JOBS = max(1, int(get_option_value('--jobs') or 1))  # Количество процессов построения
+
+            create_test_files()  # Создаем тестовые файлы
+
+            # Этап 2: Построение полного графа зависимостей
+
+            # Очищаем глобальные структуры
+            reset_graph_state()  # Очищаем граф, посещенные пакеты и циклы
+            global APKINDEX_CACHE, APKINDEX_URL  # Объявляем глобальные переменные
+            APKINDEX_CACHE = None  # Сбрасываем кеш APKINDEX
+            APKINDEX_URL = None  # Сбрасываем URL APKINDEX
+
+            # Определяем режим работы
+            is_test_mode = config['test_repo_mode'] in ['true', 'local']  # Проверяем тестовый режим
+            repository = config['repository_url'] if is_test_mode else config['repository_urls']  # Источник графа
+            if '--reverse' in sys.argv:  # Режим обратных зависимостей из командной строки
+                config['query_mode'] = 'reverse'  # Переопределяем режим запроса
+            if '--plan' in sys.argv:  # Режим плана установки из командной строки
+                config['query_mode'] = 'plan'  # Переопределяем режим запроса
+
+            if '--serve' in sys.argv:  # Режим демона
+                port = int(get_option_value('--port') or DAEMON_PORT)  # Порт демона
+                interval = float(get_option_value('--reload-interval') or DAEMON_RELOAD_INTERVAL)  # Интервал проверки
+                run_daemon(repository, is_test_mode, port, interval)  # Запуск демона
+                return  # Демон завершен
+
+            if '--watch' in sys.argv:  # Режим наблюдения за репозиториями
+                interval = float(get_option_value('--interval') or WATCH_INTERVAL)  # Интервал опроса
+                jitter = float(get_option_value('--jitter') or WATCH_JITTER)  # Разброс интервала
+                try:
+                    watch_repositories(repository, is_test_mode, interval, jitter)  # Цикл опросов
+                except KeyboardInterrupt:  # Остановка по Ctrl+C
+                    print("Наблюдение остановлено")  # Сообщение
+                return  # Наблюдение завершено
+
+            batch_path = get_option_value('--batch')  # Файл JSONL с корневыми пакетами
+            batch_roots = load_batch_roots(batch_path) if batch_path else config['batch_packages']  # Корни пакетного режима
+            if batch_roots:  # Пакетный режим
+                build_batch_dependency_graph(batch_roots, repository, is_test_mode)  # Один общий обход
+                display_batch_results(batch_roots)  # Вывод по каждому корню
+                return  # Полный граф не выводим
+
+            if config['snapshot_path']:  # Режим запросов через бинарный снимок
+                checksum = get_source_checksum(repository, is_test_mode,
+                                               '--revalidate' in sys.argv)  # Сумма архивов из метаданных кеша
+                with measure_phase('snapshot_load'):  # Замер открытия снимка
+                    snapshot = load_graph_snapshot(config['snapshot_path'], checksum)  # Попытка открыть готовый снимок
+                count_metric('snapshot_hits' if snapshot is not None else 'snapshot_misses')  # Учет повторного использования снимка
+                if snapshot is None:  # Снимка нет или он устарел
+                    build_complete_dependency_graph(repository, is_test_mode)  # Строим граф
+                    save_graph_snapshot(config['snapshot_path'], checksum, repository, is_test_mode)  # Сохраняем снимок
+                    print(f"Снимок графа сохранен: {config['snapshot_path']}")  # Сообщение
+                    snapshot = load_graph_snapshot(config['snapshot_path'], checksum)  # Открываем свежий снимок
+                if config['query_mode'] == 'reverse':  # Запрос обратных зависимостей
+                    display_reverse_dependencies(snapshot, config['package_name'])  # Ответ из снимка
+                else:
+                    display_snapshot_query(snapshot, config['package_name'])  # Ответ на запрос из снимка
+                return  # Полный граф не выводим
+
+            export_format = get_option_value('--export')  # Формат экспорта графа
+            if export_format:  # Режим экспорта
+                if export_format not in EXPORT_FORMATS:  # Неизвестный формат (проверяем до построения графа)
+                    raise ValueError(f"Неподдерживаемый формат экспорта: {export_format} (допустимо: {', '.join(EXPORT_FORMATS)})")
+                output_path = get_option_value('--output') or '-'  # Файл экспорта (по умолчанию stdout)
+                progress = sys.stderr if output_path == '-' else sys.stdout  # Сообщения не смешиваются с экспортом
+                with contextlib.redirect_stdout(progress):  # Перенаправление сообщений построения
+                    build_complete_dependency_graph(repository, is_test_mode)  # Построение графа
+                export_graph(export_format, output_path, repository, is_test_mode)  # Потоковый экспорт
+                return  # Текстовый вывод не нужен
+
+            # Строим полный граф
+            build_complete_dependency_graph(repository, is_test_mode)  # Запускаем построение графа
+
+            if config['query_mode'] == 'reverse':  # Запрос обратных зависимостей
+                display_reverse_dependencies(compact_graph, config['package_name'])  # Ответ по обратному индексу
+            elif config['query_mode'] == 'plan':  # План установки по волнам
+                display_install_plan(config['package_name'],
+                                     plan_install_order(config['package_name'], repository, is_test_mode))  # Вывод плана
+            elif config['query_mode'] == 'closure':  # Отчет о замыканиях всех пакетов
+                report = compute_closure_report(repository, is_test_mode)  # Один проход по сжатому DAG
+                display_closure_report(report, config['report_sort'])  # Вывод отсортированного отчета
+            elif config['ascii_tree_output']:  # Вывод в виде ASCII-дерева
+                display_ascii_tree(config['package_name'])  # Дерево корневого пакета
+            else:
+                display_dependency_graph()  # Выводим граф зависимостей
+
+        except ValueError as e:  # Обрабатываем ошибки валидации
+            print(f"Ошибка: {e}")  # Выводим сообщение об ошибке
+            sys.exit(1)  # Выход с ошибкой
+        except Exception as e:  # Обрабатываем все остальные ошибки
+            print(f"Неожиданная ошибка: {e}")  # Выводим сообщение об ошибке
+            sys.exit(1)  # Выход с ошибкой
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+import contextlib
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from io import StringIO
+
+import config3
+from tests.support import (format_apkindex, format_test_repository, generate_synthetic_apkindex,
+                           generate_synthetic_repository, start_local_http_server, write_apkindex_archive)
+
+
+def write_benchmark_report(output_path, benchmark, parameters, results):
+    """Сохраняет результаты бенчмарка в JSON вместе с параметрами и сведениями о платформе"""
+    report = {'benchmark': benchmark, 'schema_version': 1,
+              'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+              'python': platform.python_version(), 'platform': platform.platform(),
+              'parameters': parameters, 'results': results}  # Отчет
+    with open(output_path, 'w', encoding='utf-8') as f:  # Запись JSON
+        json.dump(report, f, ensure_ascii=False, indent=2)  # Сериализация отчета
+    print(f"Результаты сохранены: {output_path}")  # Сообщение
+
+
+def measure_pipeline(repository, is_test_mode):
+    """Выполняет загрузку, построение графа и вывод; возвращает время каждой фазы"""
+    config3.APKINDEX_CACHE = None  # Сброс кеша APKINDEX
+    config3.APKINDEX_URL = None  # Сброс URL APKINDEX
+    config3.VALIDATED_ARCHIVES.clear()  # Архивы перепроверяются заново
+    config3.reset_graph_state()  # Очистка структур графа
+    timings = {}  # Время фаз в секундах
+    with contextlib.redirect_stdout(StringIO()):  # Подавляем сообщения о прогрессе
+        start = time.perf_counter()  # Начало фазы разбора
+        if is_test_mode:  # Тестовый формат
+            config3.load_test_repository_index(repository)  # Разбор тестового файла
+        else:
+            config3.download_and_parse_apkindex(repository)  # Загрузка по HTTP и разбор APKINDEX
+        timings['parse'] = time.perf_counter() - start  # Время разбора
+        start = time.perf_counter()  # Начало фазы построения
+        config3.build_complete_dependency_graph(repository, is_test_mode)  # Построение полного графа
+        timings['build'] = time.perf_counter() - start  # Время построения
+        start = time.perf_counter()  # Начало фазы вывода
+        config3.display_dependency_graph()  # Вывод графа
+        timings['output'] = time.perf_counter() - start  # Время вывода
+    return timings  # Возврат времени фаз
+
+
+def run_benchmark_suite(sizes=(1000, 5000, 20000), output_path=None, fanout=4, depth=10,
+                        cycle_density=0.01, alias_ratio=0.3, seed=0):
+    """Бенчмарк: синтетические APKINDEX через локальный HTTP-сервер и тестовые файлы; время фаз и пиковая память"""
+    saved_settings = (config3.CACHE_DIR, config3.OFFLINE_MODE)  # Настройки кеша пользователя
+    results = []  # Результаты замеров
+    print("\nБЕНЧМАРК ПОЛНОГО КОНВЕЙЕРА")  # Заголовок
+    print(f"{'формат':>8} {'пакетов':>8} {'ребер':>8} {'разбор, с':>10} {'граф, с':>10} "
+          f"{'вывод, с':>10} {'мкс/пакет':>10} {'пик, МБ':>9}")  # Шапка таблицы
+
+    with tempfile.TemporaryDirectory() as workdir:  # Временный каталог для архивов и кеша
+        server, base_url = start_local_http_server(workdir)  # Локальная замена репозитория
+        config3.CACHE_DIR = os.path.join(workdir, 'cache')  # Отдельный дисковый кеш
+        config3.OFFLINE_MODE = False  # Загрузка идет через HTTP
+        try:
+            for size in sizes:  # Цикл по размерам репозитория
+                records = generate_synthetic_repository(size, fanout, depth, cycle_density, alias_ratio, seed)  # Записи
+                os.makedirs(os.path.join(workdir, f"repo{size}"), exist_ok=True)  # Каталог репозитория
+                write_apkindex_archive(os.path.join(workdir, f"repo{size}", 'APKINDEX.tar.gz'), format_apkindex(records))  # Архив
+                test_path = os.path.join(workdir, f"repo{size}.txt")  # Тестовый файл
+                with open(test_path, 'w', encoding='utf-8') as f:  # Запись тестового файла
+                    f.write(format_test_repository(records))  # Тестовый формат
+
+                for fmt, repository, is_test_mode in (('apkindex', f"{base_url}/repo{size}", False),
+                                                       ('test', test_path, True)):  # Оба формата
+                    timings = measure_pipeline(repository, is_test_mode)  # Замер времени без трассировки памяти
+                    tracemalloc.start()  # Отдельный прогон для пиковой памяти
+                    measure_pipeline(repository, is_test_mode)  # Повтор с трассировкой
+                    peak_memory = tracemalloc.get_traced_memory()[1]  # Пиковая память Python
+                    tracemalloc.stop()  # Остановка трассировки
+                    edges = len(config3.compact_graph['forward'][1])  # Количество ребер
+                    result = {'format': fmt, 'packages': size, 'edges': edges, 'nodes': len(config3.dependency_graph),
+                              'cycles': len(config3.dependency_cycles), 'parse_seconds': round(timings['parse'], 6),
+                              'build_seconds': round(timings['build'], 6), 'output_seconds': round(timings['output'], 6),
+                              'peak_memory_bytes': peak_memory}  # Результат замера
+                    results.append(result)  # Сохранение результата
+                    print(f"{fmt:>8} {size:>8} {edges:>8} {timings['parse']:>10.3f} {timings['build']:>10.3f} "
+                          f"{timings['output']:>10.3f} {timings['build'] / size * 1e6:>10.1f} "
+                          f"{peak_memory / 1024 / 1024:>9.1f}")  # Строка таблицы
+            print(f"HTTP-запросов к локальному серверу: {server.request_count}")  # Проверка загрузки по сети
+        finally:
+            server.shutdown()  # Остановка сервера
+            server.server_close()  # Освобождение порта
+            config3.CACHE_DIR, config3.OFFLINE_MODE = saved_settings  # Восстановление настроек
+            config3.reset_graph_state()  # Очистка структур графа
+
+    if output_path:  # Сохранение машиночитаемых результатов
+        write_benchmark_report(output_path, 'pipeline',
+                               {'sizes': list(sizes), 'fanout': fanout, 'depth': depth, 'cycle_density': cycle_density,
+                                'alias_ratio': alias_ratio, 'seed': seed}, results)  # Отчет
+    return results  # Возврат результатов
+
+
+def traced_size(build):
+    """Возвращает результат build() и объем памяти Python, который остается занятым этим результатом"""
+    tracemalloc.start()  # Учет выделений только на время построения
+    result = build()  # Построение структуры
+    size = tracemalloc.get_traced_memory()[0]  # Память, занятая после построения (временные объекты уже освобождены)
+    tracemalloc.stop()  # Остановка трассировки
+    return result, size  # Структура и ее размер
+
+
+def benchmark_graph_memory(sizes=(1000, 5000, 20000), fanout=8, output_path=None):
+    """Сравнивает память графа как словаря списков и как CSR, построенного из того же словаря (индекс не учитывается)"""
+    results = []  # Результаты замеров
+    print("\nБЕНЧМАРК ПАМЯТИ ГРАФА")  # Заголовок
+    print(f"{'пакетов':>10} {'ребер':>10} {'словарь, КБ':>12} {'CSR, КБ':>10} {'CSR/словарь':>12} "
+          f"{'байт/ребро':>11}")  # Шапка
+
+    for size in sizes:  # Цикл по размерам графа
+        config3.APKINDEX_CACHE = config3.parse_apkindex(generate_synthetic_apkindex(size, fanout))  # Синтетический индекс
+        config3.APKINDEX_URL = f"synthetic://{size}"  # Фиктивный URL для кеша
+        config3.reset_graph_state()  # Очистка структур графа
+        with contextlib.redirect_stdout(StringIO()):  # Подавляем сообщения о прогрессе
+            config3.build_complete_dependency_graph(config3.APKINDEX_URL, False)  # Построение полного графа
+        source = {name: list(dependencies) for name, dependencies in config3.dependency_graph.items()}  # Ребра графа
+        config3.reset_graph_state()  # Граф больше не нужен: замеряются только две копии ниже
+
+        dict_graph, dict_size = traced_size(lambda: {name: list(dependencies)
+                                                     for name, dependencies in source.items()})  # Словарь списков
+        csr_graph, csr_size = traced_size(lambda: config3.CompactAdjacency(config3.build_compact_graph(dict_graph)))  # CSR
+        edges = len(csr_graph.compact['forward'][1])  # Количество ребер
+        result = {'packages': size, 'edges': edges, 'dict_of_lists_bytes': dict_size, 'csr_bytes': csr_size,
+                  'csr_to_dict_ratio': round(csr_size / max(1, dict_size), 4)}  # Результат замера
+        results.append(result)  # Сохранение результата
+        print(f"{size:>10} {edges:>10} {dict_size / 1024:>12.0f} {csr_size / 1024:>10.0f} "
+              f"{result['csr_to_dict_ratio']:>12.2f} {csr_size / max(1, edges):>11.1f}")  # Строка таблицы
+
+    config3.APKINDEX_CACHE = None  # Сброс кеша APKINDEX
+    config3.APKINDEX_URL = None  # Сброс URL APKINDEX
+    if output_path:  # Сохранение машиночитаемых результатов
+        write_benchmark_report(output_path, 'graph_memory', {'sizes': list(sizes), 'fanout': fanout}, results)  # Отчет
+    return results  # Возврат результатов
+
+
+if __name__ == '__main__':
+    run_benchmark_suite(output_path=sys.argv[1] if len(sys.argv) > 1 else None)  # Бенчмарк конвейера
+    benchmark_graph_memory(output_path=sys.argv[2] if len(sys.argv) > 2 else None)  # Бенчмарк памяти графа
@@ -0,0 +1,34 @@
+import os
+
+import pytest
+
+import config3
+from tests.support import write_apkindex_archive
+
+
+@pytest.fixture
+def graph_state(monkeypatch, tmp_path):
+    """Чистые глобальные структуры графа и отдельный дисковый кеш на каждый тест"""
+    monkeypatch.setattr(config3, 'CACHE_DIR', str(tmp_path / 'cache'))  # Отдельный кеш
+    monkeypatch.setattr(config3, 'OFFLINE_MODE', False)  # Сеть по умолчанию разрешена
+    monkeypatch.setattr(config3, 'APKINDEX_CACHE', None)  # Индекс в памяти не переживает тест
+    monkeypatch.setattr(config3, 'APKINDEX_URL', None)
+    config3.VALIDATED_ARCHIVES.clear()  # Архивы перепроверяются заново
+    config3.reset_graph_state()  # Пустой граф
+    yield config3
+    config3.VALIDATED_ARCHIVES.clear()
+    config3.reset_graph_state()
+
+
+@pytest.fixture
+def offline_repository(graph_state, monkeypatch):
+    """Репозиторий, архив которого лежит прямо в дисковом кеше (режим offline); возвращает (URL, publish)"""
+    monkeypatch.setattr(config3, 'OFFLINE_MODE', True)
+    repository_url = 'http://offline.invalid/main'
+    cache_dir = config3.get_repository_cache_dir(repository_url)
+    os.makedirs(cache_dir)
+
+    def publish(apkindex_content):
+        write_apkindex_archive(os.path.join(cache_dir, 'APKINDEX.tar.gz'), apkindex_content)
+
+    return repository_url, publish
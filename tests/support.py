@@ -0,0 +1,204 @@
+import functools
+import hashlib
+import http.server
+import random
+import tarfile
+import threading
+import time
+from io import BytesIO
+
+
+def generate_synthetic_repository(package_count, fanout=3, depth=8, cycle_density=0.0, alias_ratio=0.0, seed=0):
+    """Генерирует записи синтетического репозитория с заданными размером, ветвлением, глубиной, циклами и псевдонимами"""
+    rng = random.Random(seed)  # Детерминированный генератор
+    depth = max(1, min(depth, package_count))  # Число слоев не больше числа пакетов
+    layer_of = [i * depth // package_count for i in range(package_count)]  # Слой каждого пакета
+    layer_start = [0] * (depth + 1)  # Первый пакет каждого слоя
+    for i in range(package_count - 1, -1, -1):  # Обратный проход для поиска начала слоев
+        layer_start[layer_of[i]] = i  # Начало слоя
+    layer_start[depth] = package_count  # Конец последнего слоя
+
+    records = []  # Записи пакетов
+    for i in range(package_count):  # Цикл по пакетам
+        records.append({'name': f"pkg{i}", 'version': f"1.{i % 10}.{i}-r{i % 3}",
+                        'provides': [f"so:libpkg{i}.so.1=1.{i}", f"cmd:pkg{i}-tool"],  # Предоставляемые имена
+                        'installed_size': rng.randint(1024, 4 * 1024 * 1024),  # Установленный размер
+                        'size': rng.randint(512, 1024 * 1024),  # Размер архива
+                        'dependencies': []})  # Имена пакетов-зависимостей
+
+    for i, record in enumerate(records):  # Цикл по пакетам
+        lower = layer_start[min(layer_of[i] + 1, depth)]  # Зависимости берутся из более глубоких слоев
+        candidates = range(lower, package_count)  # Возможные зависимости
+        count = min(fanout, len(candidates))  # Ветвление не больше числа кандидатов
+        targets = rng.sample(candidates, count) if count else []  # Прямые зависимости
+        if i and rng.random() < cycle_density:  # Обратное ребро создает цикл
+            targets.append(rng.randrange(0, i))  # Зависимость на более ранний пакет
+        record['dependencies'] = [f"pkg{j}" for j in targets]  # Имена зависимостей
+        record['tokens'] = []  # Токены строки D:
+        for j in targets:  # Цикл по зависимостям
+            roll = rng.random()  # Выбор формы записи зависимости
+            if roll < alias_ratio / 2:  # Зависимость через библиотеку
+                record['tokens'].append(f"so:libpkg{j}.so.1")  # Псевдоним so:
+            elif roll < alias_ratio:  # Зависимость через команду
+                record['tokens'].append(f"cmd:pkg{j}-tool")  # Псевдоним cmd:
+            else:  # Зависимость по имени с ограничением версии
+                record['tokens'].append(f"pkg{j}>=1.0")  # Имя и оператор версии
+    return records  # Возврат записей
+
+
+def format_apkindex(records):
+    """Формирует текст APKINDEX из записей синтетического репозитория"""
+    blocks = []  # Текстовые записи пакетов
+    for record in records:  # Цикл по записям
+        content = f"{record['name']} {record['version']} {' '.join(record['tokens'])} {' '.join(record['provides'])}"  # Содержимое пакета
+        blocks.append(f"C:Q1{hashlib.sha1(content.encode()).hexdigest()[:27]}=\n"
+                      f"P:{record['name']}\nV:{record['version']}\nA:x86_64\n"
+                      f"S:{record['size']}\nI:{record['installed_size']}\n"
+                      f"T:synthetic package {record['name']}\nU:https://example.org/{record['name']}\nL:MIT\n"
+                      f"D:{' '.join(record['tokens'])}\np:{' '.join(record['provides'])}\n")  # Запись пакета
+    return "\n".join(blocks)  # Записи разделяются пустой строкой
+
+
+def format_test_repository(records):
+    """Формирует текст тестового репозитория ("A: B, C") из записей синтетического репозитория"""
+    return "\n".join(f"{record['name']}: {', '.join(record['dependencies'])}" for record in records)  # Строки пакетов
+
+
+def apkindex_text(*records):
+    """Текст APKINDEX из кортежей (имя, версия, D:, p:)"""
+    return "\n".join(f"P:{name}\nV:{version}\nD:{depends}\np:{provides}\n"
+                     for name, version, depends, provides in records)
+
+
+def build_apkindex_archive(apkindex_content):
+    """Возвращает байты APKINDEX.tar.gz с файлами DESCRIPTION и APKINDEX"""
+    buffer = BytesIO()  # Архив в памяти
+    with tarfile.open(fileobj=buffer, mode='w:gz') as tar:  # Создание архива
+        for member_name, data in (('DESCRIPTION', b'synthetic'), ('APKINDEX', apkindex_content.encode('utf-8'))):  # Файлы архива
+            info = tarfile.TarInfo(member_name)  # Описание файла
+            info.size = len(data)  # Размер файла
+            info.mtime = int(time.time())  # Время изменения
+            tar.addfile(info, BytesIO(data))  # Добавление файла
+    return buffer.getvalue()  # Байты архива
+
+
+def write_apkindex_archive(archive_path, apkindex_content):
+    """Записывает APKINDEX.tar.gz с файлами DESCRIPTION и APKINDEX"""
+    with open(archive_path, 'wb') as f:  # Файл архива
+        f.write(build_apkindex_archive(apkindex_content))  # Запись архива
+
+
+def generate_synthetic_apkindex(package_count, fanout=3):
+    """Генерирует содержимое APKINDEX с заданным числом пакетов для бенчмарков"""
+    return format_apkindex(generate_synthetic_repository(package_count, fanout))  # Текст APKINDEX
+
+
+class CountingHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
+    """Обработчик локального HTTP-сервера: раздает каталог и считает запросы без вывода в журнал"""
+
+    def do_GET(self):
+        self.server.request_count += 1  # Учет запроса
+        self.server.request_headers.append(dict(self.headers))  # Заголовки для проверки условных запросов
+        super().do_GET()  # Стандартная раздача файла (с поддержкой If-Modified-Since)
+
+    def do_HEAD(self):
+        self.server.request_count += 1  # Учет запроса
+        super().do_HEAD()  # Стандартный ответ на HEAD
+
+    def log_message(self, format, *args):
+        pass  # Журнал запросов не выводим
+
+
+def start_local_http_server(directory, handler_class=CountingHTTPRequestHandler):
+    """Запускает в фоновом потоке локальный HTTP-сервер, раздающий каталог; возвращает (сервер, базовый URL)"""
+    handler = functools.partial(handler_class, directory=directory)  # Обработчик с каталогом раздачи
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), handler)  # Свободный порт на localhost
+    server.request_count = 0  # Счетчик запросов
+    server.request_headers = []  # Заголовки GET-запросов по порядку
+    thread = threading.Thread(target=server.serve_forever, daemon=True)  # Фоновый поток
+    thread.start()  # Запуск сервера
+    return server, f"http://127.0.0.1:{server.server_address[1]}"  # Сервер и его URL
+
+
+class FaultyHTTPRequestHandler(CountingHTTPRequestHandler):
+    """Обработчик локального зеркала с внедрением задержки и сбоев (server.delay, server.fault)"""
+
+    def send_head(self):
+        time.sleep(self.server.delay)  # Задержка ответа зеркала
+        if self.server.fault == 'error':  # Зеркало отвечает ошибкой
+            self.send_error(503, "Mirror unavailable")  # Ответ с кодом ошибки
+            return None  # Тело не отправляется
+        return super().send_head()  # Обычная раздача файла
+
+    def copyfile(self, source, outputfile):
+        data = source.read()  # Содержимое файла
+        if self.server.fault == 'corrupt':  # Зеркало отдает битый архив
+            data = data[:len(data) // 2] + bytes(len(data) - len(data) // 2)  # Вторая половина заменена нулями
+        if self.server.fault == 'stall':  # Зеркало зависает посреди передачи
+            outputfile.write(data[:len(data) // 2])  # Первая половина архива
+            outputfile.flush()  # Отправка клиенту
+            time.sleep(self.server.stall_seconds)  # Зависание дольше таймаута клиента
+            data = data[len(data) // 2:]  # Остаток (клиент к этому времени уже отключился)
+        try:
+            outputfile.write(data)  # Отправка данных
+        except OSError:  # Клиент отменил загрузку
+            pass  # Проигравшее зеркало просто закрывает соединение
+
+
+def start_mirror_stand_in(directory, delay=0.0, fault=None, stall_seconds=5.0):
+    """Запускает локальное зеркало с заданной задержкой и видом сбоя; возвращает (сервер, базовый URL)"""
+    server, base_url = start_local_http_server(directory, FaultyHTTPRequestHandler)  # Локальный сервер
+    server.delay = delay  # Задержка перед ответом в секундах
+    server.fault = fault  # None, 'error', 'corrupt' или 'stall'
+    server.stall_seconds = stall_seconds  # Длительность зависания
+    return server, base_url  # Сервер и его URL
+
+
+class RotatingIndexHTTPRequestHandler(http.server.BaseHTTPRequestHandler):
+    """Обработчик репозитория, который по расписанию server.schedule отдает очередную версию индекса или ошибку"""
+
+    def do_GET(self):
+        self.server.request_count += 1  # Учет запроса
+        self.server.request_headers.append(dict(self.headers))  # Заголовки для проверки условных запросов
+        schedule = self.server.schedule  # Версия индекса на каждый запрос (None - сбой)
+        version = schedule[min(self.server.request_count, len(schedule)) - 1]  # Последняя версия повторяется
+        if version is None:  # Репозиторий временно недоступен
+            self.send_error(503, "Repository unavailable")  # Ответ с кодом ошибки
+            return  # Тело не отправляется
+        body, etag = self.server.archives[version]  # Архив версии и его ETag
+        if self.headers.get('If-None-Match') == etag:  # Индекс не изменился
+            self.send_response(304)  # Ответ без тела
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return  # Тело не отправляется
+        self.server.bodies_sent += 1  # Учет полной загрузки
+        self.send_response(200)  # Новая версия индекса
+        self.send_header('Content-Type', 'application/gzip')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(body)  # Архив
+
+    def log_message(self, format, *args):
+        pass  # Журнал запросов не выводим
+
+
+def start_rotating_index_stand_in(apkindex_versions, schedule):
+    """Запускает репозиторий, который меняет индекс по расписанию номеров версий; возвращает (сервер, URL)"""
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), RotatingIndexHTTPRequestHandler)  # Свободный порт
+    server.archives = []  # (архив, ETag) каждой версии
+    for apkindex_content in apkindex_versions:  # Цикл по версиям индекса
+        body = build_apkindex_archive(apkindex_content)  # Архив версии
+        server.archives.append((body, f'"{hashlib.sha256(body).hexdigest()[:16]}"'))  # ETag по содержимому
+    server.schedule = list(schedule)  # Версия индекса на каждый запрос
+    server.request_count = 0  # Счетчик запросов
+    server.request_headers = []  # Заголовки запросов по порядку
+    server.bodies_sent = 0  # Ответов с телом архива
+    threading.Thread(target=server.serve_forever, daemon=True).start()  # Фоновый поток
+    return server, f"http://127.0.0.1:{server.server_address[1]}/main"  # Сервер и URL репозитория
+
+
+def stop_server(server):
+    """Останавливает локальный сервер и освобождает порт"""
+    server.shutdown()
+    server.server_close()
@@ -0,0 +1,43 @@
+import contextlib
+import io
+import json
+
+import pytest
+
+import config3
+from tests.support import apkindex_text
+
+INDEX = apkindex_text(('app', '1', 'lib', ''), ('lib', '1', 'core', ''), ('core', '1', 'lib', ''),
+                      ('tool', '1', 'core', ''), ('unused', '1', '', ''))
+
+
+def write_roots(tmp_path, *lines):
+    roots_path = tmp_path / 'roots.jsonl'
+    roots_path.write_text('\n'.join(lines) + '\n', encoding='utf-8')
+    return str(roots_path)
+
+
+def test_batch_roots_share_one_traversal(offline_repository, tmp_path):
+    repository_url, publish = offline_repository
+    publish(INDEX)
+    roots = config3.load_batch_roots(write_roots(tmp_path, json.dumps({'package': 'app'}), '',
+                                                 json.dumps({'package': 'tool', 'version': 1}),
+                                                 json.dumps({'package': 'lib'})))
+
+    with contextlib.redirect_stdout(io.StringIO()) as output:
+        config3.build_batch_dependency_graph(roots, repository_url, False)
+        config3.display_batch_results(roots)
+
+    assert roots == [('app', None), ('tool', '1'), ('lib', None)]
+    assert sorted(config3.dependency_graph) == ['app', 'core', 'lib', 'tool']  # Без пакетов вне замыканий корней
+    assert config3.find_dependencies(config3.compact_graph, 'tool') == (['core'], ['core', 'lib'])
+    assert "Пакетный режим: 3 корней, 4 узлов в общем графе" in output.getvalue()
+    assert output.getvalue().count("В цикле с:") == 1  # Только lib входит в цикл с core
+    assert "В цикле с: [core]" in output.getvalue()
+
+
+@pytest.mark.parametrize('line, message', [('{"version": "1"}', "не указано поле package"),
+                                           ('{"package": ', "Ошибка разбора")])
+def test_invalid_batch_lines_raise_value_error(tmp_path, line, message):
+    with pytest.raises(ValueError, match=message):
+        config3.load_batch_roots(write_roots(tmp_path, line))
@@ -0,0 +1,52 @@
+import contextlib
+import io
+import json
+
+import config3
+from tests.benchmarks import benchmark_graph_memory, run_benchmark_suite
+from tests.support import format_apkindex, format_test_repository, generate_synthetic_repository
+
+
+def test_synthetic_formats_describe_the_same_graph(graph_state, tmp_path):
+    records = generate_synthetic_repository(300, fanout=4, depth=6, cycle_density=0.3, alias_ratio=0.5, seed=1)
+    test_path = tmp_path / 'repo.txt'
+    test_path.write_text(format_test_repository(records), encoding='utf-8')
+    config3.APKINDEX_CACHE = config3.parse_apkindex(format_apkindex(records))
+    config3.APKINDEX_URL = 'synthetic://300'
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        config3.build_complete_dependency_graph(config3.APKINDEX_URL, False)
+        from_apkindex = dict(config3.dependency_graph.items())
+        config3.reset_graph_state()
+        config3.build_complete_dependency_graph(str(test_path), True)
+
+    # Псевдонимы so:/cmd: и ограничения версий разрешаются в те же имена, что и в тестовом формате
+    assert from_apkindex == dict(config3.dependency_graph.items())
+    assert from_apkindex == {record['name']: record['dependencies'] for record in records}
+    assert config3.dependency_cycles
+
+
+def test_benchmark_suite_serves_archives_over_http(graph_state, tmp_path):
+    output_path = tmp_path / 'results.json'
+    with contextlib.redirect_stdout(io.StringIO()) as output:
+        results = run_benchmark_suite(sizes=(200,), output_path=str(output_path))
+
+    assert [(result['format'], result['packages'], result['nodes']) for result in results] == [
+        ('apkindex', 200, 200), ('test', 200, 200)]
+    assert results[0]['edges'] == results[1]['edges']
+    assert "HTTP-запросов к локальному серверу: 2" in output.getvalue()  # Загрузка и условная перепроверка (304)
+    report = json.loads(output_path.read_text(encoding='utf-8'))
+    assert report['schema_version'] == 1 and report['results'] == results
+
+
+def test_memory_benchmark_compares_dict_of_lists_with_csr(graph_state, tmp_path):
+    output_path = tmp_path / 'memory.json'
+    with contextlib.redirect_stdout(io.StringIO()):
+        results = benchmark_graph_memory(sizes=(300,), fanout=6, output_path=str(output_path))
+
+    [result] = results
+    assert result['packages'] == 300 and result['edges'] > 300
+    assert 0 < result['csr_bytes'] < result['dict_of_lists_bytes']
+    assert result['csr_to_dict_ratio'] == round(result['csr_bytes'] / result['dict_of_lists_bytes'], 4)
+    report = json.loads(output_path.read_text(encoding='utf-8'))
+    assert report['benchmark'] == 'graph_memory' and report['results'] == results
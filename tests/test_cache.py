@@ -0,0 +1,218 @@
+import contextlib
+import hashlib
+import io
+import json
+import os
+import time
+
+import pytest
+
+import config3
+from tests.support import CountingHTTPRequestHandler, apkindex_text, start_local_http_server, stop_server, \
+    write_apkindex_archive
+
+INDEX_V1 = apkindex_text(('app', '1', 'lib', ''), ('lib', '1', '', ''))
+INDEX_V2 = apkindex_text(('app', '2', 'lib extra', ''), ('lib', '1', '', ''), ('extra', '1', '', ''))
+
+
+class ETagHTTPRequestHandler(CountingHTTPRequestHandler):
+    """Отдает ETag по содержимому файла и отвечает 304 на совпавший If-None-Match"""
+
+    def send_head(self):
+        with open(self.translate_path(self.path), 'rb') as f:  # Файл архива
+            self.etag = f'"{hashlib.sha256(f.read()).hexdigest()[:16]}"'  # ETag по содержимому
+        if self.headers.get('If-None-Match') == self.etag:  # Архив не изменился
+            self.send_response(304)  # Тело не отправляется
+            self.end_headers()
+            return None
+        return super().send_head()
+
+    def end_headers(self):
+        if getattr(self, 'etag', None):  # Ответ на запрос архива
+            self.send_header('ETag', self.etag)
+        super().end_headers()
+
+
+@pytest.fixture
+def http_repository(graph_state, tmp_path):
+    """Локальный HTTP-репозиторий; возвращает функцию serve(handler_class) -> (сервер, URL, publish)"""
+    os.makedirs(tmp_path / 'www' / 'main')
+    archive_path = str(tmp_path / 'www' / 'main' / 'APKINDEX.tar.gz')
+    config3.reset_metrics()
+    servers = []
+
+    def publish(apkindex_content, age=0):
+        write_apkindex_archive(archive_path, apkindex_content)
+        modified = time.time() - age  # Last-Modified с точностью до секунды: старые версии отодвигаются в прошлое
+        os.utime(archive_path, (modified, modified))
+
+    def serve(handler_class=CountingHTTPRequestHandler):
+        server, base_url = start_local_http_server(str(tmp_path / 'www'), handler_class)
+        servers.append(server)
+        return server, f"{base_url}/main", publish
+
+    yield serve
+    for server in servers:
+        stop_server(server)
+
+
+def load_packages(repository_url):
+    """Загружает индекс так, как это делает новый запуск программы"""
+    config3.VALIDATED_ARCHIVES.clear()  # Перепроверка архивов идет один раз за запуск
+    with contextlib.redirect_stdout(io.StringIO()):
+        return sorted(config3.load_apkindex_index(repository_url)['by_name'])
+
+
+def counter(name):
+    return config3.METRICS['counters'].get(name, 0)
+
+
+def test_unchanged_archive_is_revalidated_with_304(http_repository):
+    server, repository_url, publish = http_repository()
+    publish(INDEX_V1, age=100)
+
+    assert load_packages(repository_url) == ['app', 'lib']
+    downloaded = counter('bytes_downloaded')
+    assert load_packages(repository_url) == ['app', 'lib']
+
+    assert server.request_count == 2
+    assert 'If-Modified-Since' not in server.request_headers[0]
+    assert 'If-Modified-Since' in server.request_headers[1]
+    assert (counter('disk_cache_misses'), counter('disk_cache_hits')) == (1, 1)
+    assert counter('bytes_downloaded') == downloaded  # Ответ 304 без тела
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        config3.fetch_apkindex_archive(repository_url)  # В том же запуске архив уже перепроверен
+    assert server.request_count == 2
+
+
+def test_changed_archive_is_downloaded_again(http_repository):
+    server, repository_url, publish = http_repository()
+    publish(INDEX_V1, age=100)
+    load_packages(repository_url)
+
+    publish(INDEX_V2)
+
+    assert load_packages(repository_url) == ['app', 'extra', 'lib']
+    assert (counter('disk_cache_misses'), counter('disk_cache_hits')) == (2, 0)
+
+
+def test_etag_is_used_for_revalidation(http_repository):
+    server, repository_url, publish = http_repository(ETagHTTPRequestHandler)
+    publish(INDEX_V1)
+    load_packages(repository_url)
+    etag = config3.load_cache_metadata(config3.get_repository_cache_dir(repository_url))['etag']
+
+    assert load_packages(repository_url) == ['app', 'lib']
+    assert server.request_headers[1]['If-None-Match'] == etag
+    assert counter('disk_cache_hits') == 1
+
+
+def test_offline_mode_never_touches_the_network(http_repository, monkeypatch):
+    server, repository_url, publish = http_repository()
+    publish(INDEX_V1)
+    load_packages(repository_url)
+    monkeypatch.setattr(config3, 'OFFLINE_MODE', True)
+
+    assert load_packages(repository_url) == ['app', 'lib']
+    assert server.request_count == 1
+    with pytest.raises(ValueError, match="режим offline"):
+        load_packages(repository_url + '-other')
+
+
+def test_snapshot_is_reused_while_source_is_unchanged(http_repository, tmp_path):
+    server, repository_url, publish = http_repository()
+    snapshot_path = str(tmp_path / 'graph.snap')
+    publish(INDEX_V1, age=100)
+    with contextlib.redirect_stdout(io.StringIO()):
+        config3.build_complete_dependency_graph(repository_url, False)
+        config3.save_graph_snapshot(snapshot_path, config3.get_source_checksum(repository_url, False),
+                                    repository_url, False)
+
+    config3.VALIDATED_ARCHIVES.clear()  # Следующий запуск: источник перепроверяется условным запросом
+    with contextlib.redirect_stdout(io.StringIO()):
+        snapshot = config3.load_graph_snapshot(snapshot_path, config3.get_source_checksum(repository_url, False))
+    assert snapshot is not None
+    assert config3.find_dependencies(snapshot, 'app') == (['lib'], ['lib'])
+    assert server.request_count == 2  # Перепроверка ответом 304 без загрузки
+
+    publish(INDEX_V2)
+    config3.VALIDATED_ARCHIVES.clear()
+    with contextlib.redirect_stdout(io.StringIO()):
+        assert config3.load_graph_snapshot(snapshot_path, config3.get_source_checksum(repository_url, False)) is None
+    assert server.request_count == 3
+
+
+def run_cli(monkeypatch, capsys, *args):
+    """Запускает программу как из командной строки; возвращает метрики из stderr"""
+    monkeypatch.setattr('sys.argv', ['config3.py', *args, '--metrics', 'json'])
+    config3.main()
+    return json.loads(capsys.readouterr().err)['counters']
+
+
+def test_metrics_count_only_cache_boundaries(http_repository, tmp_path, monkeypatch, capsys):
+    server, repository_url, publish = http_repository()
+    publish(INDEX_V1, age=100)
+    config_path = tmp_path / 'config.xml'
+    config_path.write_text(f"<config><package_name>app</package_name><repository_url>{repository_url}</repository_url>"
+                           f"<test_repo_mode>remote</test_repo_mode><cache_dir>{tmp_path / 'cache'}</cache_dir>"
+                           f"<snapshot_path>{tmp_path / 'graph.snap'}</snapshot_path></config>", encoding='utf-8')
+    monkeypatch.chdir(tmp_path)  # Программа создает тестовые файлы в текущем каталоге
+
+    first = run_cli(monkeypatch, capsys, str(config_path))
+    config3.VALIDATED_ARCHIVES.clear()  # Новый запуск
+    second = run_cli(monkeypatch, capsys, str(config_path))
+
+    assert (first.get('disk_cache_misses'), first.get('disk_cache_hits')) == (1, None)
+    assert (first.get('snapshot_misses'), first.get('snapshot_hits')) == (1, None)
+    assert (second.get('disk_cache_misses'), second.get('disk_cache_hits')) == (None, None)  # Архив не открывался
+    assert (second.get('snapshot_misses'), second.get('snapshot_hits')) == (None, 1)
+    assert 'index_cache_hits' not in first and 'index_cache_hits' not in second
+    assert server.request_count == 1  # Снимок сверяется с метаданными кеша без сети
+
+    config3.VALIDATED_ARCHIVES.clear()
+    third = run_cli(monkeypatch, capsys, str(config_path), '--revalidate')
+    assert (third.get('disk_cache_hits'), third.get('snapshot_hits')) == (1, 1)
+    assert server.request_count == 2  # Перепроверка по запросу: ответ 304
+
+
+def test_snapshot_cold_start_revalidates_only_stale_metadata(http_repository, monkeypatch):
+    server, repository_url, publish = http_repository()
+    publish(INDEX_V1, age=100)
+    load_packages(repository_url)
+    checksum = config3.get_source_checksum(repository_url, False, revalidate=False)
+
+    assert server.request_count == 1
+    config3.VALIDATED_ARCHIVES.clear()  # Следующий запуск
+    assert checksum == config3.get_source_checksum(repository_url, False)  # Сумма та же и после перепроверки
+    assert server.request_count == 2
+
+    publish(INDEX_V2)
+    config3.VALIDATED_ARCHIVES.clear()
+    assert config3.get_source_checksum(repository_url, False, revalidate=False) == checksum  # Свежие метаданные
+    monkeypatch.setattr(config3, 'CACHE_REVALIDATE_AGE', 0)  # Метаданные устарели
+    assert config3.get_source_checksum(repository_url, False, revalidate=False) != checksum
+    assert server.request_count == 3
+
+
+def test_rejected_snapshot_releases_its_mapping(http_repository, tmp_path, monkeypatch):
+    _server, repository_url, publish = http_repository()
+    snapshot_path = str(tmp_path / 'graph.snap')
+    publish(apkindex_text(('app', '1', 'lib', ''), ('lib', '1', 'app', '')))
+    with contextlib.redirect_stdout(io.StringIO()):
+        config3.build_complete_dependency_graph(repository_url, False)
+        config3.save_graph_snapshot(snapshot_path, 'a' * 64, repository_url, False)
+    mappings = []
+
+    class TrackedMap(config3.mmap.mmap):
+        def __init__(self, *args, **kwargs):
+            mappings.append(self)
+
+    monkeypatch.setattr(config3.mmap, 'mmap', TrackedMap)
+
+    assert config3.load_graph_snapshot(snapshot_path, 'b' * 64) is None
+    assert mappings[0].closed
+    snapshot = config3.load_graph_snapshot(snapshot_path, 'a' * 64)
+    with contextlib.redirect_stdout(io.StringIO()) as output:
+        config3.display_snapshot_query(snapshot, 'app')
+    assert "Транзитивных зависимостей: 1" in output.getvalue()  # Сам пакет из цикла не считается
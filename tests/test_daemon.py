@@ -0,0 +1,54 @@
+import contextlib
+import http.server
+import io
+import json
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+import config3
+from tests.support import apkindex_text, stop_server
+
+INDEX = apkindex_text(('app', '1.0', 'lib', ''), ('lib', '2.0', 'core', ''), ('core', '3.0', 'lib', ''),
+                      ('tool', '1.0', 'app', ''))
+
+
+@pytest.fixture
+def daemon(offline_repository, monkeypatch):
+    """Демон на свободном порту поверх графа offline-репозитория; возвращает функцию запроса (код, JSON)"""
+    repository_url, publish = offline_repository
+    publish(INDEX)
+    monkeypatch.setattr(config3, 'DAEMON_STATE', None)
+    with contextlib.redirect_stdout(io.StringIO()):
+        config3.reload_daemon_state(repository_url, False)
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), config3.DaemonRequestHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    def get(path):
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{server.server_address[1]}{path}", timeout=5) as response:
+                return response.status, json.load(response)
+        except urllib.error.HTTPError as e:
+            return e.code, json.load(e)
+
+    yield get
+    stop_server(server)
+
+
+def test_daemon_answers_over_http(daemon):
+    status, deps = daemon('/deps?package=app')
+    assert status == 200
+    assert (deps['version'], deps['direct'], deps['transitive']) == ('1.0', ['lib'], ['core', 'lib'])
+    assert deps['cycle'] is None
+
+    status, rdeps = daemon('/rdeps?package=lib')
+    assert status == 200
+    assert (rdeps['direct'], rdeps['transitive']) == (['app', 'core'], ['app', 'core', 'tool'])
+    assert sorted(rdeps['cycle']) == ['core', 'lib']
+
+    assert daemon('/cycles')[1]['cycles'] == [rdeps['cycle']]
+    assert daemon('/status')[1]['nodes'] == 4
+    assert daemon('/deps?package=missing')[0] == 404
+    assert daemon('/deps')[0] == 400
@@ -0,0 +1,31 @@
+import contextlib
+import io
+
+import config3
+from tests.support import apkindex_text
+
+OLD = apkindex_text(('app', '1', 'lib', ''), ('lib', '1', '', ''), ('tool', '2.0', '', ''), ('gone', '1', 'lib', ''))
+NEW = apkindex_text(('app', '2', 'lib extra', ''), ('lib', '1', '', ''), ('tool', '1.9', '', ''), ('extra', '1', '', ''))
+
+
+def side(apkindex_content, repository):
+    apkindex_index = config3.build_apkindex_index(config3.iter_apkindex_records(apkindex_content.split('\n')), repository)
+    return config3.analyze_repository_side(apkindex_index, False)
+
+
+def test_two_repository_diff_reports_added_removed_and_changed():
+    old_side, new_side = side(OLD, 'v3.19'), side(NEW, 'v3.20')
+
+    rows = {row['package']: row for row in config3.diff_repository_sides(old_side, new_side)}
+
+    assert {name: row['status'] for name, row in rows.items()} == {
+        'app': 'changed', 'extra': 'added', 'gone': 'removed', 'tool': 'changed'}  # lib не изменился
+    assert (rows['app']['old_version'], rows['app']['new_version'], rows['app']['version_change']) == ('1', '2', 1)
+    assert (rows['app']['deps_added'], rows['app']['deps_removed'], rows['app']['closure_delta']) == (['extra'], [], 1)
+    assert rows['tool']['version_change'] == -1
+    assert (rows['gone']['new_version'], rows['gone']['closure_delta']) == (None, -2)
+
+    with contextlib.redirect_stdout(io.StringIO()) as output:
+        config3.display_repository_diff('v3.19', 'v3.20', old_side, new_side, config3.diff_repository_sides(old_side, new_side))
+    assert "Пакетов: 4 -> 4 (+1 -1 ~2)" in output.getvalue()
+    assert "~ tool  2.0 -> 1.9 (понижение)" in output.getvalue()
@@ -0,0 +1,76 @@
+import contextlib
+import io
+
+import pytest
+
+import config3
+from tests.support import apkindex_text
+
+# a -> b -> c -> a образуют цикл, d и app стоят над ним, зависимость e от самого себя отбрасывается
+INDEX = apkindex_text(('app', '1', 'd e', ''), ('d', '1', 'a', ''), ('a', '1', 'b', ''), ('b', '1', 'c', ''),
+                      ('c', '1', 'a so:libz.so.1', ''), ('e', '1', 'e', ''), ('zlib', '1', '', 'so:libz.so.1'))
+
+
+@pytest.fixture
+def cyclic_graph(offline_repository):
+    """Полный граф offline-репозитория с циклом из трех пакетов"""
+    repository_url, publish = offline_repository
+    publish(INDEX)
+    with contextlib.redirect_stdout(io.StringIO()):
+        config3.build_complete_dependency_graph(repository_url, False)
+    return repository_url
+
+
+def test_tarjan_finds_the_known_cycle(cyclic_graph):
+    assert config3.dependency_cycles == [['a', 'b', 'c']]
+    assert config3.dependency_graph['e'] == []
+    assert config3.scc_id['a'] == config3.scc_id['b'] == config3.scc_id['c']
+    assert len({config3.scc_id[name] for name in ('app', 'd', 'a', 'e', 'zlib')}) == 5
+    order = [config3.scc_id[name] for name in ('zlib', 'a', 'd', 'app')]
+    assert order == sorted(order)  # Компоненты идут в обратном топологическом порядке: сначала стоки
+
+
+def test_tarjan_is_iterative_on_deep_chains():
+    depth = 20000  # Глубже предела рекурсии Python
+    graph = {f"n{i}": [f"n{i + 1}"] for i in range(depth)}
+    graph[f"n{depth}"] = ['n0']  # Замыкаем цепочку в один большой цикл
+
+    components = config3.find_strongly_connected_components(graph)
+
+    assert [len(component) for component in components] == [depth + 1]
+
+
+def test_reverse_queries_from_the_graph_and_the_snapshot(cyclic_graph, tmp_path):
+    snapshot_path = str(tmp_path / 'graph.snap')
+    config3.save_graph_snapshot(snapshot_path, 'a' * 64, cyclic_graph, False)
+    snapshot = config3.load_graph_snapshot(snapshot_path)
+
+    for store in (config3.compact_graph, snapshot):
+        assert config3.find_reverse_dependencies(store, 'zlib') == (['c'], ['a', 'app', 'b', 'c', 'd'])
+        assert config3.find_reverse_dependencies(store, 'a') == (['c', 'd'], ['app', 'b', 'c', 'd'])
+        assert config3.find_reverse_dependencies(store, 'app') == ([], [])
+        assert config3.find_reverse_dependencies(store, 'missing') is None
+
+
+def test_closure_sizes_count_shared_dependencies_once():
+    graph = {'top': ['left', 'right'], 'left': ['base'], 'right': ['base'], 'base': [],
+             'x': ['y', 'base'], 'y': ['x']}  # Ромб над base и цикл x <-> y
+    installed = {'top': 1, 'left': 2, 'right': 4, 'base': 5_000_000_000, 'x': 16, 'y': 32}
+    compact = config3.build_compact_graph(graph)
+    components = config3.find_strongly_connected_components(graph)
+    component_of = {member: number for number, component in enumerate(components) for member in component}
+
+    report = config3.compute_closure_sizes(compact, components, component_of,
+                                           [installed[name] for name in compact['names']])
+
+    assert {row['package']: (row['closure_size'], row['installed_size']) for row in report} == {
+        'base': (1, 5_000_000_000), 'left': (2, 5_000_000_002), 'right': (2, 5_000_000_004),
+        'top': (4, 5_000_000_007), 'x': (3, 5_000_000_048), 'y': (3, 5_000_000_048)}
+
+
+def test_install_waves_put_dependencies_first_and_group_cycles(cyclic_graph):
+    waves = config3.plan_install_order('app', cyclic_graph, False)
+
+    assert [wave['groups'] for wave in waves] == [[['e'], ['zlib']], [['a', 'b', 'c']], [['d']], [['app']]]
+    assert config3.plan_install_order('c', cyclic_graph, False)[-1]['groups'] == [['a', 'b', 'c']]
+    assert config3.plan_install_order('missing', cyclic_graph, False) is None
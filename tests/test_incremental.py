@@ -0,0 +1,95 @@
+import contextlib
+import io
+
+import config3
+from tests.support import apkindex_text
+
+
+def graph_snapshot():
+    config3.ensure_compact_graph()  # Изменения, накопленные поверх CSR, переносятся в массивы
+    return ({name: sorted(deps) for name, deps in config3.dependency_graph.items()},
+            sorted(sorted(component) for component in config3.scc_components),
+            sorted(config3.compact_graph['names']))
+
+
+def build_full(repository_url):
+    config3.reset_graph_state()
+    config3.APKINDEX_CACHE = None
+    config3.APKINDEX_URL = None
+    with contextlib.redirect_stdout(io.StringIO()):
+        config3.build_complete_dependency_graph(repository_url, False)
+    return graph_snapshot()
+
+
+def refresh(repository_url):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return config3.refresh_dependency_graph(repository_url, False)
+
+
+def test_refresh_matches_full_rebuild_after_provider_switch(offline_repository):
+    repository_url, publish = offline_repository
+    # libx зависит от имени, которое сам предоставляет: петля отбрасывается и не попадает в обратный граф
+    publish(apkindex_text(('libx', '1', 'so:libX.so musl', 'so:libX.so'),
+                          ('app', '1', 'so:libX.so', ''),
+                          ('musl', '1', '', '')))
+    build_full(repository_url)
+    assert config3.dependency_graph['libx'] == ['musl']
+
+    # Новый пакет раньше в индексе забирает имя so:libX.so; сам libx не меняется
+    publish(apkindex_text(('libx-compat', '2', '', 'so:libX.so'),
+                          ('libx', '1', 'so:libX.so musl', 'so:libX.so'),
+                          ('app', '1', 'so:libX.so', ''),
+                          ('musl', '1', '', '')))
+    report = refresh(repository_url)
+    incremental = graph_snapshot()
+
+    assert report['added'] == ['libx-compat']
+    assert config3.dependency_graph['libx'] == ['libx-compat', 'musl']
+    assert incremental == build_full(repository_url)
+
+
+def test_refresh_drops_error_placeholders(offline_repository):
+    repository_url, publish = offline_repository
+    publish(apkindex_text(('a', '1', 'b', ''), ('b', '1', '', '')))
+    build_full(repository_url)
+    config3.dependency_graph['a'] = ['ERROR: boom']  # Пакет, зависимости которого не удалось получить
+    config3.update_compact_graph()
+
+    publish(apkindex_text(('a', '2', 'b', ''), ('b', '1', '', '')))
+    refresh(repository_url)
+
+    assert config3.dependency_graph['a'] == ['b']
+    assert config3.compact_referrers('b') == ['a']
+    assert 'ERROR: boom' not in config3.dependency_graph
+
+
+def closures(repository_url):
+    with contextlib.redirect_stdout(io.StringIO()):
+        report = config3.compute_closure_report(repository_url, False)
+    return {row['package']: (row['closure_size'], row['installed_size']) for row in report}
+
+
+def test_refresh_touches_only_the_changed_area(offline_repository):
+    repository_url, publish = offline_repository
+    publish(apkindex_text(('app', '1', 'lib', ''), ('lib', '1', 'core', ''), ('core', '1', 'lib', ''),
+                          ('other', '1', 'zlib', ''), ('zlib', '1', '', ''), ('solo', '1', '', '')))
+    build_full(repository_url)
+    closures(repository_url)  # Размеры замыканий, которые обновление поддерживает
+    compact = config3.compact_graph
+    numbers = {name: config3.scc_id[name] for name in ('solo', 'other', 'app')}
+
+    # Цикл lib <-> core распадается, zlib получает новую зависимость
+    publish(apkindex_text(('app', '1', 'lib', ''), ('lib', '1', 'core', ''), ('core', '2', '', ''),
+                          ('other', '1', 'zlib', ''), ('zlib', '2', 'extra', ''), ('solo', '1', '', ''),
+                          ('extra', '1', '', '')))
+    report = refresh(repository_url)
+
+    assert config3.compact_graph is compact  # CSR не перестраивается, изменения лежат поверх него
+    assert set(config3.dependency_graph.overlay) == {'core', 'lib', 'zlib', 'other', 'extra'}
+    assert config3.compact_referrers('extra') == ['zlib']
+    assert {name: config3.scc_id[name] for name in numbers} == numbers  # Номера нетронутых компонент сохраняются
+    assert report['broken_cycles'] == [('core', 'lib')]
+    assert report['closure_changed'] == 6  # Все, кроме solo
+    incremental = (dict(config3.node_closures), graph_snapshot())
+
+    assert incremental == (closures(repository_url), build_full(repository_url))
@@ -0,0 +1,62 @@
+import contextlib
+import io
+import os
+
+import config3
+from tests.support import apkindex_text
+
+INDEX_V1 = apkindex_text(('app', '1', 'lib so:libz.so.1', ''), ('lib', '1', '', ''), ('zlib', '1.3', '', 'so:libz.so.1'))
+INDEX_V2 = apkindex_text(('app', '2', 'lib', ''), ('lib', '1', '', ''))
+
+
+def write_raw(tmp_path, name, apkindex_content, newline='\n'):
+    raw_path = tmp_path / name
+    raw_path.write_bytes(apkindex_content.replace('\n', newline).encode('utf-8'))
+    return str(raw_path)
+
+
+def load_lazy(repository_url):
+    """Загружает отложенный индекс так, как это делает новый запуск программы"""
+    config3.VALIDATED_ARCHIVES.clear()
+    config3.reset_metrics()
+    with contextlib.redirect_stdout(io.StringIO()):
+        return config3.load_lazy_apkindex_index(repository_url)
+
+
+def test_crlf_records_are_split_on_blank_lines(tmp_path):
+    lf = config3.build_lazy_apkindex_index(write_raw(tmp_path, 'lf.raw', INDEX_V1), 'main')
+    crlf = config3.build_lazy_apkindex_index(write_raw(tmp_path, 'crlf.raw', INDEX_V1 + '\n\n', '\r\n'), 'main')
+
+    assert crlf['packages'] == lf['packages'] == ['app', 'lib', 'zlib']
+    assert crlf['providers'] == lf['providers'] == {'so:libz.so.1': 'zlib'}
+    assert crlf['by_name']['app']['D'] == lf['by_name']['app']['D'] == ['lib', 'so:libz.so.1']
+    assert crlf['by_name']['zlib']['V'] == '1.3'
+
+
+def test_unchanged_archive_is_not_extracted_again(offline_repository):
+    repository_url, publish = offline_repository
+    raw_path = os.path.join(config3.get_repository_cache_dir(repository_url), 'APKINDEX.raw')
+    publish(INDEX_V1)
+    load_lazy(repository_url)
+    extracted_at = os.stat(raw_path).st_mtime_ns
+
+    assert load_lazy(repository_url)['packages'] == ['app', 'lib', 'zlib']
+    assert config3.METRICS['counters'].get('bytes_decompressed', 0) == 0
+    assert os.stat(raw_path).st_mtime_ns == extracted_at
+
+    publish(INDEX_V2)
+    assert load_lazy(repository_url)['packages'] == ['app', 'lib']
+    assert config3.METRICS['counters']['bytes_decompressed'] > 0
+
+
+def test_record_cache_limit_is_shared_by_all_repositories(tmp_path, monkeypatch):
+    monkeypatch.setattr(config3, 'LAZY_RECORD_CACHE_SIZE', 3)
+    monkeypatch.setattr(config3, 'LAZY_RECORD_LRU', config3.OrderedDict())
+    merged = config3.merge_apkindex_indexes([
+        config3.build_lazy_apkindex_index(write_raw(tmp_path, 'main.raw', INDEX_V1), 'main'),
+        config3.build_lazy_apkindex_index(write_raw(tmp_path, 'edge.raw', INDEX_V2), 'edge')])
+
+    versions = [record['V'] for record in merged['by_name_version'].values()]
+
+    assert versions == ['1', '1', '1.3', '2']  # lib 1 берется из важного репозитория
+    assert len(config3.LAZY_RECORD_LRU) == 3  # Предел общий, а не на каждое хранилище
@@ -0,0 +1,92 @@
+import contextlib
+import io
+import os
+
+import pytest
+
+import config3
+from tests.support import generate_synthetic_apkindex, start_mirror_stand_in, stop_server, write_apkindex_archive
+
+PACKAGE_COUNT = 200
+
+
+@pytest.fixture
+def mirrors(graph_state, monkeypatch, tmp_path):
+    """Один архив APKINDEX на нескольких локальных зеркалах; возвращает функцию запуска зеркала"""
+    monkeypatch.setattr(config3, 'HTTP_TIMEOUT', 1)  # Зависшее зеркало отбрасывается быстро
+    config3.reset_metrics()
+    os.makedirs(tmp_path / 'www' / 'repo')
+    write_apkindex_archive(str(tmp_path / 'www' / 'repo' / 'APKINDEX.tar.gz'),
+                           generate_synthetic_apkindex(PACKAGE_COUNT))
+    servers = []
+
+    def start(**options):
+        server, base_url = start_mirror_stand_in(str(tmp_path / 'www'), **options)
+        servers.append(server)
+        return server, f"{base_url}/repo"
+
+    yield start
+    for server in servers:
+        stop_server(server)
+
+
+def load_through(monkeypatch, mirror_urls, race_width=2):
+    """Загружает индекс через зеркала; возвращает (зеркало-победитель, число пакетов)"""
+    monkeypatch.setattr(config3, 'MIRROR_RACE_WIDTH', race_width)
+    monkeypatch.setitem(config3.REPOSITORY_MIRRORS, mirror_urls[0], mirror_urls)
+    config3.VALIDATED_ARCHIVES.clear()
+    with contextlib.redirect_stdout(io.StringIO()):
+        packages = len(config3.load_apkindex_index(mirror_urls[0])['by_name'])
+    metadata = config3.load_cache_metadata(config3.get_repository_cache_dir(mirror_urls[0]))
+    return metadata.get('mirror'), packages
+
+
+def test_race_between_fastest_mirrors(mirrors, monkeypatch):
+    slow, slow_url = mirrors(delay=0.5)
+    broken, broken_url = mirrors(fault='error')
+    _fast, fast_url = mirrors()
+
+    assert load_through(monkeypatch, [slow_url, broken_url, fast_url]) == (fast_url, PACKAGE_COUNT)
+    assert slow.request_count == 2  # Пробный HEAD и проигравший GET гонки
+    assert broken.request_count == 1  # Упавшее при опросе зеркало в гонку не берется
+    assert config3.METRICS['counters'].get('mirror_failovers', 0) == 0
+
+
+@pytest.mark.parametrize('fault', ['error', 'corrupt', 'stall'])
+def test_failover_to_next_mirror(mirrors, monkeypatch, fault):
+    _bad, bad_url = mirrors(fault=fault, stall_seconds=3.0)
+    _slow, slow_url = mirrors(delay=0.2)
+    config3.record_mirror_result(bad_url, latency=0.001)  # В прошлый раз сбоящее зеркало было лучшим
+
+    assert load_through(monkeypatch, [bad_url, slow_url], race_width=1) == (slow_url, PACKAGE_COUNT)
+    assert config3.METRICS['counters']['mirror_failovers'] == 1
+    assert config3.load_mirror_stats()[bad_url]['consecutive_failures'] == 1
+
+
+def test_statistics_rank_mirrors_on_later_runs(mirrors, monkeypatch):
+    _slow, slow_url = mirrors(delay=0.3)
+    _fast, fast_url = mirrors()
+    load_through(monkeypatch, [slow_url, fast_url])
+    probes = config3.METRICS['counters']['mirror_probes']
+
+    assert config3.rank_mirrors([slow_url, fast_url]) == ([fast_url, slow_url], 2)
+    assert config3.METRICS['counters']['mirror_probes'] == probes  # Известные зеркала повторно не опрашиваются
+
+
+def test_all_mirrors_failing_raises_value_error(mirrors, monkeypatch):
+    _broken, broken_url = mirrors(fault='error')
+    _corrupt, corrupt_url = mirrors(fault='corrupt')
+
+    with pytest.raises(ValueError, match="Ни одно зеркало"):
+        load_through(monkeypatch, [broken_url, corrupt_url])
+
+
+def test_corrupt_mirror_failures_accumulate_across_runs(mirrors, monkeypatch):
+    _first, first_url = mirrors(fault='corrupt')
+    _second, second_url = mirrors(fault='corrupt')
+
+    for run in (1, 2):
+        with pytest.raises(ValueError, match="Поврежденный архив"):
+            load_through(monkeypatch, [first_url, second_url])
+        stats = config3.load_mirror_stats()
+        assert [stats[url]['consecutive_failures'] for url in (first_url, second_url)] == [run, run]
@@ -0,0 +1,42 @@
+import contextlib
+import io
+import multiprocessing
+
+import pytest
+
+import config3
+from tests.support import apkindex_text, format_apkindex, generate_synthetic_repository
+
+pytestmark = pytest.mark.skipif('fork' not in multiprocessing.get_all_start_methods(),
+                                reason="пул процессов запускается через fork")
+
+# Синтетический репозиторий с циклами и псевдонимами, отдельная пара пакетов в цикле и зависимость вне индекса
+INDEX = format_apkindex(generate_synthetic_repository(300, cycle_density=0.1, alias_ratio=0.3, seed=1)) + "\n" + \
+    apkindex_text(('island', '1', 'islet ghost', ''), ('islet', '1', 'island', ''))
+
+
+def build(repository_url, jobs, monkeypatch):
+    monkeypatch.setattr(config3, 'BUILD_JOBS', jobs)
+    config3.reset_graph_state()
+    with contextlib.redirect_stdout(io.StringIO()):
+        config3.build_complete_dependency_graph(repository_url, False)
+    compact = config3.compact_graph
+    return {'graph': dict(config3.dependency_graph), 'names': compact['names'],
+            'forward': compact['forward'], 'reverse': compact['reverse'], 'repositories': dict(config3.node_repository),
+            'components': [list(component) for component in config3.scc_components], 'scc_id': dict(config3.scc_id),
+            'cycles': list(config3.dependency_cycles), 'closure': config3.compute_closure_report(repository_url, False)}
+
+
+def test_serial_and_pool_builds_are_identical(offline_repository, monkeypatch):
+    repository_url, publish = offline_repository
+    publish(INDEX)
+
+    serial = build(repository_url, 1, monkeypatch)
+    pooled = build(repository_url, 2, monkeypatch)
+
+    assert pooled == serial
+    assert serial['graph']['ghost'] == [] and serial['repositories']['ghost'] is None
+    assert ['island', 'islet'] in serial['cycles']
+    assert len(serial['graph']) == 303
+    groups = config3.partition_condensed_dag(config3.compact_graph, config3.scc_components, config3.scc_id, 2)
+    assert len(groups) == 2  # Замыкания считались в пуле по двум независимым частям сжатого DAG
@@ -0,0 +1,89 @@
+import contextlib
+import io
+import json
+import re
+import xml.etree.ElementTree as ET
+
+import pytest
+
+import config3
+from tests.support import apkindex_text
+
+GRAPH = {'app': ['lib', 'tool'], 'lib': ['core'], 'core': ['lib'], 'tool': ['core', 'zlib'], 'zlib': []}
+
+
+def test_ascii_tree_elides_shared_subtrees_and_marks_cycles(graph_state, monkeypatch):
+    monkeypatch.setattr(config3, 'dependency_graph', GRAPH)
+    stream = io.StringIO()
+
+    lines = config3.render_ascii_tree('app', stream)
+
+    assert stream.getvalue().splitlines() == [
+        'app',
+        '+-- lib',
+        '|   \\-- core',
+        '|       \\-- lib (цикл)',
+        '\\-- tool',
+        '    +-- core (*)',
+        '    \\-- zlib',
+    ]
+    assert lines == 7
+
+
+INDEX = apkindex_text(('app', '1.0', 'lib"q tool', ''), ('lib"q', '2.0', 'core&co', ''), ('core&co', '3.0', 'lib"q', ''),
+                      ('tool', '4.0', 'core&co', ''))
+DOT_STRING = r'"((?:[^"\\]|\\.)*)"'
+
+
+def dot_unquote(value):
+    return re.sub(r'\\(.)', r'\1', value)
+
+
+def parse_jsonl(text):
+    rows = [json.loads(line) for line in text.splitlines()]
+    nodes = {row['name']: row['version'] for row in rows if row['type'] == 'node'}
+    return nodes, {(row['source'], row['target']) for row in rows if row['type'] == 'edge'}
+
+
+def parse_dot(text):
+    lines = text.splitlines()
+    assert lines[0] == 'digraph dependencies {' and lines[-1] == '}'
+    nodes, edges = {}, set()
+    for line in lines[1:-1]:
+        edge = re.fullmatch(rf'  {DOT_STRING} -> {DOT_STRING};', line)
+        if edge:
+            edges.add((dot_unquote(edge[1]), dot_unquote(edge[2])))
+            continue
+        node = re.fullmatch(rf'  {DOT_STRING} \[(.*)\];', line)
+        attributes = dict(re.findall(rf'(\w+)={DOT_STRING}', node[2]))
+        nodes[dot_unquote(node[1])] = dot_unquote(attributes['version'])
+    return nodes, edges
+
+
+def parse_graphml(text):
+    namespace = {'g': 'http://graphml.graphdrawing.org/xmlns'}
+    graph = ET.fromstring(text).find('g:graph', namespace)
+    names, nodes = {}, {}
+    for node in graph.findall('g:node', namespace):
+        data = {item.get('key'): item.text for item in node.findall('g:data', namespace)}
+        names[node.get('id')] = data['name']
+        nodes[data['name']] = data['version']
+    return nodes, {(names[edge.get('source')], names[edge.get('target')]) for edge in graph.findall('g:edge', namespace)}
+
+
+@pytest.mark.parametrize('export_format, parse', [('jsonl', parse_jsonl), ('dot', parse_dot),
+                                                   ('graphml', parse_graphml)])
+def test_export_parses_back_to_the_same_graph(offline_repository, tmp_path, export_format, parse):
+    repository_url, publish = offline_repository
+    publish(INDEX)
+    with contextlib.redirect_stdout(io.StringIO()):
+        config3.build_complete_dependency_graph(repository_url, False)
+    output_path = tmp_path / f"graph.{export_format}"
+
+    config3.export_graph(export_format, str(output_path), repository_url, False)
+
+    nodes, edges = parse(output_path.read_text(encoding='utf-8'))
+    assert nodes == {'app': '1.0', 'lib"q': '2.0', 'core&co': '3.0', 'tool': '4.0'}
+    assert edges == {(name, dependency) for name, dependencies in config3.dependency_graph.items()
+                     for dependency in dependencies}
+    assert len(edges) == 5
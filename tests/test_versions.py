@@ -0,0 +1,64 @@
+import pytest
+
+import config3
+from tests.support import apkindex_text
+
+MAIN = apkindex_text(('app', '1.2-r0', 'old', ''), ('app', '1.10-r0', 'new', ''), ('app', '1.9', 'mid', ''),
+                     ('lib', '1.0', '', ''))
+EDGE = apkindex_text(('app', '2.0_rc1', 'edge', ''), ('lib', '1.0', 'edge-only', ''))
+
+
+def eager_index(apkindex_content, repository):
+    return config3.build_apkindex_index(config3.iter_apkindex_records(apkindex_content.split('\n')), repository)
+
+
+def lazy_index(apkindex_content, repository, tmp_path):
+    raw_path = tmp_path / f"{repository}.raw"
+    raw_path.write_text(apkindex_content, encoding='utf-8')
+    return config3.build_lazy_apkindex_index(str(raw_path), repository)
+
+
+@pytest.fixture(params=['eager', 'lazy'])
+def make_index(request, tmp_path):
+    if request.param == 'eager':
+        return eager_index
+    return lambda apkindex_content, repository: lazy_index(apkindex_content, repository, tmp_path)
+
+
+def test_default_version_is_the_highest_not_the_first(make_index):
+    apkindex_index = make_index(MAIN, 'main')
+
+    record = config3.find_package_record(apkindex_index, 'app', None)
+
+    assert record['V'] == '1.10-r0' == config3.get_version_candidates(apkindex_index, 'app')[1][-1]
+    assert config3.find_package_dependencies(apkindex_index, 'app', None) == ['new']
+    assert config3.select_version_candidate(apkindex_index, 'app', '', '')['V'] == '1.10-r0'
+    assert apkindex_index['packages'] == ['app', 'lib']
+
+
+def test_merged_default_is_the_highest_across_repositories(make_index):
+    merged = config3.merge_apkindex_indexes([make_index(MAIN, 'main'), make_index(EDGE, 'edge')])
+
+    assert config3.find_package_record(merged, 'app', None)['V'] == '2.0_rc1'
+    assert merged['by_name']['app']['repository'] == 'edge'
+    assert merged['by_name']['lib']['repository'] == 'main'  # Равные версии: побеждает важный репозиторий
+    assert config3.find_package_record(merged, 'app', '<2')['V'] == '1.10-r0'
+    assert merged['packages'] == ['app', 'lib']
+
+
+def test_provider_with_the_highest_version_wins(make_index):
+    old_first = apkindex_text(('app', '1', 'so:libz.so.1 cmd:zcat', ''),
+                              ('zlib-compat', '1.2.11', '', 'so:libz.so.1=1.2.11 cmd:zcat'),
+                              ('zlib', '1.3.1', '', 'so:libz.so.1=1.3.1 cmd:zcat'))
+    apkindex_index = make_index(old_first, 'main')
+
+    assert apkindex_index['providers']['so:libz.so.1'] == 'zlib'
+    assert apkindex_index['providers']['cmd:zcat'] == 'zlib'  # Без версии в p: сравниваются версии пакетов
+    assert config3.resolve_dependency(apkindex_index, 'so:libz.so.1') == 'zlib'
+
+    edge = make_index(apkindex_text(('zlib-ng', '2.2', '', 'so:libz.so.1=1.3.2 cmd:zcat')), 'edge')
+    merged = config3.merge_apkindex_indexes([apkindex_index, edge])
+    assert merged['providers']['so:libz.so.1'] == 'zlib-ng'  # Более новый поставщик из менее важного репозитория
+    assert merged['providers']['cmd:zcat'] == 'zlib-ng'
+    main_again = config3.merge_apkindex_indexes([apkindex_index, make_index(old_first, 'edge')])
+    assert main_again['providers']['so:libz.so.1'] == 'zlib'  # Равные версии: остается важный репозиторий
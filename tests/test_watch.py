@@ -0,0 +1,61 @@
+import pytest
+
+import config3
+from tests.support import apkindex_text, start_rotating_index_stand_in, stop_server
+
+INDEX_V1 = apkindex_text(('app', '1', 'lib', ''), ('lib', '1', '', ''))
+INDEX_V2 = apkindex_text(('app', '2', 'lib extra', ''), ('lib', '1', '', ''), ('extra', '1', '', ''))
+
+
+@pytest.fixture
+def rotating_repository(graph_state):
+    """Репозиторий, который меняет индекс по расписанию; возвращает функцию запуска"""
+    servers = []
+
+    def start(schedule):
+        server, repository_url = start_rotating_index_stand_in([INDEX_V1, INDEX_V2], schedule)
+        servers.append(server)
+        return server, repository_url
+
+    yield start
+    for server in servers:
+        stop_server(server)
+
+
+def watch(repository_url, polls, interval=0.0):
+    """Выполняет заданное число опросов; к каждому событию добавляется размер графа в момент события"""
+    events = []
+    config3.watch_repositories(repository_url, False, interval=interval, jitter=0.0, max_polls=polls,
+                               on_event=lambda event: events.append(dict(event, graph=len(config3.dependency_graph))))
+    return events
+
+
+def test_graph_is_refreshed_only_when_index_rotates(rotating_repository):
+    server, repository_url = rotating_repository([0, 0, 1, 1])
+
+    events = watch(repository_url, 4)
+
+    assert [event['status'] for event in events] == ['built', 'unchanged', 'changed', 'unchanged']
+    assert events[2]['repositories'] == [repository_url]
+    assert (events[2]['added'], events[2]['changed'], events[2]['edges_added']) == (['extra'], ['app'], 1)
+    assert config3.dependency_graph['app'] == ['lib', 'extra']
+    assert server.request_count == 4  # Один условный запрос на опрос
+    assert server.bodies_sent == 2  # Архив скачивается только при смене версии
+    assert all('If-None-Match' in headers for headers in server.request_headers[1:])
+
+
+def test_errors_back_off_and_keep_the_graph(rotating_repository):
+    _server, repository_url = rotating_repository([0, None, None, 1])
+
+    events = watch(repository_url, 4, interval=0.01)
+
+    assert [event['status'] for event in events] == ['built', 'error', 'error', 'changed']
+    assert [event.get('failures') for event in events] == [None, 1, 2, None]
+    assert [event['next_poll_in'] for event in events] == [0.01, 0.02, 0.04, 0.01]
+    assert [event['graph'] for event in events] == [2, 2, 2, 3]  # При ошибках остается прежний граф
+    assert events[3]['added'] == ['extra']
+
+
+def test_poll_delay_is_capped_and_jittered():
+    assert config3.next_poll_delay(10, 20, jitter=0.0, max_backoff=60) == 60
+    assert all(9 <= config3.next_poll_delay(10, 0, jitter=0.1) <= 11 for _ in range(100))